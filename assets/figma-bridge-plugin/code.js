@@ -57,6 +57,22 @@ function setFill(node, fill) {
   node.fills = [{ type: "SOLID", color: rgb }]
 }
 
+const loadedFonts = new Map()
+
+function ensureFont(family, style) {
+  // One load per font for the plugin's lifetime; a failed load is forgotten so a later command retries it.
+  const key = `${family}\u0000${style}`
+  let pending = loadedFonts.get(key)
+  if (!pending) {
+    pending = figma.loadFontAsync({ family, style }).catch((error) => {
+      loadedFonts.delete(key)
+      throw error
+    })
+    loadedFonts.set(key, pending)
+  }
+  return pending
+}
+
 function serializeNode(node) {
   return {
     id: node.id,
@@ -65,6 +81,116 @@ function serializeNode(node) {
   }
 }
 
+function createFrameNode(args, frame = figma.createFrame()) {
+  frame.name = args.name || "Frame"
+  frame.x = Number(args.x || 0)
+  frame.y = Number(args.y || 0)
+  frame.resize(Number(args.width || 100), Number(args.height || 100))
+  setFill(frame, args.fill)
+  if (args.stroke) {
+    const rgb = hexToRgbObject(args.stroke)
+    if (rgb) frame.strokes = [{ type: "SOLID", color: rgb }]
+  }
+  const strokeWeight = readFiniteNumber(args.strokeWeight)
+  if (strokeWeight !== null) {
+    frame.strokeWeight = strokeWeight
+  }
+  const radius = readFiniteNumber(args.radius)
+  if (radius !== null) {
+    frame.cornerRadius = radius
+  }
+  const opacity = readFiniteNumber(args.opacity)
+  if (opacity !== null) {
+    frame.opacity = opacity
+  }
+  if (args.layoutMode && args.layoutMode !== "NONE") {
+    frame.layoutMode = args.layoutMode
+    frame.primaryAxisSizingMode = "AUTO"
+    frame.counterAxisSizingMode = "AUTO"
+    const itemSpacing = readFiniteNumber(args.itemSpacing)
+    if (itemSpacing !== null) {
+      frame.itemSpacing = itemSpacing
+    }
+    const padding = parsePadding(args.padding)
+    if (padding) {
+      frame.paddingTop = padding.top
+      frame.paddingRight = padding.right
+      frame.paddingBottom = padding.bottom
+      frame.paddingLeft = padding.left
+    }
+  }
+  return frame
+}
+
+async function createTextNode(args) {
+  const textNode = figma.createText()
+  const family = args.fontFamily || "Inter"
+  const style = args.fontStyle || "Regular"
+  await ensureFont(family, style)
+  textNode.fontName = { family, style }
+  textNode.characters = args.text || ""
+  textNode.name = args.name || "Text"
+  textNode.x = Number(args.x || 0)
+  textNode.y = Number(args.y || 0)
+  const fontSize = readFiniteNumber(args.fontSize)
+  if (fontSize !== null) {
+    textNode.fontSize = fontSize
+  }
+  setFill(textNode, args.fill)
+  const opacity = readFiniteNumber(args.opacity)
+  if (opacity !== null) {
+    textNode.opacity = opacity
+  }
+  return textNode
+}
+
+const TREE_COMMANDS = new Set(["create-frame", "create-text"])
+
+async function createTree(parent, specs) {
+  const captures = {}
+  let first = null
+  let count = 0
+  // Explicit stack: generated trees can nest deeper than the JS call stack allows.
+  const stack = [[parent, specs, 0]]
+  while (stack.length) {
+    const level = stack[stack.length - 1]
+    const [owner, children, index] = level
+    if (index >= children.length) {
+      stack.pop()
+      continue
+    }
+    level[2] = index + 1
+    const spec = children[index] || {}
+    if (!TREE_COMMANDS.has(spec.command)) throw new Error(`Unsupported tree node: ${spec.command}`)
+    const args = spec.args || {}
+    const node = spec.command === "create-text" ? await createTextNode(args) : createFrameNode(args)
+    owner.appendChild(node)
+    count += 1
+    if (!first) first = node
+    if (spec.capture) captures[spec.capture] = node.id
+    if (Array.isArray(spec.children) && spec.children.length) {
+      stack.push([node, spec.children, 0])
+    }
+  }
+  return { id: first ? first.id : null, count, captures }
+}
+
+async function overrideTexts(instance, texts) {
+  // texts[i] replaces the i-th text node in document order; null keeps the component's text.
+  if (!Array.isArray(texts) || !texts.length) return
+  const nodes = instance.findAll((node) => node.type === "TEXT")
+  for (let i = 0; i < texts.length && i < nodes.length; i++) {
+    if (typeof texts[i] !== "string") continue
+    const font = nodes[i].fontName
+    if (font && typeof font === "object") {
+      await ensureFont(font.family, font.style)
+    } else {
+      await ensureFont("Inter", "Regular")
+    }
+    nodes[i].characters = texts[i]
+  }
+}
+
 async function handleCommand(command, args) {
   switch (command) {
     case "status":
@@ -91,84 +217,69 @@ async function handleCommand(command, args) {
     }
 
     case "create-frame": {
-      const frame = figma.createFrame()
-      frame.name = args.name || "Frame"
-      frame.x = Number(args.x || 0)
-      frame.y = Number(args.y || 0)
-      frame.resize(Number(args.width || 100), Number(args.height || 100))
-      setFill(frame, args.fill)
-      if (args.stroke) {
-        const rgb = hexToRgbObject(args.stroke)
-        if (rgb) frame.strokes = [{ type: "SOLID", color: rgb }]
-      }
-      const strokeWeight = readFiniteNumber(args.strokeWeight)
-      if (strokeWeight !== null) {
-        frame.strokeWeight = strokeWeight
-      }
-      const radius = readFiniteNumber(args.radius)
-      if (radius !== null) {
-        frame.cornerRadius = radius
-      }
-      const opacity = readFiniteNumber(args.opacity)
-      if (opacity !== null) {
-        frame.opacity = opacity
-      }
-      if (args.layoutMode && args.layoutMode !== "NONE") {
-        frame.layoutMode = args.layoutMode
-        frame.primaryAxisSizingMode = "AUTO"
-        frame.counterAxisSizingMode = "AUTO"
-        const itemSpacing = readFiniteNumber(args.itemSpacing)
-        if (itemSpacing !== null) {
-          frame.itemSpacing = itemSpacing
-        }
-        const padding = parsePadding(args.padding)
-        if (padding) {
-          frame.paddingTop = padding.top
-          frame.paddingRight = padding.right
-          frame.paddingBottom = padding.bottom
-          frame.paddingLeft = padding.left
-        }
-      }
+      const frame = createFrameNode(args)
       await appendToParent(frame, args.parentId)
       return serializeNode(frame)
     }
 
     case "create-text": {
-      const textNode = figma.createText()
-      const family = args.fontFamily || "Inter"
-      const style = args.fontStyle || "Regular"
-      await figma.loadFontAsync({ family, style })
-      textNode.fontName = { family, style }
-      textNode.characters = args.text || ""
-      textNode.name = args.name || "Text"
-      textNode.x = Number(args.x || 0)
-      textNode.y = Number(args.y || 0)
-      const fontSize = readFiniteNumber(args.fontSize)
-      if (fontSize !== null) {
-        textNode.fontSize = fontSize
-      }
-      setFill(textNode, args.fill)
-      const opacity = readFiniteNumber(args.opacity)
-      if (opacity !== null) {
-        textNode.opacity = opacity
-      }
+      const textNode = await createTextNode(args)
       await appendToParent(textNode, args.parentId)
       return serializeNode(textNode)
     }
 
+    case "create-tree": {
+      const specs = Array.isArray(args.nodes) ? args.nodes : []
+      let parent = args.parentId ? await getNodeById(args.parentId) : null
+      if (!parent || !("appendChild" in parent)) parent = figma.currentPage
+      return createTree(parent, specs)
+    }
+
+    case "create-component": {
+      const component = createFrameNode(args, figma.createComponent())
+      await appendToParent(component, args.parentId)
+      const built = await createTree(component, Array.isArray(args.children) ? args.children : [])
+      return { ...serializeNode(component), count: built.count + 1 }
+    }
+
+    case "create-instance": {
+      const component = await getNodeById(args.componentId)
+      if (!component || component.type !== "COMPONENT") throw new Error("Component not found")
+      const instance = component.createInstance()
+      if (args.name) instance.name = args.name
+      instance.x = Number(args.x || 0)
+      instance.y = Number(args.y || 0)
+      await appendToParent(instance, args.parentId)
+      await overrideTexts(instance, args.texts)
+      return serializeNode(instance)
+    }
+
     case "set-text": {
       const node = await getNodeById(args.id)
       if (!node || node.type !== "TEXT") throw new Error("Text node not found")
       if (typeof args.text !== "string") throw new Error("Missing text")
       if (node.fontName && typeof node.fontName === "object") {
-        await figma.loadFontAsync({ family: node.fontName.family, style: node.fontName.style })
+        await ensureFont(node.fontName.family, node.fontName.style)
       } else {
-        await figma.loadFontAsync({ family: "Inter", style: "Regular" })
+        await ensureFont("Inter", "Regular")
       }
       node.characters = args.text
       return serializeNode(node)
     }
 
+    case "preload-fonts": {
+      const fonts = Array.isArray(args.fonts) ? args.fonts : []
+      const failed = []
+      await Promise.all(
+        fonts.map((font) => {
+          const family = String(font.family || "Inter")
+          const style = String(font.style || "Regular")
+          return ensureFont(family, style).catch(() => failed.push(`${family} ${style}`))
+        })
+      )
+      return { loaded: fonts.length - failed.length, failed }
+    }
+
     case "set-fill": {
       const node = await getNodeById(args.id)
       if (!node) throw new Error("Node not found")
@@ -185,6 +296,29 @@ async function handleCommand(command, args) {
       return serializeNode(node)
     }
 
+    case "set-geometry": {
+      const node = await getNodeById(args.id)
+      if (!node || !("resize" in node)) throw new Error("Resizable node not found")
+      const x = readFiniteNumber(args.x)
+      const y = readFiniteNumber(args.y)
+      if (x !== null) node.x = x
+      if (y !== null) node.y = y
+      const width = readFiniteNumber(args.width)
+      const height = readFiniteNumber(args.height)
+      if (width !== null || height !== null) {
+        node.resize(width !== null ? width : node.width, height !== null ? height : node.height)
+      }
+      return serializeNode(node)
+    }
+
+    case "delete-node": {
+      const node = await getNodeById(args.id)
+      if (!node || node.type === "PAGE" || node.type === "DOCUMENT") throw new Error("Node not found")
+      const removed = serializeNode(node)
+      node.remove()
+      return removed
+    }
+
     case "set-layout": {
       const node = await getNodeById(args.id)
       if (!node || !("layoutMode" in node)) throw new Error("Layout node not found")
@@ -208,19 +342,45 @@ async function handleCommand(command, args) {
 
 figma.showUI(__html__, { width: 320, height: 120, visible: false })
 
-figma.ui.onmessage = async (msg) => {
+async function runCommand(msg) {
   const id = msg && msg.id ? msg.id : "unknown"
   const command = msg ? msg.command : ""
   const args = msg && msg.args ? msg.args : {}
 
   try {
     const result = await handleCommand(command, args)
-    figma.ui.postMessage({ id, ok: true, result })
+    return { id, ok: true, result }
   } catch (error) {
-    figma.ui.postMessage({
+    return {
       id,
       ok: false,
       error: error && error.message ? error.message : String(error)
+    }
+  }
+}
+
+// Commands run strictly one after another so sibling append order matches queue order.
+let commandChain = Promise.resolve()
+
+figma.ui.onmessage = (msg) => {
+  if (msg && msg.type === "hello") {
+    figma.ui.postMessage({
+      register: {
+        fileKey: typeof figma.fileKey === "string" ? figma.fileKey : "",
+        fileName: figma.root.name
+      }
     })
+    return
   }
+  commandChain = commandChain.then(async () => {
+    if (msg && Array.isArray(msg.batch)) {
+      const results = []
+      for (const item of msg.batch) {
+        results.push(await runCommand(item))
+      }
+      figma.ui.postMessage({ batch: results })
+      return
+    }
+    figma.ui.postMessage(await runCommand(msg))
+  })
 }
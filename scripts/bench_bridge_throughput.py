@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""Drive generated plans through the bridge against the stand-in plugin and report throughput."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from figma_bridge_apply_plan import default_temp_root, is_within
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def write_corpus(path: Path, sections: int) -> None:
+    rows = []
+    for i in range(sections):
+        rows.append(
+            f'<section id="s{i}" style="width:1200px;height:160px;background:#F4F4F4">'
+            f'<h2 style="color:#222222;font-size:20px">Section {i}</h2>'
+            f'<div class="card" style="width:360px;height:96px;background:#FFFFFF">'
+            f"<p>Body copy for card {i}</p><span>meta {i}</span></div></section>"
+        )
+    path.write_text("<html><body>" + "\n".join(rows) + "</body></html>", encoding="utf-8")
+
+
+def generate_plan(input_path: Path, plan_path: Path, temp_root: Path, plan_version: int) -> int:
+    cmd = [
+        sys.executable,
+        str(SCRIPTS_DIR / "html_to_figma_plan.py"),
+        "--input",
+        str(input_path),
+        "--output",
+        str(plan_path),
+        "--project-name",
+        "bench",
+        "--task-id",
+        "bench",
+        "--temp-root",
+        str(temp_root),
+        "--plan-version",
+        str(plan_version),
+    ]
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+    return len(json.loads(plan_path.read_text(encoding="utf-8"))["operations"])
+
+
+def stop(proc: subprocess.Popen) -> None:
+    if proc.poll() is not None:
+        return
+    try:
+        proc.send_signal(signal.SIGINT if sys.platform != "win32" else signal.SIGTERM)
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def run_config(
+    plan_path: Path,
+    temp_root: Path,
+    run_id: str,
+    transport: str,
+    batch_size: int,
+    server: str,
+    standin_args: list[str],
+    timeout_sec: float,
+) -> dict:
+    port = free_port()
+    stats_path = plan_path.parent / f"stats_{run_id}.json"
+    standin = subprocess.Popen(
+        [
+            sys.executable,
+            str(SCRIPTS_DIR / "bridge_standin_client.py"),
+            "--base",
+            f"http://127.0.0.1:{port}",
+            "--transport",
+            "ws" if transport == "ws" else "poll",
+            *standin_args,
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    apply_cmd = [
+        sys.executable,
+        str(SCRIPTS_DIR / "figma_bridge_apply_plan.py"),
+        "--plan",
+        str(plan_path),
+        "--project-name",
+        "bench",
+        "--task-id",
+        run_id,
+        "--temp-root",
+        str(temp_root),
+        "--port",
+        str(port),
+        "--server",
+        server,
+        "--batch-size",
+        str(batch_size),
+        "--stats-out",
+        str(stats_path),
+    ]
+    if transport == "ws":
+        apply_cmd.append("--websocket")
+    try:
+        started = time.perf_counter()
+        result = subprocess.run(
+            apply_cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            timeout=timeout_sec,
+        )
+        wall = time.perf_counter() - started
+    finally:
+        stop(standin)
+    if result.returncode != 0:
+        tail = result.stderr.strip().splitlines()[-1:] or ["no stderr"]
+        return {"run": run_id, "error": tail[0]}
+    stats = json.loads(stats_path.read_text(encoding="utf-8"))
+    stats_path.unlink(missing_ok=True)
+    stats.update({"run": run_id, "transport": transport, "wall_sec": round(wall, 3)})
+    return stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark figma_bridge_apply_plan.py against the stand-in plugin.")
+    parser.add_argument("--input", default="", help="HTML document to plan (defaults to a generated corpus)")
+    parser.add_argument("--sections", type=int, default=200, help="Sections in the generated corpus (5 ops each)")
+    parser.add_argument("--plan-version", type=int, default=1, choices=[1, 2], help="Plan schema for the generated plan")
+    parser.add_argument("--transports", default="poll,ws", help="Comma-separated: poll, ws")
+    parser.add_argument("--batch-sizes", default="1,16", help="Comma-separated --batch-size values")
+    parser.add_argument("--server", default="threading", choices=["threading", "asyncio"], help="Bridge server")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Stand-in per-command latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Stand-in latency jitter")
+    parser.add_argument("--timeout-sec", type=float, default=600.0, help="Per-run timeout")
+    parser.add_argument("--output", default="", help="Write results JSON (path under temp root)")
+    parser.add_argument("--temp-root", default="", help="Temp root directory. Defaults to system temp/auto-figma")
+    args = parser.parse_args()
+
+    temp_root = Path(args.temp_root).resolve() if args.temp_root else default_temp_root().resolve()
+    work_dir = temp_root / "bench"
+    work_dir.mkdir(parents=True, exist_ok=True)
+    output_path = Path(args.output).resolve() if args.output else None
+    if output_path and not is_within(output_path, temp_root):
+        raise SystemExit(f"Output path must be under temp root: {temp_root}")
+
+    if args.input:
+        input_path = Path(args.input).resolve()
+        if not input_path.exists():
+            raise SystemExit(f"Input not found: {input_path}")
+    else:
+        input_path = work_dir / "bridge_corpus.html"
+        write_corpus(input_path, max(args.sections, 1))
+
+    plan_path = work_dir / "bridge_plan.json"
+    op_count = generate_plan(input_path, plan_path, temp_root, args.plan_version)
+    print(f"Plan: {plan_path} ({op_count} operations)")
+
+    # Stand-in latency only; error injection would abort a plan without ignore_error.
+    standin_args = ["--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms), "--seed", "1"]
+    results = []
+    transports = [item.strip() for item in args.transports.split(",") if item.strip()]
+    batch_sizes = [int(item) for item in args.batch_sizes.split(",") if item.strip()]
+    for transport in transports:
+        for batch_size in batch_sizes:
+            run_id = f"bench-{transport}-b{batch_size}"
+            stats = run_config(plan_path, temp_root, run_id, transport, batch_size, args.server, standin_args, args.timeout_sec)
+            results.append(stats)
+            if "error" in stats:
+                print(f"{run_id:>18}: failed ({stats['error']})")
+                continue
+            latency = stats["latency"]
+            print(
+                f"{run_id:>18}: {stats['ops_per_sec']:>8.1f} ops/sec  "
+                f"p50 {latency['p50_ms']:.1f}ms  p95 {latency['p95_ms']:.1f}ms  p99 {latency['p99_ms']:.1f}ms"
+            )
+
+    if output_path:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"operations": op_count, "server": args.server, "latency_ms": args.latency_ms, "results": results}
+        output_path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+        print(f"Results written: {output_path}")
+    plan_path.unlink(missing_ok=True)
+    return 1 if any("error" in item for item in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""Benchmark the HTML and UI-doc plan generators on synthetic corpora."""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import platform
+import random
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+import html_to_figma_plan as html_gen
+import ui_doc_to_figma_plan as doc_gen
+
+HTML_KINDS = ("wide", "deep", "text", "style")
+# Committed reference numbers, so a checkout can be compared against the previous version's.
+REFERENCE_BASELINE = Path(__file__).resolve().parents[1] / "references" / "generator_baseline.json"
+# Small corpora finish in tens of milliseconds, where scheduler noise alone exceeds the tolerance.
+MIN_SECONDS_DELTA = 0.05
+WORDS = ["layout", "screen", "token", "render", "align", "color", "spacing", "button", "布局", "组件", "颜色", "间距"]
+
+
+def html_corpus(kind: str, size: int, rng: random.Random) -> str:
+    if kind == "wide":
+        body = "".join(f'<div class="row r{i % 9}"><span>item {i}</span></div>' for i in range(size))
+    elif kind == "deep":
+        body = "".join(f'<div style="height:{8 + i % 5}px">level {i}' for i in range(size)) + "</div>" * size
+    elif kind == "text":
+        body = "".join(
+            "<p>"
+            + " ".join(rng.choice(WORDS) for _ in range(60))
+            + " <b>bold</b> &amp; <i>italic</i> "
+            + " ".join(rng.choice(WORDS) for _ in range(60))
+            + "</p>"
+            for _ in range(size)
+        )
+    elif kind == "style":
+        body = "".join(
+            f'<div style="width:{100 + i % 300}px;height:{20 + i % 40}px;left:{i % 50}px;top:{i % 70}px;'
+            f"background:#{i % 256:02X}{(i * 7) % 256:02X}{(i * 13) % 256:02X};color:#333333;"
+            f'font-size:{10 + i % 12}px;margin:4px;padding:2px 4px;border:1px solid #CCCCCC">x{i}</div>'
+            for i in range(size)
+        )
+    else:
+        raise ValueError(kind)
+    return f"<html><head><style>.r1{{}}</style><script>var x = 1;</script></head><body>{body}</body></html>"
+
+
+def markdown_corpus(size: int, rng: random.Random) -> str:
+    screen_words = sorted(doc_gen.SCREEN_HINTS)
+    exclude_words = sorted(doc_gen.EXCLUDE_HINTS)
+    lines = ["# Product spec", ""]
+    for i in range(size):
+        level = "#" * rng.choice((2, 3, 4))
+        roll = rng.random()
+        if roll < 0.6:
+            title = f"{rng.choice(screen_words)} {i} {rng.choice(WORDS)}"
+        elif roll < 0.7:
+            title = f"{rng.choice(exclude_words)} {i}"
+        else:
+            title = f"**Section** {i} `{rng.choice(WORDS)}` [link](http://example.com/{i})"
+        lines.append(f"{level} {title}")
+        lines.append(" ".join(rng.choice(WORDS) for _ in range(30)))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def html_case(text: str) -> Callable[[], list[dict]]:
+    def run() -> list[dict]:
+        tree = html_gen.MiniHTMLTree()
+        tree.feed(text)
+        plan = html_gen.build_plan(Path("bench.html"), tree.root, "bench", "bench", "bench", "HTML-bench", 1440, 1024, 32, 16)
+        return plan["operations"]
+
+    return run
+
+
+def markdown_case(text: str) -> Callable[[], list[dict]]:
+    def run() -> list[dict]:
+        screens = doc_gen.trim_screens(doc_gen.extract_headings(text), 1_000_000)
+        return doc_gen.build_operations(screens, "AUTO-bench", 390, 844, 120)
+
+    return run
+
+
+def measure(run: Callable[[], list[dict]], repeat: int) -> dict:
+    best = float("inf")
+    operations: list[dict] = []
+    # Like timeit: start each run from a collected heap and keep the collector out of the timing,
+    # so a committed baseline is not at the mercy of when a GC pass happens to land.
+    for _ in range(max(repeat, 1)):
+        operations = []
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            operations = run()
+            best = min(best, time.perf_counter() - started)
+        finally:
+            gc.enable()
+    plan_bytes = len(json.dumps({"operations": operations}, ensure_ascii=False, indent=2).encode("utf-8"))
+
+    # tracemalloc slows allocation-heavy code, so peak memory gets its own untimed run.
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": round(best, 4),
+        "operations": len(operations),
+        "ops_per_sec": round(len(operations) / best, 1) if best > 0 else 0.0,
+        "peak_mb": round(peak / (1024 * 1024), 2),
+        "plan_bytes": plan_bytes,
+    }
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for metric in ("seconds", "peak_mb", "plan_bytes"):
+            old = float(before.get(metric, 0))
+            new = float(current[metric])
+            if metric == "seconds" and new - old < MIN_SECONDS_DELTA:
+                continue
+            if old > 0 and new > old * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {old} -> {new} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark html_to_figma_plan and ui_doc_to_figma_plan.")
+    parser.add_argument("--sizes", default="1000,10000", help="Comma-separated corpus sizes (elements / headings)")
+    parser.add_argument("--kinds", default=",".join(HTML_KINDS) + ",markdown", help="Corpus kinds to run")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case (best is reported)")
+    parser.add_argument("--seed", type=int, default=7, help="Corpus random seed")
+    parser.add_argument(
+        "--baseline",
+        default=str(REFERENCE_BASELINE),
+        help="Baseline JSON (defaults to the committed references/generator_baseline.json)",
+    )
+    parser.add_argument(
+        "--write-baseline",
+        action="store_true",
+        help="Store these results as the new baseline (the reference file, or a path under temp root)",
+    )
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression ratio before failing")
+    parser.add_argument("--temp-root", default="", help="Temp root directory. Defaults to system temp/auto-figma")
+    args = parser.parse_args()
+
+    temp_root = Path(args.temp_root).resolve() if args.temp_root else html_gen.default_temp_root().resolve()
+    baseline_path = Path(args.baseline).resolve()
+    if args.write_baseline and baseline_path != REFERENCE_BASELINE and not html_gen.is_within(baseline_path, temp_root):
+        raise SystemExit(f"Baseline path must be {REFERENCE_BASELINE} or under temp root: {temp_root}")
+
+    sizes = [int(item) for item in args.sizes.split(",") if item.strip()]
+    kinds = [item.strip() for item in args.kinds.split(",") if item.strip()]
+    unknown = set(kinds) - set(HTML_KINDS) - {"markdown"}
+    if unknown:
+        raise SystemExit(f"Unknown corpus kinds: {', '.join(sorted(unknown))}")
+
+    results: dict[str, dict] = {}
+    for kind in kinds:
+        for size in sizes:
+            rng = random.Random(args.seed)
+            if kind == "markdown":
+                text = markdown_corpus(size, rng)
+                run = markdown_case(text)
+            else:
+                text = html_corpus(kind, size, rng)
+                run = html_case(text)
+            name = f"{kind}-{size}"
+            stats = measure(run, args.repeat)
+            stats["input_bytes"] = len(text.encode("utf-8"))
+            results[name] = stats
+            print(
+                f"{name:>16}: {stats['seconds']:.3f}s  {stats['operations']:>7} ops  "
+                f"{stats['ops_per_sec']:>10.1f} ops/sec  peak {stats['peak_mb']:.1f} MB  plan {stats['plan_bytes']} B"
+            )
+
+    status = 0
+    if baseline_path.exists() and not args.write_baseline:
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8")).get("results", {})
+        regressions = compare(results, baseline, max(args.tolerance, 0.0))
+        if regressions:
+            print(f"Regressions against {baseline_path}:")
+            for line in regressions:
+                print(f"- {line}")
+            status = 1
+        else:
+            print(f"No regressions against {baseline_path} (tolerance {args.tolerance:.0%})")
+
+    if args.write_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        # Timings depend on the machine; the recorded interpreter and platform say where they came from.
+        payload = {
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(terse=True),
+            "results": results,
+        }
+        baseline_path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+        print(f"Baseline written: {baseline_path}")
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
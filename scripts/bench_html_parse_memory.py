@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Compare peak RSS of whole-file and streaming HTML parsing."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from html_to_figma_plan import default_temp_root, is_within, parse_html
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None  # type: ignore[assignment]
+
+
+def peak_rss_mb() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes.
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def write_corpus(path: Path, size_mb: int) -> None:
+    script_block = "<script>" + ("var payload = '" + "x" * 4000 + "';\n") * 64 + "</script>\n"
+    style_block = "<style>" + ".c{color:#111111;}\n" * 4000 + "</style>\n"
+    card = (
+        '<div class="card" style="width:320px;height:120px;background:#F5F5F5">'
+        + "<h2>Card title</h2>"
+        + "<p>" + " ".join(f"word{i}" for i in range(40)) + "</p>"
+        + "<span>" + "&amp; more text " * 20 + "</span>"
+        + "</div>\n"
+    )
+    target = size_mb * 1024 * 1024
+    written = 0
+    with path.open("w", encoding="utf-8") as handle:
+        head = "<!DOCTYPE html><html><head><title>bench</title>" + style_block + script_block + "</head><body>\n"
+        handle.write(head)
+        written += len(head)
+        while written < target:
+            block = '<section style="width:1200px">' + card * 20 + "</section>\n" + script_block + style_block
+            handle.write(block)
+            written += len(block)
+        handle.write("</body></html>\n")
+
+
+def run_child(mode: str, input_path: Path, chunk_size: int) -> dict:
+    cmd = [
+        sys.executable,
+        str(Path(__file__).resolve()),
+        "--child",
+        mode,
+        "--input",
+        str(input_path),
+        "--chunk-size",
+        str(chunk_size),
+    ]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def child_main(mode: str, input_path: Path, chunk_size: int) -> int:
+    started = time.perf_counter()
+    nodes = 0
+    if mode != "baseline":
+        stack = [parse_html(input_path, stream=mode == "stream", chunk_size=chunk_size)]
+        while stack:
+            node = stack.pop()
+            nodes += 1
+            stack.extend(node.children)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"mode": mode, "peak_rss_mb": round(peak_rss_mb(), 1), "nodes": nodes, "seconds": round(elapsed, 2)}))
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark peak RSS of html_to_figma_plan parse modes.")
+    parser.add_argument("--input", default="", help="HTML file to parse (defaults to a generated corpus)")
+    parser.add_argument("--size-mb", type=int, default=100, help="Size of the generated corpus")
+    parser.add_argument("--chunk-size", type=int, default=1 << 20, help="Characters per chunk for the streaming parse")
+    parser.add_argument("--temp-root", default="", help="Temp root directory. Defaults to system temp/auto-figma")
+    parser.add_argument("--child", default="", choices=["", "baseline", "full", "stream"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if resource is None:
+        raise SystemExit("Peak RSS measurement needs the POSIX resource module")
+
+    if args.child:
+        return child_main(args.child, Path(args.input), args.chunk_size)
+
+    temp_root = Path(args.temp_root).resolve() if args.temp_root else default_temp_root().resolve()
+    temp_root.mkdir(parents=True, exist_ok=True)
+    generated = not args.input
+    if generated:
+        input_path = temp_root / f"bench_parse_{args.size_mb}mb.html"
+        if not is_within(input_path, temp_root):
+            raise SystemExit(f"Corpus path must be under temp root: {temp_root}")
+        print(f"Generating {args.size_mb} MB corpus: {input_path}")
+        write_corpus(input_path, args.size_mb)
+    else:
+        input_path = Path(args.input).resolve()
+        if not input_path.exists():
+            raise SystemExit(f"Input not found: {input_path}")
+
+    try:
+        print(f"Input size: {input_path.stat().st_size / (1024 * 1024):.1f} MB")
+        results = [run_child(mode, input_path, args.chunk_size) for mode in ("baseline", "full", "stream")]
+    finally:
+        if generated:
+            input_path.unlink(missing_ok=True)
+
+    base = results[0]["peak_rss_mb"]
+    for item in results:
+        extra = item["peak_rss_mb"] - base
+        print(
+            f"{item['mode']:>8}: peak RSS {item['peak_rss_mb']:.1f} MB (+{extra:.1f} MB over interpreter), "
+            f"{item['nodes']} nodes, {item['seconds']:.2f}s"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Compare plan file size, write time and applier load time across plan encodings."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+from typing import Callable
+
+import html_to_figma_plan as html_gen
+from bench_generators import HTML_KINDS, html_corpus
+from figma_bridge_apply_plan import normalize_operation
+from plan_cache import render_plan_json
+from plan_codec import encode_compact_plan, load_plan, open_plan_output, open_plan_text, write_plan_text
+
+ENCODINGS = ("json", "json.gz", "jsonl", "jsonl.gz", "compact", "compact.gz")
+
+
+def write_encoding(path: Path, encoding: str, meta: dict, operations: list[dict]) -> None:
+    compress = encoding.endswith(".gz")
+    kind = encoding.split(".")[0]
+    if kind == "jsonl":
+        with open_plan_output(path, compress) as stream:
+            html_gen.write_jsonl_plan(stream, meta, operations)
+        return
+    if kind == "compact":
+        text = encode_compact_plan(meta, operations)
+    else:
+        text = render_plan_json(meta, json.dumps(operations, ensure_ascii=False, indent=2))
+    write_plan_text(path, text, compress)
+
+
+def load_encoding(path: Path, encoding: str) -> int:
+    # The same work figma_bridge_apply_plan.py does before executing: read, decode, normalize.
+    if encoding.startswith("jsonl"):
+        with open_plan_text(path) as stream:
+            stream.readline()
+            ops = [json.loads(line) for line in stream if line.strip()]
+    else:
+        ops = load_plan(path)["operations"]
+    return len([normalize_operation(idx, op) for idx, op in enumerate(ops, start=1)])
+
+
+def best_of(run: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(max(repeat, 1)):
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark plan encodings (size, write and load time).")
+    parser.add_argument("--sizes", default="1000,20000", help="Comma-separated corpus sizes (elements)")
+    parser.add_argument("--kinds", default="wide,style", help="HTML corpus kinds (see bench_generators.py)")
+    parser.add_argument("--plan-version", type=int, default=2, choices=[1, 2], help="Plan schema of the generated plans")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case (best is reported)")
+    parser.add_argument("--seed", type=int, default=7, help="Corpus random seed")
+    parser.add_argument("--output", default="", help="Write results JSON (path under temp root)")
+    parser.add_argument("--temp-root", default="", help="Temp root directory. Defaults to system temp/auto-figma")
+    args = parser.parse_args()
+
+    temp_root = Path(args.temp_root).resolve() if args.temp_root else html_gen.default_temp_root().resolve()
+    work_dir = temp_root / "bench"
+    output_path = Path(args.output).resolve() if args.output else None
+    if output_path and not html_gen.is_within(output_path, temp_root):
+        raise SystemExit(f"Output path must be under temp root: {temp_root}")
+    kinds = [item.strip() for item in args.kinds.split(",") if item.strip()]
+    unknown = set(kinds) - set(HTML_KINDS)
+    if unknown:
+        raise SystemExit(f"Unknown corpus kinds: {', '.join(sorted(unknown))}")
+
+    results: dict[str, dict] = {}
+    for kind in kinds:
+        for size in [int(item) for item in args.sizes.split(",") if item.strip()]:
+            tree = html_gen.MiniHTMLTree()
+            tree.feed(html_corpus(kind, size, random.Random(args.seed)))
+            plan = html_gen.build_plan(
+                Path("bench.html"), tree.root, "bench", "bench", "bench", "HTML-bench", 1440, 1024, 32, 16, args.plan_version
+            )
+            meta, operations = plan["meta"], plan["operations"]
+            baseline = 0
+            for encoding in ENCODINGS:
+                path = work_dir / f"bench_plan_format.{encoding.replace('compact', 'json.compact')}"
+                write_sec = best_of(lambda: write_encoding(path, encoding, meta, operations), args.repeat)
+                size_bytes = path.stat().st_size
+                load_sec = best_of(lambda: load_encoding(path, encoding), args.repeat)
+                path.unlink(missing_ok=True)
+                baseline = baseline or size_bytes
+                name = f"{kind}-{size}-{encoding}"
+                results[name] = {
+                    "operations": len(operations),
+                    "bytes": size_bytes,
+                    "ratio": round(size_bytes / baseline, 3),
+                    "write_sec": round(write_sec, 4),
+                    "load_sec": round(load_sec, 4),
+                }
+                print(
+                    f"{name:>26}: {size_bytes:>11} B ({size_bytes / baseline:6.1%})  "
+                    f"write {write_sec:.3f}s  load {load_sec:.3f}s  ({len(operations)} ops)"
+                )
+
+    if output_path:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"seed": args.seed, "repeat": args.repeat, "plan_version": args.plan_version, "results": results}
+        output_path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+        print(f"Results written: {output_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
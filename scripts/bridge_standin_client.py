@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""Local stand-in for the bridge plugin UI, for exercising the bridge without Figma."""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import gzip
+import itertools
+import json
+import os
+import random
+import select
+import socket
+import time
+import zlib
+from typing import Any
+from urllib.error import URLError
+from urllib.parse import urlencode, urlparse
+from urllib.request import Request, urlopen
+
+from figma_bridge_apply_plan import (
+    COMPRESS_LEVEL,
+    WS_OP_CLOSE,
+    WS_OP_TEXT,
+    encode_ws_frame,
+    read_ws_message,
+    websocket_accept,
+)
+
+NODE_TYPES = {
+    "create-page": "PAGE",
+    "create-frame": "FRAME",
+    "create-text": "TEXT",
+}
+
+
+class StandinPlugin:
+    def __init__(
+        self,
+        file_name: str,
+        file_key: str,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        error_commands: set[str] | None = None,
+        seed: int | None = None,
+    ) -> None:
+        self.file_name = file_name
+        self.file_key = file_key
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_commands = error_commands or set()
+        self.random = random.Random(seed)
+        self.counter = itertools.count(2)
+        self.nodes: dict[str, dict[str, str]] = {"0:1": {"id": "0:1", "name": "Page 1", "type": "PAGE"}}
+        self.current_page = "0:1"
+        self.handled = 0
+        self.injected_errors = 0
+
+    def handle_command(self, command: str, args: dict[str, Any]) -> dict[str, Any]:
+        if command == "status":
+            page = self.nodes[self.current_page]
+            return {
+                "fileName": self.file_name,
+                "fileKey": self.file_key,
+                "pageId": page["id"],
+                "pageName": page["name"],
+            }
+
+        if command in NODE_TYPES:
+            node_id = f"1:{next(self.counter)}"
+            node = {"id": node_id, "name": str(args.get("name") or NODE_TYPES[command].title()), "type": NODE_TYPES[command]}
+            self.nodes[node_id] = node
+            return node
+
+        if command == "create-component":
+            node_id = f"1:{next(self.counter)}"
+            component = {"id": node_id, "name": str(args.get("name") or "Component"), "type": "COMPONENT"}
+            self.nodes[node_id] = component
+            built = self.handle_command("create-tree", {"nodes": args.get("children") or []})
+            return {**component, "count": built["count"] + 1}
+
+        if command == "create-instance":
+            component = self.nodes.get(str(args.get("componentId", "")))
+            if not component or component["type"] != "COMPONENT":
+                raise RuntimeError("Component not found")
+            node_id = f"1:{next(self.counter)}"
+            node = {"id": node_id, "name": str(args.get("name") or component["name"]), "type": "INSTANCE"}
+            self.nodes[node_id] = node
+            return node
+
+        if command == "create-tree":
+            captures: dict[str, str] = {}
+            created: list[str] = []
+            pending = list(reversed(args.get("nodes") or []))
+            while pending:
+                spec = pending.pop()
+                if spec.get("command") not in ("create-frame", "create-text"):
+                    raise RuntimeError(f"Unsupported tree node: {spec.get('command')}")
+                node = self.handle_command(spec["command"], spec.get("args") or {})
+                created.append(node["id"])
+                if spec.get("capture"):
+                    captures[str(spec["capture"])] = node["id"]
+                pending.extend(reversed(spec.get("children") or []))
+            return {"id": created[0] if created else None, "count": len(created), "captures": captures}
+
+        if command == "preload-fonts":
+            fonts = args.get("fonts") if isinstance(args.get("fonts"), list) else []
+            return {"loaded": len(fonts), "failed": []}
+
+        if command == "set-current-page":
+            id_or_name = args.get("idOrName")
+            for node in self.nodes.values():
+                if node["type"] == "PAGE" and id_or_name in (node["id"], node["name"]):
+                    self.current_page = node["id"]
+                    return node
+            raise RuntimeError(f"Page not found: {id_or_name}")
+
+        if command == "delete-node":
+            node = self.nodes.pop(str(args.get("id", "")), None)
+            if not node:
+                raise RuntimeError("Node not found")
+            return node
+
+        if command.startswith("set-"):
+            node = self.nodes.get(str(args.get("id", "")))
+            if not node:
+                raise RuntimeError("Node not found")
+            return node
+
+        raise RuntimeError(f"Unsupported command: {command}")
+
+    def inject(self, command: str) -> None:
+        # The real plugin runs commands one at a time, so latency is spent inline.
+        delay = self.latency_ms + (self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if command == "status":
+            return
+        if command in self.error_commands or (self.error_rate > 0 and self.random.random() < self.error_rate):
+            self.injected_errors += 1
+            raise RuntimeError(f"Injected failure: {command}")
+
+    def run_command(self, message: dict[str, Any]) -> dict[str, Any]:
+        request_id = message.get("id") or "unknown"
+        self.handled += 1
+        command = str(message.get("command", ""))
+        try:
+            self.inject(command)
+            result = self.handle_command(command, message.get("args") or {})
+            return {"id": request_id, "ok": True, "result": result}
+        except RuntimeError as exc:
+            return {"id": request_id, "ok": False, "error": str(exc)}
+
+    def handle(self, message: dict[str, Any]) -> dict[str, Any]:
+        if isinstance(message.get("batch"), list):
+            return {"batch": [self.run_command(item) for item in message["batch"]]}
+        return self.run_command(message)
+
+
+def client_query(plugin: StandinPlugin) -> str:
+    # Registers like ui.html does once code.js reports the fileKey.
+    if not plugin.file_key:
+        return ""
+    return "?" + urlencode({"client": plugin.file_key, "name": plugin.file_name})
+
+
+def run_polling(plugin: StandinPlugin, base: str, deadline: float, compress: bool = True) -> None:
+    query = client_query(plugin)
+    # Like the browser: advertise gzip/deflate and inflate responses; gzip large replies when the bridge accepts them.
+    poll_headers = {"Accept-Encoding": "gzip, deflate"} if compress else {}
+    while time.time() < deadline:
+        delay = 0.25
+        try:
+            with urlopen(Request(f"{base}/next{query}", headers=poll_headers), timeout=60) as resp:  # nosec B310
+                long_poll = resp.headers.get("X-Bridge-Long-Poll") == "1"
+                if resp.status == 200:
+                    body = resp.read()
+                    encoding = resp.headers.get("Content-Encoding", "")
+                    if encoding == "gzip":
+                        body = gzip.decompress(body)
+                    elif encoding == "deflate":
+                        body = zlib.decompress(body)
+                    reply = plugin.handle(json.loads(body.decode("utf-8")))
+                    data = json.dumps(reply, ensure_ascii=False).encode("utf-8")
+                    headers = {"Content-Type": "application/json"}
+                    compress_min = int(resp.headers.get("X-Bridge-Compress-Min") or 0)
+                    accepted = resp.headers.get("X-Bridge-Accept-Encoding") or ""
+                    if compress and "gzip" in accepted and 0 < compress_min <= len(data):
+                        data = gzip.compress(data, compresslevel=COMPRESS_LEVEL)
+                        headers["Content-Encoding"] = "gzip"
+                    request = Request(f"{base}/result", data=data, headers=headers)
+                    urlopen(request, timeout=10).read()  # nosec B310
+                    delay = 0
+                elif long_poll:
+                    delay = 0
+        except (URLError, OSError):
+            pass
+        if delay:
+            time.sleep(delay)
+
+
+def open_websocket(base: str, query: str = "") -> socket.socket:
+    parsed = urlparse(base)
+    sock = socket.create_connection((parsed.hostname or "127.0.0.1", parsed.port or 80), timeout=5)
+    key = base64.b64encode(os.urandom(16)).decode("ascii")
+    sock.sendall(
+        (
+            f"GET /ws{query} HTTP/1.1\r\nHost: {parsed.netloc}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+        ).encode("latin-1")
+    )
+    head = b""
+    while b"\r\n\r\n" not in head:
+        chunk = sock.recv(1024)
+        if not chunk:
+            raise ConnectionError("WebSocket handshake aborted")
+        head += chunk
+    status_line, _, rest = head.partition(b"\r\n")
+    if b" 101 " not in status_line or websocket_accept(key).encode("ascii") not in rest:
+        sock.close()
+        raise ConnectionError(f"WebSocket upgrade refused: {status_line.decode('latin-1')}")
+    sock.settimeout(None)
+    return sock
+
+
+def run_websocket(plugin: StandinPlugin, sock: socket.socket, deadline: float) -> None:
+    buffer = bytearray()
+
+    def read_exact(size: int) -> bytes:
+        while len(buffer) < size:
+            chunk = sock.recv(max(size - len(buffer), 65536))
+            if not chunk:
+                raise ConnectionError("websocket closed")
+            buffer.extend(chunk)
+        data = bytes(buffer[:size])
+        del buffer[:size]
+        return data
+
+    def send_frame(data: bytes, opcode: int = WS_OP_TEXT) -> None:
+        sock.sendall(encode_ws_frame(data, opcode, mask=True))
+
+    try:
+        while time.time() < deadline:
+            # Only block inside a frame; between messages wake up to honour the deadline.
+            if not buffer and not select.select([sock], [], [], 1.0)[0]:
+                continue
+            opcode, data = read_ws_message(read_exact, send_frame)
+            if opcode == WS_OP_CLOSE:
+                return
+            reply = plugin.handle(json.loads(data.decode("utf-8")))
+            send_frame(json.dumps(reply, ensure_ascii=False).encode("utf-8"))
+    finally:
+        try:
+            send_frame(b"", WS_OP_CLOSE)
+        except OSError:
+            pass
+        sock.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Answer bridge commands like the Figma plugin UI would.")
+    parser.add_argument("--base", default="http://127.0.0.1:38450", help="Bridge base URL")
+    parser.add_argument(
+        "--transport",
+        default="auto",
+        choices=["auto", "ws", "poll"],
+        help="auto tries /ws first and falls back to /next polling",
+    )
+    parser.add_argument("--duration-sec", type=float, default=0.0, help="Stop after N seconds (0 runs until Ctrl-C)")
+    parser.add_argument("--file-name", default="Stand-in File", help="fileName reported by status")
+    parser.add_argument(
+        "--file-key",
+        default="STANDIN",
+        help="fileKey reported by status and registered with the bridge (empty serves unrouted commands only)",
+    )
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated execution time per command")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- jitter added to --latency-ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability (0-1) that a command fails")
+    parser.add_argument("--error-commands", default="", help="Comma-separated commands that always fail")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for jitter and error injection")
+    parser.add_argument("--no-compress", action="store_true", help="Poll without Accept-Encoding and post plain results")
+    args = parser.parse_args()
+
+    base = args.base.rstrip("/")
+    deadline = time.time() + args.duration_sec if args.duration_sec > 0 else float("inf")
+    plugin = StandinPlugin(
+        args.file_name,
+        args.file_key,
+        latency_ms=max(args.latency_ms, 0.0),
+        jitter_ms=max(args.jitter_ms, 0.0),
+        error_rate=min(max(args.error_rate, 0.0), 1.0),
+        error_commands={item.strip() for item in args.error_commands.split(",") if item.strip()},
+        seed=args.seed,
+    )
+    transport = ""
+    try:
+        while time.time() < deadline:
+            if args.transport != "poll":
+                try:
+                    sock = open_websocket(base, client_query(plugin))
+                except (OSError, ConnectionError) as exc:
+                    if args.transport == "ws":
+                        if transport != "unavailable":
+                            transport = "unavailable"
+                            print(f"WebSocket unavailable: {exc}")
+                        time.sleep(1.0)
+                        continue
+                else:
+                    if transport != "websocket":
+                        transport = "websocket"
+                        print("Transport: websocket")
+                    try:
+                        run_websocket(plugin, sock, deadline)
+                    except (OSError, ConnectionError):
+                        pass
+                    continue
+            if transport != "polling":
+                transport = "polling"
+                print("Transport: polling")
+            # In auto mode, poll for a while and then retry the socket, like ui.html.
+            poll_deadline = deadline if args.transport == "poll" else min(deadline, time.time() + 5.0)
+            run_polling(plugin, base, poll_deadline, compress=not args.no_compress)
+    except KeyboardInterrupt:
+        pass
+    print(f"Commands handled: {plugin.handled}")
+    if plugin.injected_errors:
+        print(f"Injected errors: {plugin.injected_errors}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
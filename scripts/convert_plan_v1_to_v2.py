@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Convert a v1 run-token plan into a typed v2 plan."""
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+
+from figma_bridge_apply_plan import convert_plan_to_v2, default_temp_root, is_within
+from plan_codec import load_plan
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Convert a v1 bridge plan to plan schema v2.")
+    parser.add_argument("--plan", required=True, help="Path to v1 plan JSON")
+    parser.add_argument("--output", default="", help="Output path (defaults to <plan>_v2.json next to the input)")
+    parser.add_argument("--temp-root", default="", help="Temp root directory. Defaults to system temp/auto-figma")
+    args = parser.parse_args()
+
+    temp_root = Path(args.temp_root).resolve() if args.temp_root else default_temp_root().resolve()
+    plan_path = Path(args.plan).resolve()
+    if not plan_path.exists():
+        raise SystemExit(f"Plan not found: {plan_path}")
+    stem = Path(plan_path.name[:-3] if plan_path.name.endswith(".gz") else plan_path.name).stem
+    output_path = Path(args.output).resolve() if args.output else plan_path.with_name(f"{stem}_v2.json")
+    if not is_within(output_path, temp_root):
+        raise SystemExit(f"Output path must be under temp root: {temp_root}")
+
+    try:
+        plan = load_plan(plan_path)
+    except (OSError, ValueError) as exc:
+        raise SystemExit(f"Unreadable plan: {exc}")
+    if not isinstance(plan, dict) or not isinstance(plan.get("operations"), list):
+        raise SystemExit("Invalid plan: operations must be list")
+    try:
+        converted = convert_plan_to_v2(plan)
+    except RuntimeError as exc:
+        raise SystemExit(str(exc))
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(converted, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Converted plan: {output_path}")
+    print(f"Operations: {len(converted['operations'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -4,52 +4,670 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
+import base64
+import bisect
+import gzip
+import hashlib
+import io
+import itertools
 import json
+import math
 import os
 import random
+import socket
+import struct
+import sys
 import threading
 import tempfile
 import time
 import uuid
-from collections import deque
+import zlib
+from collections import Counter, deque
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future, wait
 from dataclasses import dataclass, field
 from datetime import datetime
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from typing import Any
-from urllib.parse import urlparse
+from typing import Any, Callable, Iterable, Iterator, TextIO
+from urllib.parse import parse_qs, urlparse
 import re
 
-PLACEHOLDER_RE = re.compile(r"\{\{([a-zA-Z0-9_.-]+)\}\}")
+from plan_codec import load_plan, open_plan_text
+from plan_ops import PLACEHOLDER_RE, plan_fonts as scan_plan_fonts
+
 NODE_ID_RE = re.compile(r"\b\d+:\d+\b")
+FILE_KEY_RE = re.compile(r"[A-Za-z0-9]+")
 AUTO_TMP_DIR_NAME = "auto-figma"
+BARRIER_COMMANDS = {"create-page", "set-current-page"}
+BARRIER_RUN_HEADS = {("create", "page"), ("page", "set")}
+TREE_CHUNK_NODES = 500
+POLL_HEARTBEAT_SEC = 1.0
+DAEMON_PORT = 38451
+JOURNAL_VERSION = 1
+JOURNAL_SYNC_EVERY = 64
+JOURNAL_SYNC_SEC = 1.0
+LATENCY_BUCKETS_SEC = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POLL_RATE_WINDOW_SEC = 10.0
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_WINDOW = 4096
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_LEVEL = 6
+COMPRESS_ENCODINGS = ("gzip", "deflate")
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+WS_OP_CONTINUATION = 0x0
+WS_OP_TEXT = 0x1
+WS_OP_CLOSE = 0x8
+WS_OP_PING = 0x9
+WS_OP_PONG = 0xA
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET,POST,OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type, Content-Encoding",
+    "Access-Control-Expose-Headers": "X-Bridge-Long-Poll, X-Bridge-Accept-Encoding, X-Bridge-Compress-Min",
+}
 
 
 def parse_padding(raw: str) -> str:
     return raw.strip()
 
 
+@dataclass
+class LatencyHistogram:
+    counts: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_SEC) + 1))
+    total: float = 0.0
+    # Percentiles on /metrics cover recent commands only, so a long-lived bridge stays bounded.
+    samples: deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+
+    def observe(self, value: float) -> None:
+        # Buckets are upper-inclusive, as Prometheus `le` labels expect.
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_SEC, value)] += 1
+        self.total += value
+        self.samples.append(value)
+
+    def snapshot(self) -> dict[str, Any]:
+        cumulative = list(itertools.accumulate(self.counts))
+        buckets = {str(bound): count for bound, count in zip(LATENCY_BUCKETS_SEC, cumulative)}
+        buckets["+Inf"] = cumulative[-1]
+        return {
+            "count": cumulative[-1],
+            "sum_sec": round(self.total, 6),
+            "buckets": buckets,
+            **latency_summary(list(self.samples)),
+        }
+
+
+def transfer_summary(transfer: dict[str, list[int]]) -> dict[str, dict[str, int]]:
+    return {
+        direction: {"raw_bytes": raw, "wire_bytes": wire, "saved_bytes": raw - wire}
+        for direction, (raw, wire) in transfer.items()
+    }
+
+
+@dataclass
+class BridgeMetrics:
+    # Mutated only while BridgeState.lock is held.
+    started: float = field(default_factory=time.monotonic)
+    tracked: dict[str, list[Any]] = field(default_factory=dict)
+    completed: Counter = field(default_factory=Counter)
+    failed: Counter = field(default_factory=Counter)
+    queue_wait: LatencyHistogram = field(default_factory=LatencyHistogram)
+    execution: LatencyHistogram = field(default_factory=LatencyHistogram)
+    polls: int = 0
+    recent_polls: deque[float] = field(default_factory=deque)
+    # Raw samples for the task currently applying to each target; at most one task per target runs.
+    task_samples: dict[str, dict[str, Any]] = field(default_factory=dict)
+    # direction ("next" commands, "result" replies) -> [payload bytes, bytes on the wire]
+    transfer: dict[str, list[int]] = field(default_factory=lambda: {"next": [0, 0], "result": [0, 0]})
+
+    def on_enqueue(self, request_id: str, command: str, target: str) -> None:
+        # [command, target, queued at, delivered at]
+        self.tracked[request_id] = [command, target, time.perf_counter(), 0.0]
+
+    def on_dispatch(self, items: list[dict[str, Any]]) -> None:
+        # A requeued command is delivered again; its wait runs until the last delivery.
+        now = time.perf_counter()
+        for item in items:
+            entry = self.tracked.get(item["id"])
+            if entry is not None:
+                entry[3] = now
+
+    def on_result(self, request_id: str, ok: bool) -> None:
+        entry = self.tracked.pop(request_id, None)
+        if entry is None:
+            return
+        command, target, queued, delivered = entry
+        now = time.perf_counter()
+        delivered = delivered or now
+        self.queue_wait.observe(delivered - queued)
+        self.execution.observe(now - delivered)
+        (self.completed if ok else self.failed)[command] += 1
+        task = self.task_samples.get(target)
+        if task is not None:
+            task["queue_wait"].append(delivered - queued)
+            task["execution"].append(now - delivered)
+            task["failed"] += 0 if ok else 1
+
+    def start_task(self, target: str) -> None:
+        self.task_samples[target] = {"queue_wait": [], "execution": [], "failed": 0}
+
+    def finish_task(self, target: str) -> dict[str, Any]:
+        return self.task_samples.pop(target, None) or {"queue_wait": [], "execution": [], "failed": 0}
+
+    def on_transfer(self, direction: str, raw_bytes: int, wire_bytes: int) -> None:
+        totals = self.transfer[direction]
+        totals[0] += raw_bytes
+        totals[1] += wire_bytes
+
+    def on_poll(self) -> None:
+        now = time.monotonic()
+        self.polls += 1
+        self.recent_polls.append(now)
+        while self.recent_polls and now - self.recent_polls[0] > POLL_RATE_WINDOW_SEC:
+            self.recent_polls.popleft()
+
+    def snapshot(self, queue_depth: int, last_poll_ts: float, clients: dict[str, dict[str, Any]]) -> dict[str, Any]:
+        now = time.monotonic()
+        recent = sum(1 for ts in self.recent_polls if now - ts <= POLL_RATE_WINDOW_SEC)
+        window = min(POLL_RATE_WINDOW_SEC, max(now - self.started, 1e-9))
+        commands = sorted(set(self.completed) | set(self.failed))
+        return {
+            "uptime_sec": round(now - self.started, 3),
+            "queue_depth": queue_depth,
+            "in_flight": sum(1 for entry in self.tracked.values() if entry[3]),
+            "polls_total": self.polls,
+            "poll_rate_per_sec": round(recent / window, 3),
+            "last_poll_age_sec": round(time.time() - last_poll_ts, 3) if last_poll_ts else None,
+            "clients": clients,
+            "commands": {
+                name: {"completed": self.completed[name], "failed": self.failed[name]} for name in commands
+            },
+            "queue_wait": self.queue_wait.snapshot(),
+            "execution": self.execution.snapshot(),
+            "transfer": transfer_summary(self.transfer),
+        }
+
+
 @dataclass
 class BridgeState:
+    # Unrouted commands go to whichever plugin polls first; routed ones wait for the plugin
+    # instance that registered with that fileKey (?client= on /next and /ws).
     queue: deque[dict[str, Any]] = field(default_factory=deque)
-    results: dict[str, dict[str, Any]] = field(default_factory=dict)
+    routed: dict[str, deque[dict[str, Any]]] = field(default_factory=dict)
+    routes: dict[str, str] = field(default_factory=dict)
+    clients: dict[str, dict[str, Any]] = field(default_factory=dict)
+    pending: dict[str, Future] = field(default_factory=dict)
+    # request_id -> thread that enqueued it, so a daemon can purge a finished task's leftovers.
+    owners: dict[str, int] = field(default_factory=dict)
     lock: threading.Lock = field(default_factory=threading.Lock)
     condition: threading.Condition = field(init=False)
     last_poll_ts: float = 0.0
+    batch_size: int = 1
+    long_poll_sec: float = 0.0
+    websocket: bool = False
+    compress_min_bytes: int = COMPRESS_MIN_BYTES
+    wakeups: list[Callable[[], None]] = field(default_factory=list)
+    metrics: BridgeMetrics = field(default_factory=BridgeMetrics)
+    polled: threading.Event = field(default_factory=threading.Event)
 
     def __post_init__(self) -> None:
         self.condition = threading.Condition(self.lock)
 
+    def queue_for(self, target: str) -> deque[dict[str, Any]]:
+        # Caller must hold lock.
+        return self.routed.setdefault(target, deque()) if target else self.queue
+
+    def enqueue(self, commands: list[tuple[str, dict[str, Any]]], target: str = "") -> list[Future]:
+        futures: list[Future] = []
+        owner = threading.get_ident()
+        with self.condition:
+            queue = self.queue_for(target)
+            for command, args in commands:
+                request_id = str(uuid.uuid4())
+                future: Future = Future()
+                self.pending[request_id] = future
+                self.owners[request_id] = owner
+                if target:
+                    self.routes[request_id] = target
+                self.metrics.on_enqueue(request_id, command, target)
+                queue.append({"id": request_id, "command": command, "args": args})
+                futures.append(future)
+            # Only parked /next pollers wait on the condition; result waiters hold their own future.
+            self.condition.notify_all()
+            wakeups = list(self.wakeups)
+        for wake in wakeups:
+            wake()
+        return futures
+
+    def requeue(self, payload: dict[str, Any]) -> None:
+        # Commands popped for a transport that died before delivery go back to the front.
+        items = payload["batch"] if "batch" in payload else [payload]
+        with self.condition:
+            for item in reversed(items):
+                if str(item["id"]) not in self.pending:
+                    continue
+                self.queue_for(self.routes.get(str(item["id"]), "")).appendleft(item)
+            self.condition.notify_all()
+
+    def withdraw(self, futures: Iterable[Future]) -> list[Future]:
+        """Take back commands that are still queued; they never reached a plugin, so running
+        them later is safe. Delivered commands stay pending. Returns the withdrawn futures."""
+        wanted = set(futures)
+        with self.lock:
+            ids = {request_id for request_id, future in self.pending.items() if future in wanted}
+            withdrawn = self.drop_requests(self.unqueue(ids))
+        for future in withdrawn:
+            future.cancel()
+        return withdrawn
+
+    def abandon(self, owner: int) -> int:
+        """Forget every command a finished task left behind: queued ones never reach a plugin,
+        and late results for delivered ones are ignored. Returns how many were dropped."""
+        with self.lock:
+            ids = {request_id for request_id, thread in self.owners.items() if thread == owner}
+            self.unqueue(ids)
+            dropped = self.drop_requests(ids)
+        for future in dropped:
+            future.cancel()
+        return len(dropped)
+
+    def unqueue(self, ids: set[str]) -> set[str]:
+        # Caller must hold lock. Returns the ids that were still queued.
+        removed: set[str] = set()
+        for queue in [self.queue, *self.routed.values()]:
+            kept = [item for item in queue if item["id"] not in ids]
+            if len(kept) == len(queue):
+                continue
+            removed.update(item["id"] for item in queue if item["id"] in ids)
+            queue.clear()
+            queue.extend(kept)
+        return removed
+
+    def drop_requests(self, ids: Iterable[str]) -> list[Future]:
+        # Caller must hold lock.
+        futures: list[Future] = []
+        for request_id in ids:
+            future = self.pending.pop(request_id, None)
+            if future is not None:
+                futures.append(future)
+            self.routes.pop(request_id, None)
+            self.owners.pop(request_id, None)
+            self.metrics.tracked.pop(request_id, None)
+        return futures
+
+    def resolve(self, items: list[dict[str, Any]]) -> None:
+        with self.lock:
+            resolved = [(self.pending.pop(str(item["id"]), None), item) for item in items]
+            for item in items:
+                self.routes.pop(str(item["id"]), None)
+                self.owners.pop(str(item["id"]), None)
+                self.metrics.on_result(str(item["id"]), bool(item.get("ok")))
+        for future, item in resolved:
+            if future is not None and not future.done():
+                future.set_result(item)
+
+    def stamp_poll(self, client: str = "", name: str = "") -> None:
+        # Caller must hold lock.
+        now = time.time()
+        self.last_poll_ts = now
+        if client:
+            info = self.clients.setdefault(client, {"name": "", "last_poll_ts": 0.0})
+            info["last_poll_ts"] = now
+            if name:
+                info["name"] = name
+        self.polled.set()
+
+    def mark_poll(self, client: str = "", name: str = "") -> None:
+        with self.lock:
+            self.stamp_poll(client, name)
+
+    def is_connected(self, target: str = "") -> bool:
+        with self.lock:
+            last = self.clients.get(target, {}).get("last_poll_ts", 0.0) if target else self.last_poll_ts
+            return (time.time() - last) < 2.5
+
+    def has_commands(self, client: str) -> bool:
+        # Caller must hold lock.
+        return bool(self.queue) or bool(client and self.routed.get(client))
+
+    def take_commands(self, client: str = "") -> dict[str, Any] | None:
+        # Caller must hold lock. batch_size 1 keeps the single-command payload shape.
+        # Commands routed to this plugin go before unrouted ones.
+        sources = [queue for queue in (self.routed.get(client) if client else None, self.queue) if queue]
+        if not sources:
+            return None
+        if self.batch_size <= 1:
+            payload = sources[0].popleft()
+            self.metrics.on_dispatch([payload])
+            return payload
+        items: list[dict[str, Any]] = []
+        for source in sources:
+            while source and len(items) < self.batch_size:
+                items.append(source.popleft())
+        self.metrics.on_dispatch(items)
+        return {"batch": items}
+
+    def wait_commands(
+        self, timeout_sec: float, client: str = "", name: str = "", count: bool = True
+    ) -> dict[str, Any] | None:
+        # Parked pollers refresh last_poll_ts so /health and wait_for_plugin stay accurate.
+        with self.condition:
+            self.stamp_poll(client, name)
+            if count:
+                self.metrics.on_poll()
+            deadline = self.last_poll_ts + timeout_sec
+            while not self.has_commands(client):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.condition.wait(timeout=min(remaining, POLL_HEARTBEAT_SEC))
+                self.stamp_poll(client)
+            return self.take_commands(client)
+
+    def count_poll(self) -> None:
+        with self.lock:
+            self.metrics.on_poll()
+
+    def poll_commands(self, client: str = "", name: str = "") -> dict[str, Any] | None:
+        # Not counted: the asyncio server calls this on every wakeup of one parked poll.
+        with self.lock:
+            self.stamp_poll(client, name)
+            return self.take_commands(client)
+
+    def client_snapshot(self) -> dict[str, dict[str, Any]]:
+        # Caller must hold lock. Targets with queued commands show up even before their plugin polls.
+        now = time.time()
+        result: dict[str, dict[str, Any]] = {}
+        for key in sorted(set(self.clients) | {key for key, queue in self.routed.items() if queue}):
+            info = self.clients.get(key, {})
+            last = info.get("last_poll_ts", 0.0)
+            result[key] = {
+                "name": info.get("name", ""),
+                "connected": bool(last) and now - last < 2.5,
+                "queue_depth": len(self.routed.get(key, ())),
+                "last_poll_age_sec": round(now - last, 3) if last else None,
+            }
+        return result
+
+    def health(self) -> dict[str, Any]:
+        with self.lock:
+            clients = self.client_snapshot()
+            connected = (time.time() - self.last_poll_ts) < 2.5
+        return {"connected": connected, "clients": clients}
+
+    def count_transfer(self, direction: str, raw_bytes: int, wire_bytes: int | None = None) -> None:
+        # WebSocket frames go uncompressed (wire == raw) but still count toward the bytes moved.
+        with self.lock:
+            self.metrics.on_transfer(direction, raw_bytes, raw_bytes if wire_bytes is None else wire_bytes)
+
+    def metrics_snapshot(self) -> dict[str, Any]:
+        with self.lock:
+            depth = len(self.queue) + sum(len(queue) for queue in self.routed.values())
+            return self.metrics.snapshot(depth, self.last_poll_ts, self.client_snapshot())
+
+
+def poll_identity(query: str) -> tuple[str, str]:
+    params = parse_qs(query)
+    client = params.get("client", [""])[0].strip()
+    return (client if FILE_KEY_RE.fullmatch(client) else ""), params.get("name", [""])[0][:200]
+
+
+def parse_result_items(raw: bytes) -> list[dict[str, Any]] | None:
+    try:
+        payload = json.loads(raw.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return None
+    items = payload.get("batch") if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        items = [payload]
+    if not all(isinstance(item, dict) and str(item.get("id", "")) for item in items):
+        return None
+    return items
+
+
+def render_prometheus(snapshot: dict[str, Any]) -> str:
+    lines: list[str] = []
+
+    def metric(name: str, kind: str, help_text: str, samples: list[tuple[str, Any]]) -> None:
+        lines.append(f"# HELP figma_bridge_{name} {help_text}")
+        lines.append(f"# TYPE figma_bridge_{name} {kind}")
+        lines.extend(f"figma_bridge_{name}{labels} {value}" for labels, value in samples)
+
+    last_poll_age = snapshot["last_poll_age_sec"]
+    metric("uptime_seconds", "gauge", "Seconds since the bridge server started.", [("", snapshot["uptime_sec"])])
+    metric("queue_depth", "gauge", "Commands queued but not yet delivered to the plugin.", [("", snapshot["queue_depth"])])
+    metric("in_flight", "gauge", "Commands delivered to the plugin and awaiting a result.", [("", snapshot["in_flight"])])
+    metric("polls_total", "counter", "Plugin /next polls and WebSocket delivery waits.", [("", snapshot["polls_total"])])
+    metric(
+        "poll_rate",
+        "gauge",
+        f"Polls per second over the last {POLL_RATE_WINDOW_SEC:g}s.",
+        [("", snapshot["poll_rate_per_sec"])],
+    )
+    metric(
+        "last_poll_age_seconds",
+        "gauge",
+        "Seconds since the plugin last polled (-1 before the first poll).",
+        [("", -1 if last_poll_age is None else last_poll_age)],
+    )
+    clients = snapshot["clients"]
+    metric(
+        "client_queue_depth",
+        "gauge",
+        "Commands routed to one plugin instance (by fileKey) and not yet delivered.",
+        [(f'{{client="{key}"}}', info["queue_depth"]) for key, info in clients.items()],
+    )
+    metric(
+        "client_last_poll_age_seconds",
+        "gauge",
+        "Seconds since each registered plugin instance last polled (-1 if it never has).",
+        [
+            (f'{{client="{key}"}}', -1 if info["last_poll_age_sec"] is None else info["last_poll_age_sec"])
+            for key, info in clients.items()
+        ],
+    )
+    commands = snapshot["commands"]
+    for outcome in ("completed", "failed"):
+        metric(
+            f"commands_{outcome}_total",
+            "counter",
+            f"Commands {outcome} by the plugin, by command type.",
+            [(f'{{command="{name}"}}', counts[outcome]) for name, counts in commands.items()],
+        )
+    for name, help_text in (
+        ("queue_wait", "Time from enqueue until delivery to the plugin."),
+        ("execution", "Time from delivery until the plugin posted its result."),
+    ):
+        hist = snapshot[name]
+        samples = [(f'{{le="{bound}"}}', count) for bound, count in hist["buckets"].items()]
+        lines.append(f"# HELP figma_bridge_{name}_seconds {help_text}")
+        lines.append(f"# TYPE figma_bridge_{name}_seconds histogram")
+        lines.extend(f"figma_bridge_{name}_seconds_bucket{labels} {value}" for labels, value in samples)
+        lines.append(f"figma_bridge_{name}_seconds_sum {hist['sum_sec']}")
+        lines.append(f"figma_bridge_{name}_seconds_count {hist['count']}")
+    transfer = snapshot["transfer"]
+    metric(
+        "payload_bytes_total",
+        "counter",
+        "Command (next) and result payload bytes before compression.",
+        [(f'{{direction="{direction}"}}', totals["raw_bytes"]) for direction, totals in transfer.items()],
+    )
+    metric(
+        "wire_bytes_total",
+        "counter",
+        "Command (next) and result bytes as sent, after any gzip/deflate.",
+        [(f'{{direction="{direction}"}}', totals["wire_bytes"]) for direction, totals in transfer.items()],
+    )
+    return "\n".join(lines) + "\n"
+
+
+def render_metrics(state: BridgeState, query: str) -> tuple[bytes, str]:
+    snapshot = state.metrics_snapshot()
+    if parse_qs(query).get("format", [""])[0] == "json":
+        return json.dumps(snapshot).encode("utf-8"), "application/json"
+    return render_prometheus(snapshot).encode("utf-8"), PROMETHEUS_CONTENT_TYPE
+
+
+def transfer_headers(state: BridgeState) -> dict[str, str]:
+    # Browsers send Accept-Encoding and inflate responses on their own; replies are
+    # compressed by the plugin UI, so it is told what the bridge accepts and from what size.
+    if state.compress_min_bytes <= 0:
+        return {}
+    return {
+        "X-Bridge-Accept-Encoding": ", ".join(COMPRESS_ENCODINGS),
+        "X-Bridge-Compress-Min": str(state.compress_min_bytes),
+    }
+
+
+def accepted_encoding(header: str) -> str:
+    offered: dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        offered[name.strip().lower()] = weight
+    for encoding in COMPRESS_ENCODINGS:
+        if offered.get(encoding, offered.get("*", 0.0)) > 0:
+            return encoding
+    return ""
+
+
+def encode_payload(state: BridgeState, data: bytes, accept_encoding: str) -> tuple[bytes, dict[str, str]]:
+    extra = {"Vary": "Accept-Encoding"}
+    encoding = ""
+    if 0 < state.compress_min_bytes <= len(data):
+        encoding = accepted_encoding(accept_encoding)
+    wire = data
+    if encoding == "gzip":
+        wire = gzip.compress(data, compresslevel=COMPRESS_LEVEL)
+    elif encoding == "deflate":
+        # HTTP "deflate" is the zlib-wrapped stream.
+        wire = zlib.compress(data, COMPRESS_LEVEL)
+    if len(wire) >= len(data):
+        wire = data
+    elif encoding:
+        extra["Content-Encoding"] = encoding
+    state.count_transfer("next", len(data), len(wire))
+    return wire, extra
+
+
+def decode_payload(state: BridgeState, data: bytes, content_encoding: str) -> bytes | None:
+    encoding = content_encoding.strip().lower()
+    try:
+        if encoding == "gzip":
+            raw = gzip.decompress(data)
+        elif encoding == "deflate":
+            raw = zlib.decompress(data)
+        elif encoding in ("", "identity"):
+            raw = data
+        else:
+            return None
+    except (OSError, EOFError, zlib.error):
+        return None
+    state.count_transfer("result", len(raw), len(data))
+    return raw
+
+
+def websocket_accept(key: str) -> str:
+    digest = hashlib.sha1((key + WS_GUID).encode("ascii")).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+def encode_ws_frame(data: bytes, opcode: int = WS_OP_TEXT, *, mask: bool = False) -> bytes:
+    head = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(data)
+    if length < 126:
+        head.append(mask_bit | length)
+    elif length < 1 << 16:
+        head.append(mask_bit | 126)
+        head += struct.pack("!H", length)
+    else:
+        head.append(mask_bit | 127)
+        head += struct.pack("!Q", length)
+    if not mask:
+        return bytes(head) + data
+    key = os.urandom(4)
+    return bytes(head) + key + apply_ws_mask(data, key)
+
+
+def apply_ws_mask(data: bytes, key: bytes) -> bytes:
+    if not data:
+        return data
+    repeated = (key * (len(data) // 4 + 1))[: len(data)]
+    return (int.from_bytes(data, "big") ^ int.from_bytes(repeated, "big")).to_bytes(len(data), "big")
+
+
+def read_ws_frame(read_exact: Callable[[int], bytes]) -> tuple[bool, int, bytes]:
+    head = read_exact(2)
+    fin = bool(head[0] & 0x80)
+    opcode = head[0] & 0x0F
+    length = head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", read_exact(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", read_exact(8))[0]
+    key = read_exact(4) if head[1] & 0x80 else b""
+    data = read_exact(length) if length else b""
+    return fin, opcode, apply_ws_mask(data, key) if key else data
+
+
+async def read_ws_frame_async(reader: asyncio.StreamReader) -> tuple[bool, int, bytes]:
+    head = await reader.readexactly(2)
+    fin = bool(head[0] & 0x80)
+    opcode = head[0] & 0x0F
+    length = head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    key = await reader.readexactly(4) if head[1] & 0x80 else b""
+    data = await reader.readexactly(length) if length else b""
+    return fin, opcode, apply_ws_mask(data, key) if key else data
+
+
+def read_ws_message(
+    read_exact: Callable[[int], bytes],
+    send_frame: Callable[[bytes, int], None],
+) -> tuple[int, bytes]:
+    # Answers pings inline and reassembles fragmented data frames.
+    opcode = WS_OP_TEXT
+    chunks: list[bytes] = []
+    while True:
+        fin, frame_op, data = read_ws_frame(read_exact)
+        if frame_op == WS_OP_PING:
+            send_frame(data, WS_OP_PONG)
+            continue
+        if frame_op == WS_OP_PONG:
+            continue
+        if frame_op == WS_OP_CLOSE:
+            return WS_OP_CLOSE, data
+        if frame_op != WS_OP_CONTINUATION:
+            opcode = frame_op
+        chunks.append(data)
+        if fin:
+            return opcode, b"".join(chunks)
+
 
 def make_handler(state: BridgeState):
     class BridgeHandler(BaseHTTPRequestHandler):
-        def _set_headers(self, status: int, content_type: str = "application/json") -> None:
+        def _set_headers(
+            self,
+            status: int,
+            content_type: str = "application/json",
+            extra: dict[str, str] | None = None,
+        ) -> None:
             self.send_response(status)
             self.send_header("Content-Type", content_type)
-            self.send_header("Access-Control-Allow-Origin", "*")
-            self.send_header("Access-Control-Allow-Methods", "GET,POST,OPTIONS")
-            self.send_header("Access-Control-Allow-Headers", "Content-Type")
+            for key, value in {**CORS_HEADERS, **(extra or {})}.items():
+                self.send_header(key, value)
             self.end_headers()
 
         def do_OPTIONS(self) -> None:  # noqa: N802
@@ -58,27 +676,92 @@ def make_handler(state: BridgeState):
         def do_GET(self) -> None:  # noqa: N802
             parsed = urlparse(self.path)
             if parsed.path == "/next":
-                with state.lock:
-                    state.last_poll_ts = time.time()
-                    if state.queue:
-                        payload = state.queue.popleft()
-                        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
-                        self._set_headers(HTTPStatus.OK)
-                        self.wfile.write(data)
-                        return
-                self._set_headers(HTTPStatus.NO_CONTENT)
+                payload = state.wait_commands(state.long_poll_sec, *poll_identity(parsed.query))
+                extra = {"X-Bridge-Long-Poll": "1" if state.long_poll_sec > 0 else "0", **transfer_headers(state)}
+                if payload is not None:
+                    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                    data, encoded = encode_payload(state, data, self.headers.get("Accept-Encoding", ""))
+                    self._set_headers(HTTPStatus.OK, extra={**extra, **encoded})
+                    self.wfile.write(data)
+                    return
+                self._set_headers(HTTPStatus.NO_CONTENT, extra=extra)
                 return
 
             if parsed.path == "/health":
-                with state.lock:
-                    connected = (time.time() - state.last_poll_ts) < 2.5
-                payload = {"connected": connected}
+                payload = state.health()
                 self._set_headers(HTTPStatus.OK)
                 self.wfile.write(json.dumps(payload).encode("utf-8"))
                 return
 
+            if parsed.path == "/metrics":
+                data, content_type = render_metrics(state, parsed.query)
+                self._set_headers(HTTPStatus.OK, content_type)
+                self.wfile.write(data)
+                return
+
+            if parsed.path == "/ws" and state.websocket and self.headers.get("Sec-WebSocket-Key"):
+                self._serve_websocket(*poll_identity(parsed.query))
+                return
+
             self._set_headers(HTTPStatus.NOT_FOUND)
 
+        def _serve_websocket(self, client: str, name: str) -> None:
+            self.send_response(HTTPStatus.SWITCHING_PROTOCOLS)
+            self.send_header("Upgrade", "websocket")
+            self.send_header("Connection", "Upgrade")
+            self.send_header("Sec-WebSocket-Accept", websocket_accept(self.headers["Sec-WebSocket-Key"]))
+            self.end_headers()
+            self.wfile.flush()
+            self.close_connection = True
+
+            send_lock = threading.Lock()
+            closed = threading.Event()
+
+            def send_frame(data: bytes, opcode: int = WS_OP_TEXT) -> None:
+                with send_lock:
+                    self.wfile.write(encode_ws_frame(data, opcode))
+                    self.wfile.flush()
+
+            def read_exact(size: int) -> bytes:
+                data = self.rfile.read(size)
+                if len(data) < size:
+                    raise ConnectionError("websocket closed")
+                return data
+
+            def pump_results() -> None:
+                try:
+                    while True:
+                        opcode, data = read_ws_message(read_exact, send_frame)
+                        if opcode == WS_OP_CLOSE:
+                            return
+                        state.count_transfer("result", len(data))
+                        items = parse_result_items(data)
+                        if items is not None:
+                            state.resolve(items)
+                except (OSError, ConnectionError):
+                    return
+                finally:
+                    closed.set()
+
+            threading.Thread(target=pump_results, daemon=True).start()
+            fresh = True
+            while not closed.is_set():
+                # One poll per delivery, as for /next; heartbeat rounds while idle are not polls.
+                payload = state.wait_commands(POLL_HEARTBEAT_SEC, client, name, count=fresh)
+                fresh = payload is not None
+                if payload is None:
+                    continue
+                if closed.is_set():
+                    state.requeue(payload)
+                    return
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                state.count_transfer("next", len(data))
+                try:
+                    send_frame(data)
+                except OSError:
+                    state.requeue(payload)
+                    return
+
         def do_POST(self) -> None:  # noqa: N802
             parsed = urlparse(self.path)
             if parsed.path != "/result":
@@ -86,22 +769,17 @@ def make_handler(state: BridgeState):
                 return
 
             length = int(self.headers.get("Content-Length", "0"))
-            raw = self.rfile.read(length) if length > 0 else b"{}"
-            try:
-                payload = json.loads(raw.decode("utf-8"))
-            except json.JSONDecodeError:
-                self._set_headers(HTTPStatus.BAD_REQUEST)
+            body = self.rfile.read(length) if length > 0 else b"{}"
+            raw = decode_payload(state, body, self.headers.get("Content-Encoding", ""))
+            if raw is None:
+                self._set_headers(HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
                 return
-
-            request_id = str(payload.get("id", ""))
-            if not request_id:
+            items = parse_result_items(raw)
+            if items is None:
                 self._set_headers(HTTPStatus.BAD_REQUEST)
                 return
 
-            with state.condition:
-                state.results[request_id] = payload
-                state.condition.notify_all()
-
+            state.resolve(items)
             self._set_headers(HTTPStatus.OK)
             self.wfile.write(b'{"ok":true}')
 
@@ -111,6 +789,212 @@ def make_handler(state: BridgeState):
     return BridgeHandler
 
 
+class AsyncBridgeServer:
+    """Bridge endpoints on a private asyncio loop, mirroring the ThreadingHTTPServer surface."""
+
+    def __init__(self, state: BridgeState, host: str, port: int) -> None:
+        self.state = state
+        self.loop = asyncio.new_event_loop()
+        self.queue_event = asyncio.Event()
+        self.stopped = threading.Event()
+        self.server = self.loop.run_until_complete(asyncio.start_server(self.serve_connection, host, port))
+        state.wakeups.append(lambda: self.loop.call_soon_threadsafe(self.queue_event.set))
+
+    def serve_forever(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.stopped.set()
+
+    def shutdown(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.stopped.wait()
+
+    def server_close(self) -> None:
+        self.server.close()
+        tasks = asyncio.all_tasks(self.loop)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            # gather() with no tasks would bind to the caller's loop, not this one.
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self.loop.close()
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                parts = request_line.split(" ")
+                if len(parts) != 3:
+                    writer.write(self.render_response(HTTPStatus.BAD_REQUEST, b"", {}, keep_alive=False))
+                    await writer.drain()
+                    return
+                method, target, version = parts
+                headers: dict[str, str] = {}
+                for line in header_lines:
+                    key, _, value = line.partition(":")
+                    if key:
+                        headers[key.strip().lower()] = value.strip()
+                parsed = urlparse(target)
+                if method == "GET" and parsed.path == "/ws" and self.state.websocket:
+                    if headers.get("sec-websocket-key"):
+                        client, name = poll_identity(parsed.query)
+                        await self.serve_websocket(reader, writer, headers["sec-websocket-key"], client, name)
+                        return
+                length = int(headers.get("content-length", "0") or 0)
+                body = await reader.readexactly(length) if length > 0 else b""
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+                status, data, extra = await self.dispatch(method, parsed.path, parsed.query, body, headers)
+                writer.write(self.render_response(status, data, extra, keep_alive=keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError):
+            return
+        finally:
+            writer.close()
+
+    async def serve_websocket(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        key: str,
+        client: str = "",
+        name: str = "",
+    ) -> None:
+        writer.write(
+            (
+                "HTTP/1.1 101 Switching Protocols\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {websocket_accept(key)}\r\n\r\n"
+            ).encode("latin-1")
+        )
+        await writer.drain()
+
+        async def pump_results() -> None:
+            chunks: list[bytes] = []
+            while True:
+                fin, opcode, data = await read_ws_frame_async(reader)
+                if opcode == WS_OP_CLOSE:
+                    return
+                if opcode == WS_OP_PING:
+                    writer.write(encode_ws_frame(data, WS_OP_PONG))
+                    continue
+                if opcode == WS_OP_PONG:
+                    continue
+                chunks.append(data)
+                if not fin:
+                    continue
+                data = b"".join(chunks)
+                chunks = []
+                self.state.count_transfer("result", len(data))
+                items = parse_result_items(data)
+                if items is not None:
+                    self.state.resolve(items)
+
+        results_task = asyncio.ensure_future(pump_results())
+        try:
+            fresh = True
+            while not results_task.done():
+                payload = await self.wait_commands(POLL_HEARTBEAT_SEC, client, name, count=fresh)
+                fresh = payload is not None
+                if payload is None:
+                    continue
+                if results_task.done():
+                    self.state.requeue(payload)
+                    return
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.state.count_transfer("next", len(data))
+                try:
+                    writer.write(encode_ws_frame(data))
+                    await writer.drain()
+                except ConnectionError:
+                    self.state.requeue(payload)
+                    return
+        finally:
+            results_task.cancel()
+
+    async def dispatch(
+        self,
+        method: str,
+        path: str,
+        query: str,
+        body: bytes,
+        headers: dict[str, str] | None = None,
+    ) -> tuple[int, bytes, dict[str, str]]:
+        state = self.state
+        headers = headers or {}
+        if method == "OPTIONS":
+            return HTTPStatus.NO_CONTENT, b"", {}
+
+        if method == "GET" and path == "/next":
+            payload = await self.wait_commands(state.long_poll_sec, *poll_identity(query))
+            extra = {"X-Bridge-Long-Poll": "1" if state.long_poll_sec > 0 else "0", **transfer_headers(state)}
+            if payload is None:
+                return HTTPStatus.NO_CONTENT, b"", extra
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            data, encoded = encode_payload(state, data, headers.get("accept-encoding", ""))
+            return HTTPStatus.OK, data, {**extra, **encoded}
+
+        if method == "GET" and path == "/health":
+            return HTTPStatus.OK, json.dumps(state.health()).encode("utf-8"), {}
+
+        if method == "GET" and path == "/metrics":
+            data, content_type = render_metrics(state, query)
+            return HTTPStatus.OK, data, {"Content-Type": content_type}
+
+        if method == "POST" and path == "/result":
+            raw = decode_payload(state, body or b"{}", headers.get("content-encoding", ""))
+            if raw is None:
+                return HTTPStatus.UNSUPPORTED_MEDIA_TYPE, b"", {}
+            items = parse_result_items(raw)
+            if items is None:
+                return HTTPStatus.BAD_REQUEST, b"", {}
+            state.resolve(items)
+            return HTTPStatus.OK, b'{"ok":true}', {}
+
+        return HTTPStatus.NOT_FOUND, b"", {}
+
+    async def wait_commands(
+        self, timeout_sec: float, client: str = "", name: str = "", count: bool = True
+    ) -> dict[str, Any] | None:
+        if count:
+            self.state.count_poll()
+        deadline = self.loop.time() + timeout_sec
+        while True:
+            self.queue_event.clear()
+            payload = self.state.poll_commands(client, name)
+            remaining = deadline - self.loop.time()
+            if payload is not None or remaining <= 0:
+                return payload
+            try:
+                await asyncio.wait_for(self.queue_event.wait(), timeout=min(remaining, POLL_HEARTBEAT_SEC))
+            except asyncio.TimeoutError:
+                pass
+
+    @staticmethod
+    def render_response(status: int, data: bytes, extra: dict[str, str], *, keep_alive: bool) -> bytes:
+        status = HTTPStatus(status)
+        headers = {
+            "Content-Type": "application/json",
+            **CORS_HEADERS,
+            **extra,
+            "Content-Length": str(len(data)),
+            "Connection": "keep-alive" if keep_alive else "close",
+        }
+        head = f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        head += "".join(f"{key}: {value}\r\n" for key, value in headers.items())
+        return (head + "\r\n").encode("latin-1") + data
+
+
 def substitute_placeholders(token: str, captures: dict[str, str]) -> str:
     def replacer(match: re.Match[str]) -> str:
         key = match.group(1)
@@ -210,6 +1094,20 @@ def map_operation(run_tokens: list[str]) -> tuple[str, dict[str, Any]]:
             raise RuntimeError(f"Invalid opacity value: {run_tokens[3]}")
         return ("set-opacity", {"id": run_tokens[2], "value": value})
 
+    if run_tokens[0] == "set" and run_tokens[1] == "geometry" and len(run_tokens) >= 3:
+        flags = parse_flags(run_tokens[3:])
+        args = {
+            "id": run_tokens[2],
+            "x": to_number(flags.get("x")),
+            "y": to_number(flags.get("y")),
+            "width": to_number(flags.get("width")),
+            "height": to_number(flags.get("height")),
+        }
+        return ("set-geometry", args)
+
+    if run_tokens[0] == "delete" and run_tokens[1] == "node" and len(run_tokens) >= 3:
+        return ("delete-node", {"id": run_tokens[2]})
+
     if run_tokens[0] == "set" and run_tokens[1] == "layout" and len(run_tokens) >= 3:
         flags = parse_flags(run_tokens[3:])
         args = {
@@ -223,6 +1121,211 @@ def map_operation(run_tokens: list[str]) -> tuple[str, dict[str, Any]]:
     raise RuntimeError(f"Unsupported operation run tokens: {run_tokens}")
 
 
+def normalize_operation(idx: int, op: Any) -> tuple[str, dict[str, Any], dict[str, Any]]:
+    if not isinstance(op, dict):
+        raise SystemExit(f"Operation #{idx} invalid")
+    name = op.get("name", f"op-{idx}")
+    if "command" in op:
+        command = op.get("command")
+        command_args = op.get("args", {})
+        refs = op.get("refs", [])
+        if not isinstance(command, str) or not isinstance(command_args, dict):
+            raise SystemExit(f"Operation #{idx} invalid command/args")
+        if not isinstance(refs, list) or not all(isinstance(command_args.get(key), str) for key in refs):
+            raise SystemExit(f"Operation #{idx} invalid refs")
+        return name, op, {"command": command, "args": command_args, "refs": refs}
+    run = op.get("run")
+    if not isinstance(run, list) or not all(isinstance(x, str) for x in run):
+        raise SystemExit(f"Operation #{idx} invalid run tokens")
+    return name, op, {"run": run}
+
+
+def expand_operation(raw: dict[str, Any], captures: dict[str, str]) -> tuple[str, dict[str, Any]]:
+    if "run" in raw:
+        return map_operation([substitute_placeholders(t, captures) for t in raw["run"]])
+    # v2 operations are already typed; only the declared ref fields need substitution.
+    command_args = dict(raw["args"])
+    for key in raw["refs"]:
+        command_args[key] = substitute_placeholders(command_args[key], captures)
+    return raw["command"], command_args
+
+
+def operation_refs(raw: dict[str, Any]) -> set[str]:
+    tokens = raw["run"] if "run" in raw else [raw["args"][key] for key in raw["refs"]]
+    return {ref for token in tokens for ref in PLACEHOLDER_RE.findall(token)}
+
+
+def is_barrier(raw: dict[str, Any]) -> bool:
+    if "run" in raw:
+        return tuple(raw["run"][:2]) in BARRIER_RUN_HEADS
+    return raw["command"] in BARRIER_COMMANDS
+
+
+def is_tree(raw: dict[str, Any]) -> bool:
+    return raw.get("command") == "create-tree" and isinstance(raw["args"].get("nodes"), list)
+
+
+def iter_tree_nodes(nodes: list[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+    stack = [iter(nodes)]
+    while stack:
+        spec = next(stack[-1], None)
+        if spec is None:
+            stack.pop()
+            continue
+        yield spec
+        if spec.get("children"):
+            stack.append(iter(spec["children"]))
+
+
+def tree_captures(nodes: list[dict[str, Any]]) -> set[str]:
+    return {spec["capture"] for spec in iter_tree_nodes(nodes) if spec.get("capture")}
+
+
+def split_tree(
+    parent_ref: str,
+    nodes: list[dict[str, Any]],
+    limit: int,
+    capture_prefix: str,
+) -> list[tuple[str, list[dict[str, Any]]]]:
+    # Each chunk hangs off a single parent and holds at most `limit` nodes in document order.
+    # Children that do not fit become a later chunk under their parent's capture, so a node
+    # without one gets a synthetic capture; sibling order under every parent is preserved.
+    chunks: list[tuple[str, list[dict[str, Any]]]] = []
+    groups: deque[tuple[str, list[dict[str, Any]]]] = deque([(parent_ref, nodes)])
+    synthetic = itertools.count(1)
+    while groups:
+        parent, siblings = groups.popleft()
+        roots: list[dict[str, Any]] = []
+        budget = max(limit, 1)
+        pos = 0
+        stack: list[list[Any]] = []
+        while budget > 0 and (stack or pos < len(siblings)):
+            if stack:
+                children, index, owner = stack[-1]
+                if index >= len(children):
+                    stack.pop()
+                    continue
+                stack[-1][1] += 1
+                spec = children[index]
+            else:
+                owner = None
+                spec = siblings[pos]
+                pos += 1
+            copy = {key: value for key, value in spec.items() if key != "children"}
+            budget -= 1
+            (owner["children"] if owner is not None else roots).append(copy)
+            if spec.get("children"):
+                copy["children"] = []
+                stack.append([spec["children"], 0, copy])
+        for children, index, owner in stack:
+            if index < len(children):
+                if not owner.get("capture"):
+                    owner["capture"] = f"{capture_prefix}{next(synthetic)}"
+                groups.append((f"{{{{{owner['capture']}}}}}", children[index:]))
+        if pos < len(siblings):
+            groups.appendleft((parent, siblings[pos:]))
+        chunks.append((parent, roots))
+    return chunks
+
+
+def tree_entries(
+    idx: int,
+    name: str,
+    op: dict[str, Any],
+    raw: dict[str, Any],
+    limit: int,
+) -> list[PlanEntry]:
+    parent_ref = raw["args"].get("parentId") or ""
+    chunks = split_tree(parent_ref, raw["args"]["nodes"], limit, f"__tree{idx}_")
+    entries = []
+    for part, (parent, roots) in enumerate(chunks):
+        args: dict[str, Any] = {**raw["args"], "nodes": roots}
+        if parent:
+            args["parentId"] = parent
+        else:
+            args.pop("parentId", None)
+        chunk_raw = {"command": "create-tree", "args": args, "refs": ["parentId"] if PLACEHOLDER_RE.search(parent) else []}
+        # Only the first chunk creates the tree's first node, which an op-level capture names.
+        chunk_op = op if part == 0 else {key: value for key, value in op.items() if key != "capture"}
+        entry = plan_entry(idx, f"{name} [{part + 1}/{len(chunks)}]" if len(chunks) > 1 else name, chunk_op, chunk_raw)
+        entry.part = part if len(chunks) > 1 else None
+        entries.append(entry)
+    return entries
+
+
+def plan_fonts(
+    plan_meta: dict[str, Any],
+    mapped_ops: Iterable[tuple[str, dict[str, Any], dict[str, Any]]],
+) -> list[dict[str, str]]:
+    fonts = plan_meta.get("fonts")
+    if isinstance(fonts, list):
+        return [
+            {"family": str(font["family"]), "style": str(font["style"])}
+            for font in fonts
+            if isinstance(font, dict) and font.get("family") and font.get("style")
+        ]
+    if not isinstance(mapped_ops, list):
+        # A streamed plan cannot be scanned ahead; its text commands load fonts as they go.
+        return []
+    # A v1 run may carry --font-family/--font-style; placeholders stay unresolved here, they never name a font.
+    return scan_plan_fonts(
+        dict(zip(("command", "args"), map_operation(raw["run"]))) if "run" in raw else raw for _, _, raw in mapped_ops
+    )
+
+
+def convert_operation_to_v2(op: dict[str, Any]) -> dict[str, Any]:
+    if "command" in op:
+        return op
+    run = op["run"]
+    command, command_args = map_operation(run)
+    command_args = {key: value for key, value in command_args.items() if value is not None}
+    refs = [key for key, value in command_args.items() if isinstance(value, str) and PLACEHOLDER_RE.search(value)]
+    kept = {ref for key in refs for ref in PLACEHOLDER_RE.findall(command_args[key])}
+    lost = {ref for token in run for ref in PLACEHOLDER_RE.findall(token)} - kept
+    if lost:
+        raise RuntimeError(f"Placeholders in non-string fields cannot be converted: {sorted(lost)} in {run}")
+    converted: dict[str, Any] = {"name": op["name"]} if "name" in op else {}
+    converted.update({"command": command, "args": command_args})
+    if refs:
+        converted["refs"] = refs
+    converted.update({key: value for key, value in op.items() if key not in {"name", "run"}})
+    return converted
+
+
+def convert_plan_to_v2(plan: dict[str, Any]) -> dict[str, Any]:
+    meta = dict(plan.get("meta", {}))
+    meta["plan_version"] = 2
+    return {"meta": meta, "operations": [convert_operation_to_v2(op) for op in plan.get("operations", [])]}
+
+
+def iter_jsonl_operations(lines: Iterable[str]) -> Iterator[tuple[str, dict[str, Any], dict[str, Any]]]:
+    idx = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        idx += 1
+        try:
+            op = json.loads(line)
+        except json.JSONDecodeError:
+            raise SystemExit(f"Operation #{idx} invalid JSON")
+        yield normalize_operation(idx, op)
+
+
+def open_jsonl_plan(
+    stream: TextIO,
+) -> tuple[dict[str, Any], Iterator[tuple[str, dict[str, Any], dict[str, Any]]]]:
+    # Only the meta line is read up front; operations are parsed as the executor pulls them.
+    first = ""
+    for line in stream:
+        if line.strip():
+            first = line
+            break
+    header = json.loads(first) if first else {}
+    if isinstance(header, dict) and isinstance(header.get("meta"), dict) and len(header) == 1:
+        return header["meta"], iter_jsonl_operations(stream)
+    return {}, iter_jsonl_operations(itertools.chain([first], stream))
+
+
 def extract_id(payload: dict[str, Any]) -> str | None:
     for key in ("id", "nodeId", "pageId", "componentId"):
         value = payload.get(key)
@@ -231,35 +1334,401 @@ def extract_id(payload: dict[str, Any]) -> str | None:
     return None
 
 
+def submit_commands(state: BridgeState, commands: list[tuple[str, dict[str, Any]]], target: str = "") -> list[Future]:
+    return state.enqueue(commands, target)
+
+
+def collect_results(futures: list[Future], timeout_sec: float, *, wait_all: bool = False) -> list[Future]:
+    done, not_done = wait(futures, timeout=timeout_sec, return_when=ALL_COMPLETED if wait_all else FIRST_COMPLETED)
+    if not done or (wait_all and not_done):
+        raise RuntimeError(
+            f"Timeout waiting for bridge result. Ensure plugin is running:\n"
+            f"assets/figma-bridge-plugin/manifest.json"
+        )
+    return [future for future in futures if future in done]
+
+
+def queue_commands(
+    state: BridgeState,
+    commands: list[tuple[str, dict[str, Any]]],
+    timeout_sec: float,
+    target: str = "",
+) -> list[dict[str, Any]]:
+    futures = submit_commands(state, commands, target)
+    collect_results(futures, timeout_sec, wait_all=True)
+    return [future.result() for future in futures]
+
+
 def queue_command(
     state: BridgeState,
     command: str,
     args: dict[str, Any],
     timeout_sec: float,
+    target: str = "",
 ) -> dict[str, Any]:
-    request_id = str(uuid.uuid4())
-    with state.condition:
-        state.queue.append({"id": request_id, "command": command, "args": args})
-        deadline = time.time() + timeout_sec
-        while request_id not in state.results:
-            remaining = deadline - time.time()
-            if remaining <= 0:
-                raise RuntimeError(
-                    f"Timeout waiting for bridge result. Ensure plugin is running:\n"
-                    f"assets/figma-bridge-plugin/manifest.json"
-                )
-            state.condition.wait(timeout=remaining)
-        result = state.results.pop(request_id)
-    return result
+    return queue_commands(state, [(command, args)], timeout_sec, target)[0]
+
+
+def record_result(op: dict[str, Any], result: dict[str, Any], captures: dict[str, str]) -> None:
+    if not result.get("ok"):
+        if op.get("ignore_error"):
+            print(f"ignored error: {result.get('error')}")
+            return
+        raise RuntimeError(f"Operation failed: {result.get('error')}")
+
+    payload = result.get("result") or {}
+    if isinstance(payload, dict):
+        tree = payload.get("captures")
+        if isinstance(tree, dict):
+            captures.update({str(key): str(value) for key, value in tree.items()})
+        capture_name = op.get("capture")
+        if isinstance(capture_name, str) and capture_name:
+            node_id = extract_id(payload)
+            if not node_id:
+                raise RuntimeError(f"Capture '{capture_name}' missing ID from payload: {payload}")
+            captures[capture_name] = node_id
+            print(f"captured {capture_name}={node_id}")
+
+
+def format_throughput(op_count: int, elapsed_sec: float) -> str:
+    rate = op_count / elapsed_sec if elapsed_sec > 0 else 0.0
+    return f"Applied {op_count} operations in {elapsed_sec:.2f}s ({rate:.1f} ops/sec)"
+
+
+def format_transfer(transfer: dict[str, dict[str, int]]) -> str:
+    # Bridge-wide: tasks for other files running in the same daemon are included.
+    parts = []
+    for direction, label in (("next", "commands"), ("result", "results")):
+        totals = transfer[direction]
+        raw, wire = totals["raw_bytes"], totals["wire_bytes"]
+        saved = f" ({(raw - wire) / raw:.0%} saved)" if raw and wire < raw else ""
+        parts.append(f"{label} {raw / 1024:.1f} KiB -> {wire / 1024:.1f} KiB{saved}")
+    return "Bridge transfer: " + "; ".join(parts)
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile.
+    rank = max(math.ceil(pct / 100.0 * len(sorted_values)), 1)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def latency_summary(latencies: list[float]) -> dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round((ordered[-1] if ordered else 0.0) * 1000, 3),
+    }
+
+
+def format_latency(latencies: list[float], label: str = "Per-op latency") -> str:
+    summary = latency_summary(latencies)
+    return (
+        f"{label}: p50 {summary['p50_ms']:.1f}ms, p95 {summary['p95_ms']:.1f}ms, "
+        f"p99 {summary['p99_ms']:.1f}ms, max {summary['max_ms']:.1f}ms"
+    )
+
+
+@dataclass
+class PlanEntry:
+    idx: int
+    name: str
+    op: dict[str, Any]
+    raw: dict[str, Any]
+    refs: set[str]
+    capture: str
+    barrier: bool
+    provides: set[str]
+    part: int | None = None
+
+
+def plan_entry(idx: int, name: str, op: dict[str, Any], raw: dict[str, Any]) -> PlanEntry:
+    capture = op.get("capture")
+    capture = capture if isinstance(capture, str) else ""
+    provides = tree_captures(raw["args"]["nodes"]) if is_tree(raw) else set()
+    if capture:
+        provides.add(capture)
+    return PlanEntry(
+        idx=idx,
+        name=name,
+        op=op,
+        raw=raw,
+        refs=operation_refs(raw),
+        capture=capture,
+        # Page commands change figma.currentPage, which parentless creates rely on implicitly.
+        barrier=is_barrier(raw),
+        provides=provides,
+    )
+
+
+def ready_entries(pending: list[PlanEntry], in_flight: list[PlanEntry], capacity: int) -> list[PlanEntry]:
+    if capacity <= 0 or any(entry.barrier for entry in in_flight):
+        return []
+    blocked = {name for entry in in_flight for name in entry.provides}
+    ready: list[PlanEntry] = []
+    for entry in pending:
+        if len(ready) >= capacity:
+            break
+        if entry.barrier:
+            if not in_flight and not ready and entry is pending[0]:
+                ready.append(entry)
+            break
+        if not entry.refs & blocked:
+            ready.append(entry)
+        blocked |= entry.provides
+    return ready
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_journal(
+    path: Path, plan_sha256: str
+) -> tuple[set[int | tuple[int, int]], dict[str, str], set[int | tuple[int, int]]]:
+    # A chunked create-tree op is journaled per chunk, as (idx, part). Ops delivered to the plugin
+    # whose result never came back are returned separately: they may or may not have run.
+    # Withdrawn ops never reached the plugin; they are recorded for the reader and simply re-run.
+    done: set[int | tuple[int, int]] = set()
+    unknown: set[int | tuple[int, int]] = set()
+    captures: dict[str, str] = {}
+    with path.open(encoding="utf-8") as handle:
+        try:
+            header = json.loads(handle.readline())
+        except json.JSONDecodeError:
+            raise SystemExit(f"Journal header unreadable: {path}")
+        if not isinstance(header, dict) or header.get("journal") != JOURNAL_VERSION:
+            raise SystemExit(f"Unsupported journal: {path}")
+        if header.get("plan_sha256") != plan_sha256:
+            raise SystemExit(f"Journal was written for a different plan (hash mismatch): {path}")
+        for line in handle:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn tail from a crash mid-write; that op is simply re-run.
+                continue
+            if not isinstance(record, dict) or not isinstance(record.get("idx"), int):
+                continue
+            part = record.get("part")
+            key = (record["idx"], part) if isinstance(part, int) else record["idx"]
+            if record.get("withdrawn"):
+                continue
+            if record.get("unknown"):
+                unknown.add(key)
+                continue
+            done.add(key)
+            if record.get("capture") and record.get("id"):
+                captures[str(record["capture"])] = str(record["id"])
+            if isinstance(record.get("captures"), dict):
+                captures.update({str(key): str(value) for key, value in record["captures"].items()})
+    return done, captures, unknown - done
+
+
+class PlanJournal:
+    def __init__(self, path: Path, plan_sha256: str, append: bool = False) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        torn = False
+        if append and path.exists() and path.stat().st_size > 0:
+            with path.open("rb") as existing:
+                existing.seek(-1, os.SEEK_END)
+                torn = existing.read(1) != b"\n"
+        self.handle = path.open("a" if append else "w", encoding="utf-8")
+        if torn:
+            self.handle.write("\n")
+        if not append:
+            self.handle.write(json.dumps({"journal": JOURNAL_VERSION, "plan_sha256": plan_sha256}) + "\n")
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def record(
+        self,
+        idx: int,
+        capture: str = "",
+        node_id: str = "",
+        *,
+        part: int | None = None,
+        tree: dict[str, str] | None = None,
+        unknown: bool = False,
+        withdrawn: bool = False,
+    ) -> None:
+        item: dict[str, Any] = {"idx": idx}
+        if part is not None:
+            item["part"] = part
+        if unknown:
+            item["unknown"] = True
+        if withdrawn:
+            item["withdrawn"] = True
+        if capture and node_id:
+            item["capture"] = capture
+            item["id"] = node_id
+        if tree:
+            item["captures"] = tree
+        # Flushing hands the line to the OS, which survives a killed process; fsync (for power
+        # loss) is batched because it costs far more than the op itself.
+        self.handle.write(json.dumps(item, ensure_ascii=False) + "\n")
+        self.handle.flush()
+        self.unsynced += 1
+        if self.unsynced >= JOURNAL_SYNC_EVERY or time.monotonic() - self.last_sync >= JOURNAL_SYNC_SEC:
+            self.sync()
+
+    def sync(self) -> None:
+        if self.unsynced:
+            os.fsync(self.handle.fileno())
+            self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self) -> None:
+        if self.handle.closed:
+            return
+        self.handle.flush()
+        self.sync()
+        self.handle.close()
 
 
-def wait_for_plugin(state: BridgeState, wait_sec: float) -> None:
+def replayed_on_resume(raw: dict[str, Any]) -> bool:
+    # The current page is plugin state that a restart loses; re-selecting it is idempotent.
+    if "run" in raw:
+        return tuple(raw["run"][:2]) == ("page", "set")
+    return raw["command"] == "set-current-page"
+
+
+def execute_plan(
+    state: BridgeState,
+    mapped_ops: Iterable[tuple[str, dict[str, Any], dict[str, Any]]],
+    captures: dict[str, str],
+    *,
+    window: int,
+    timeout_sec: float,
+    journal: PlanJournal | None = None,
+    done: set[int | tuple[int, int]] | None = None,
+    latencies: list[float] | None = None,
+    target: str = "",
+    tree_chunk_nodes: int = TREE_CHUNK_NODES,
+) -> int:
+    source = enumerate(mapped_ops, start=1)
+    lookahead = max(window * 16, 256)
+    pending: list[PlanEntry] = []
+    in_flight: dict[Future, tuple[PlanEntry, str, float]] = {}
+    exhausted = False
+    completed = 0
+
+    try:
+        while True:
+            while not exhausted and len(pending) < lookahead:
+                item = next(source, None)
+                if item is None:
+                    exhausted = True
+                    break
+                idx, (name, op, raw) = item
+                if done and idx in done and not replayed_on_resume(raw):
+                    continue
+                if is_tree(raw):
+                    entries = tree_entries(idx, name, op, raw, tree_chunk_nodes)
+                    pending.extend(entry for entry in entries if not done or (idx, entry.part) not in done)
+                    continue
+                pending.append(plan_entry(idx, name, op, raw))
+            if not pending and not in_flight:
+                return completed
+
+            ready = ready_entries(pending, [item[0] for item in in_flight.values()], window - len(in_flight))
+            if ready:
+                commands = [expand_operation(entry.raw, captures) for entry in ready]
+                submitted = time.perf_counter()
+                futures = submit_commands(state, commands, target)
+                for future, entry, (command, _) in zip(futures, ready, commands):
+                    in_flight[future] = (entry, command, submitted)
+                dispatched = {id(entry) for entry in ready}
+                pending = [entry for entry in pending if id(entry) not in dispatched]
+
+            failure: Exception | None = None
+            try:
+                finished = collect_results(list(in_flight), timeout_sec)
+            except RuntimeError as exc:
+                finished, failure = [], exc
+            for future in finished:
+                entry, command, submitted = in_flight.pop(future)
+                if latencies is not None:
+                    latencies.append(time.perf_counter() - submitted)
+                print(f"\n[{entry.idx:02d}] {entry.name} -> {command}")
+                try:
+                    record_result(entry.op, future.result(), captures)
+                except RuntimeError as exc:
+                    # Keep journaling the rest of this window: those nodes exist and must not be replayed.
+                    failure = failure or exc
+                    continue
+                journal_result(journal, entry, captures)
+                completed += 1
+            if failure:
+                raise failure
+    except BaseException:
+        # Whatever stops the apply (a failed result, an unresolvable placeholder, a bad streamed
+        # line, Ctrl-C), the dispatched window is settled first so the journal covers all of it.
+        settle_in_flight(state, in_flight, captures, journal, timeout_sec)
+        raise
+
+
+def journal_result(journal: PlanJournal | None, entry: PlanEntry, captures: dict[str, str]) -> None:
+    if journal:
+        tree = {name: captures[name] for name in entry.provides if name != entry.capture and name in captures}
+        node_id = captures.get(entry.capture, "") if entry.capture else ""
+        journal.record(entry.idx, entry.capture, node_id, part=entry.part, tree=tree)
+
+
+def settle_in_flight(
+    state: BridgeState,
+    in_flight: dict[Future, tuple[PlanEntry, str, float]],
+    captures: dict[str, str],
+    journal: PlanJournal | None,
+    timeout_sec: float,
+) -> None:
+    # The apply is failing: commands still queued are withdrawn (resume runs them), results of
+    # delivered ones are awaited and journaled, and the rest are journaled as unknown so that
+    # resume neither replays them blindly nor forgets them.
+    withdrawn = state.withdraw(list(in_flight))
+    if journal:
+        for future in withdrawn:
+            entry = in_flight[future][0]
+            journal.record(entry.idx, part=entry.part, withdrawn=True)
+    delivered = [future for future in in_flight if not future.cancelled()]
+    if delivered:
+        wait(delivered, timeout=timeout_sec)
+    for future in delivered:
+        entry = in_flight[future][0]
+        if not future.done():
+            if journal:
+                journal.record(entry.idx, part=entry.part, unknown=True)
+            continue
+        try:
+            record_result(entry.op, future.result(), captures)
+        except RuntimeError:
+            continue
+        journal_result(journal, entry, captures)
+
+
+def wait_for_plugin(state: BridgeState, wait_sec: float, target: str = "") -> None:
+    # Woken by the first poll instead of sleeping in fixed steps; an already-connected plugin returns at once.
     deadline = time.time() + wait_sec
-    while time.time() < deadline:
-        with state.lock:
-            if (time.time() - state.last_poll_ts) < 2.5:
-                return
-        time.sleep(0.2)
+    while True:
+        state.polled.clear()
+        if state.is_connected(target):
+            return
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        state.polled.wait(timeout=min(remaining, POLL_HEARTBEAT_SEC))
+    if target:
+        raise RuntimeError(
+            f"Bridge plugin for fileKey '{target}' not connected.\n"
+            "Run the plugin in that file (it registers its fileKey on start), or check list_open_figma_files.py --bridge"
+        )
     raise RuntimeError(
         "Bridge plugin not connected.\n"
         "Import and run plugin first: assets/figma-bridge-plugin/manifest.json"
@@ -298,6 +1767,40 @@ def is_within(path: Path, root: Path) -> bool:
         return False
 
 
+def resolve_captures(value: Any, captures: dict[str, str]) -> Any:
+    if isinstance(value, str):
+        return substitute_placeholders(value, captures)
+    if isinstance(value, dict):
+        return {key: resolve_captures(item, captures) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_captures(item, captures) for item in value]
+    return value
+
+
+def write_incremental_manifest(
+    spec: dict[str, Any],
+    captures: dict[str, str],
+    temp_root: Path,
+    file_key: str,
+    file_name: str,
+) -> Path:
+    manifest_path = Path(str(spec.get("path", ""))).resolve()
+    if not is_within(manifest_path, temp_root):
+        raise RuntimeError(f"Manifest path must be under temp root: {temp_root}")
+    try:
+        data = resolve_captures(spec.get("data", {}), captures)
+    except RuntimeError:
+        # An ignored failure left a node without an ID; a stale manifest would misdirect
+        # the next incremental run, so force it back to a full refresh instead.
+        manifest_path.unlink(missing_ok=True)
+        raise
+    data["file_key"] = file_key
+    data["file_name"] = file_name
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    manifest_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    return manifest_path
+
+
 def cleanup_task_temp_files(temp_root: Path, project_slug: str, task_id: str) -> list[str]:
     removed: list[str] = []
     prefix = f"{project_slug}_{task_id}_"
@@ -314,9 +1817,25 @@ def cleanup_task_temp_files(temp_root: Path, project_slug: str, task_id: str) ->
     return removed
 
 
-def main() -> int:
+def start_bridge_server(state: BridgeState, kind: str, host: str, port: int) -> AsyncBridgeServer | ThreadingHTTPServer:
+    if kind == "asyncio":
+        server: AsyncBridgeServer | ThreadingHTTPServer = AsyncBridgeServer(state, host, port)
+    else:
+        server = ThreadingHTTPServer((host, port), make_handler(state))
+        server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Apply plan via local Figma Bridge plugin.")
-    parser.add_argument("--plan", help="Path to operation plan JSON")
+    parser.add_argument("--plan", help="Path to operation plan JSON/JSONL (optionally compact or gzipped), or - to stream JSONL from stdin")
+    parser.add_argument(
+        "--plan-format",
+        default="auto",
+        choices=["auto", "json", "jsonl"],
+        help="auto treats .jsonl(.gz) files and stdin as JSONL; gzip and compact plans are detected from content",
+    )
     parser.add_argument(
         "--status-only",
         action="store_true",
@@ -333,8 +1852,49 @@ def main() -> int:
     )
     parser.add_argument("--host", default="127.0.0.1", help="Bridge host")
     parser.add_argument("--port", type=int, default=38450, help="Bridge port")
+    parser.add_argument(
+        "--server",
+        default="threading",
+        choices=["threading", "asyncio"],
+        help="Bridge server implementation (asyncio keeps HTTP/1.1 connections alive)",
+    )
+    parser.add_argument(
+        "--websocket",
+        action="store_true",
+        help="Accept plugin WebSocket connections on /ws and push commands as they are queued",
+    )
     parser.add_argument("--wait-plugin-sec", type=float, default=25.0, help="Wait time for plugin connection")
     parser.add_argument("--op-timeout-sec", type=float, default=30.0, help="Per-command timeout")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="Max commands delivered per plugin poll (1 keeps the one-command-per-poll protocol)",
+    )
+    parser.add_argument(
+        "--pipeline-window",
+        type=int,
+        default=0,
+        help="Max in-flight commands whose captures are resolved (0 uses --batch-size; 1 is strictly serial)",
+    )
+    parser.add_argument(
+        "--compress-min-bytes",
+        type=int,
+        default=COMPRESS_MIN_BYTES,
+        help="gzip/deflate /next responses and accept compressed /result bodies from this size (0 disables)",
+    )
+    parser.add_argument(
+        "--tree-chunk-nodes",
+        type=int,
+        default=TREE_CHUNK_NODES,
+        help="Split create-tree operations into commands of at most N nodes (keep it unchanged across --resume)",
+    )
+    parser.add_argument(
+        "--long-poll-sec",
+        type=float,
+        default=15.0,
+        help="Hold idle /next polls open until a command is queued (0 answers 204 immediately)",
+    )
     parser.add_argument(
         "--expected-file-name",
         default="",
@@ -345,15 +1905,48 @@ def main() -> int:
         default="",
         help="Fail if connected fileKey does not match exactly",
     )
+    parser.add_argument(
+        "--stats-out",
+        default="",
+        help="Write ops/sec and p50/p95/p99 per-op latency as JSON (path under temp root)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted apply from its journal instead of re-running completed operations",
+    )
     parser.add_argument(
         "--no-cleanup-task-files",
         action="store_true",
         help="Do not remove task intermediate files after successful execution",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Send this task to a running figma_bridge_daemon.py instead of starting a bridge server",
+    )
+    parser.add_argument("--daemon-host", default="127.0.0.1", help="Bridge daemon control host")
+    parser.add_argument("--daemon-port", type=int, default=DAEMON_PORT, help="Bridge daemon control port")
+    parser.add_argument(
+        "--target-file-key",
+        default="",
+        help="Route commands only to the plugin instance registered with this fileKey",
+    )
+    parser.add_argument(
+        "--route",
+        action="append",
+        default=[],
+        metavar="PLAN=FILE_KEY",
+        help="Apply several plans to different open files concurrently (repeatable; replaces --plan)",
+    )
+    parser.add_argument("--task-suffix", default="", help=argparse.SUPPRESS)
+    return parser
+
 
+def run_apply(args: argparse.Namespace, stdin: TextIO, state: BridgeState | None = None) -> int:
+    # A passed-in state belongs to a long-lived daemon: its server and plugin connection outlive the task.
     captures: dict[str, str] = {}
-    mapped_ops: list[tuple[str, dict[str, Any], dict[str, Any]]] = []
+    mapped_ops: Iterable[tuple[str, dict[str, Any], dict[str, Any]]] = []
     plan_path = None
     captures_out_path = None
 
@@ -367,29 +1960,41 @@ def main() -> int:
     if not args.status_only:
         if not args.plan:
             raise SystemExit("--plan is required unless --status-only is used")
-        plan_path = Path(args.plan).resolve()
-        if not is_within(plan_path, temp_root):
-            raise SystemExit(f"Plan path must be under temp root: {temp_root}")
-        if not plan_path.exists():
-            raise SystemExit(f"Plan not found: {plan_path}")
-
-        plan = json.loads(plan_path.read_text(encoding="utf-8"))
-        plan_meta = plan.get("meta", {}) if isinstance(plan, dict) else {}
-        operations = plan.get("operations")
-        if not isinstance(operations, list):
-            raise SystemExit("Invalid plan: operations must be list")
-
-        for idx, op in enumerate(operations, start=1):
-            if not isinstance(op, dict):
-                raise SystemExit(f"Operation #{idx} invalid")
-            run = op.get("run")
-            if not isinstance(run, list) or not all(isinstance(x, str) for x in run):
-                raise SystemExit(f"Operation #{idx} invalid run tokens")
-            mapped_ops.append((op.get("name", f"op-{idx}"), op, {"run": run}))
+        if args.plan == "-":
+            plan_meta, mapped_ops = open_jsonl_plan(stdin)
+        else:
+            plan_path = Path(args.plan).resolve()
+            if not is_within(plan_path, temp_root):
+                raise SystemExit(f"Plan path must be under temp root: {temp_root}")
+            if not plan_path.exists():
+                raise SystemExit(f"Plan not found: {plan_path}")
+
+            plan_format = args.plan_format
+            if plan_format == "auto":
+                plan_format = "jsonl" if plan_path.name.endswith((".jsonl", ".jsonl.gz")) else "json"
+            # Gzip is detected by magic bytes and compact plans by their format marker.
+            if plan_format == "jsonl":
+                plan_meta, mapped_ops = open_jsonl_plan(open_plan_text(plan_path))
+            else:
+                try:
+                    plan = load_plan(plan_path)
+                except (OSError, ValueError) as exc:
+                    raise SystemExit(f"Unreadable plan: {exc}")
+                plan_meta = plan.get("meta", {}) if isinstance(plan, dict) else {}
+                operations = plan.get("operations")
+                if not isinstance(operations, list):
+                    raise SystemExit("Invalid plan: operations must be list")
+                mapped_ops = [normalize_operation(idx, op) for idx, op in enumerate(operations, start=1)]
 
     project_name = args.project_name.strip() or str(plan_meta.get("project_name", "")).strip() or "project"
     project_slug = slugify_project_name(project_name)
     task_id = normalize_task_id(args.task_id) or str(plan_meta.get("task_id", "")).strip() or generate_task_id()
+    if args.task_suffix:
+        # Concurrent routes may share one generator task id; keep their temp files apart.
+        task_id = f"{task_id}-{args.task_suffix}"
+    target = args.target_file_key.strip()
+    if target and not FILE_KEY_RE.fullmatch(target):
+        raise SystemExit(f"Invalid --target-file-key: {target}")
 
     if args.captures_out:
         captures_out_path = Path(args.captures_out).resolve()
@@ -399,6 +2004,33 @@ def main() -> int:
     if captures_out_path and not is_within(captures_out_path, temp_root):
         raise SystemExit(f"captures path must be under temp root: {temp_root}")
 
+    stats_out_path = Path(args.stats_out).resolve() if args.stats_out else None
+    if stats_out_path and not is_within(stats_out_path, temp_root):
+        raise SystemExit(f"stats path must be under temp root: {temp_root}")
+
+    journal_path = None
+    plan_sha256 = ""
+    done: set[int | tuple[int, int]] = set()
+    if plan_path and not args.dry_run:
+        journal_path = temp_root / f"{project_slug}_{task_id}_journal.jsonl"
+        plan_sha256 = file_digest(plan_path)
+        if args.resume:
+            if not journal_path.exists():
+                raise SystemExit(f"No journal to resume: {journal_path}")
+            done, journal_captures, unknown = read_journal(journal_path, plan_sha256)
+            captures.update(journal_captures)
+            for key in sorted(unknown, key=lambda item: item if isinstance(item, tuple) else (item, -1)):
+                label = f"{key[0]} (chunk {key[1]})" if isinstance(key, tuple) else str(key)
+                print(f"Not replayed: operation {label} reached the plugin but its result was lost; check it in Figma.")
+            done |= unknown
+        elif journal_path.exists():
+            raise SystemExit(
+                f"Journal from an interrupted apply exists: {journal_path}\n"
+                "Pass --resume to continue without duplicating nodes, or delete it to start over."
+            )
+    elif args.resume and not args.status_only:
+        raise SystemExit("--resume needs a plan file (a journal cannot be matched to stdin)")
+
     if args.dry_run:
         print(f"Temp root: {temp_root}")
         print(f"Project: {project_name} ({project_slug})")
@@ -406,32 +2038,48 @@ def main() -> int:
         print("Dry-run mapping:")
         local_caps: dict[str, str] = {}
         for idx, (name, op, raw) in enumerate(mapped_ops, start=1):
-            expanded = [substitute_placeholders(t, local_caps) for t in raw["run"]]
-            command, command_args = map_operation(expanded)
+            if is_tree(raw):
+                entries = tree_entries(idx, name, op, raw, max(args.tree_chunk_nodes, 1))
+                nodes = sum(1 for entry in entries for _ in iter_tree_nodes(entry.raw["args"]["nodes"]))
+                print(f"[{idx:02d}] {name}: create-tree {nodes} nodes in {len(entries)} command(s)")
+                local_caps.update({capture: f"dry_{capture}" for entry in entries for capture in entry.provides})
+                continue
+            command, command_args = expand_operation(raw, local_caps)
             print(f"[{idx:02d}] {name}: {command} {json.dumps(command_args, ensure_ascii=False)}")
             capture_name = op.get("capture")
             if isinstance(capture_name, str) and capture_name:
                 local_caps[capture_name] = f"dry_{capture_name}"
         print("Dry-run captures:")
         print(json.dumps(local_caps, ensure_ascii=False, indent=2))
+        fonts = plan_fonts(plan_meta, mapped_ops)
+        print("Dry-run fonts: " + (", ".join(f"{font['family']} {font['style']}" for font in fonts) or "none"))
         return 0
 
-    state = BridgeState()
-    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
-    server.daemon_threads = True
-    thread = threading.Thread(target=server.serve_forever, daemon=True)
-    thread.start()
-    print(f"Bridge server started at http://{args.host}:{args.port}")
+    server = None
+    if state is None:
+        state = BridgeState(
+            batch_size=max(args.batch_size, 1),
+            long_poll_sec=max(args.long_poll_sec, 0.0),
+            websocket=args.websocket,
+            compress_min_bytes=max(args.compress_min_bytes, 0),
+        )
+        server = start_bridge_server(state, args.server, args.host, args.port)
+        print(f"Bridge server started at http://{args.host}:{args.port}")
     print(f"Temp root: {temp_root}")
     print(f"Project: {project_name} ({project_slug})")
     print(f"Task ID: {task_id}")
+    if target:
+        print(f"Target fileKey: {target}")
+    if done:
+        print(f"Resuming: {len(done)} operations already applied, {len(captures)} captures replayed")
 
+    journal = None
     try:
-        wait_for_plugin(state, args.wait_plugin_sec)
+        wait_for_plugin(state, args.wait_plugin_sec, target)
         print("Bridge plugin connected.")
 
         # Preflight command
-        status_result = queue_command(state, "status", {}, args.op_timeout_sec)
+        status_result = queue_command(state, "status", {}, args.op_timeout_sec, target)
         if not status_result.get("ok"):
             raise RuntimeError(f"Bridge status failed: {status_result.get('error')}")
         status_payload = status_result.get("result", {}) if isinstance(status_result, dict) else {}
@@ -445,6 +2093,8 @@ def main() -> int:
             raise RuntimeError(
                 f"Connected file mismatch: expected '{args.expected_file_name}', got '{file_name}'"
             )
+        if target and file_key and file_key != target:
+            raise RuntimeError(f"Plugin registered as '{target}' reports fileKey '{file_key}'")
         if args.expected_file_key and file_key != args.expected_file_key:
             raise RuntimeError(
                 f"Connected file key mismatch: expected '{args.expected_file_key}', got '{file_key}'"
@@ -454,28 +2104,93 @@ def main() -> int:
             print(json.dumps(status_payload, ensure_ascii=False, indent=2))
             return 0
 
-        for idx, (name, op, raw) in enumerate(mapped_ops, start=1):
-            expanded = [substitute_placeholders(t, captures) for t in raw["run"]]
-            command, command_args = map_operation(expanded)
-            print(f"\n[{idx:02d}] {name} -> {command}")
-            result = queue_command(state, command, command_args, args.op_timeout_sec)
-            if not result.get("ok"):
-                if op.get("ignore_error"):
-                    print(f"ignored error: {result.get('error')}")
-                    continue
-                raise RuntimeError(f"Operation failed: {result.get('error')}")
-
-            payload = result.get("result") or {}
-            if isinstance(payload, dict):
-                capture_name = op.get("capture")
-                if isinstance(capture_name, str) and capture_name:
-                    node_id = extract_id(payload)
-                    if not node_id:
-                        raise RuntimeError(f"Capture '{capture_name}' missing ID from payload: {payload}")
-                    captures[capture_name] = node_id
-                    print(f"captured {capture_name}={node_id}")
+        manifest_spec = plan_meta.get("incremental_manifest")
+        if isinstance(manifest_spec, dict) and plan_meta.get("mode") == "incremental":
+            recorded_key = str(manifest_spec.get("data", {}).get("file_key", ""))
+            if recorded_key and file_key and recorded_key != file_key:
+                raise RuntimeError(
+                    f"Incremental plan was diffed against file key '{recorded_key}', connected file is '{file_key}'"
+                )
+
+        fonts = plan_fonts(plan_meta, mapped_ops)
+        if fonts:
+            # One up-front load lets the plugin's memoized fonts serve every text command.
+            preload = queue_command(state, "preload-fonts", {"fonts": fonts}, args.op_timeout_sec, target)
+            if not preload.get("ok"):
+                print(f"Font preload skipped: {preload.get('error')}")
+            else:
+                payload = preload.get("result") or {}
+                print(f"Preloaded {payload.get('loaded', len(fonts))}/{len(fonts)} fonts")
+                for failed_font in payload.get("failed") or []:
+                    print(f"Font not available: {failed_font}")
+
+        if journal_path:
+            journal = PlanJournal(journal_path, plan_sha256, append=args.resume)
+        started = time.perf_counter()
+        window = args.pipeline_window if args.pipeline_window > 0 else state.batch_size
+        latencies: list[float] = []
+        with state.lock:
+            state.metrics.start_task(target)
+            transfer_before = {direction: list(totals) for direction, totals in state.metrics.transfer.items()}
+        try:
+            completed = execute_plan(
+                state,
+                mapped_ops,
+                captures,
+                window=window,
+                timeout_sec=args.op_timeout_sec,
+                journal=journal,
+                done=done,
+                latencies=latencies,
+                target=target,
+                tree_chunk_nodes=max(args.tree_chunk_nodes, 1),
+            )
+        except BaseException:
+            if journal:
+                journal.close()
+                print(f"Journal kept for --resume: {journal_path}")
+            raise
+        finally:
+            with state.lock:
+                task_stats = state.metrics.finish_task(target)
+                transfer = transfer_summary(
+                    {
+                        direction: [totals[0] - transfer_before[direction][0], totals[1] - transfer_before[direction][1]]
+                        for direction, totals in state.metrics.transfer.items()
+                    }
+                )
+        elapsed = time.perf_counter() - started
+        if journal and journal_path:
+            # Everything landed; a leftover journal would only block the next run.
+            journal.close()
+            journal_path.unlink(missing_ok=True)
 
         print("\nExecution completed.")
+        print(format_throughput(completed, elapsed))
+        print(format_latency(latencies))
+        queue_wait, execution, failed = task_stats["queue_wait"], task_stats["execution"], task_stats["failed"]
+        print(format_latency(queue_wait, "Bridge queue wait"))
+        print(format_latency(execution, "Plugin execution"))
+        if failed:
+            print(f"Plugin reported {failed} failed commands (ignore_error)")
+        print(format_transfer(transfer))
+        if stats_out_path:
+            stats = {
+                "operations": completed,
+                "elapsed_sec": round(elapsed, 4),
+                "ops_per_sec": round(completed / elapsed, 2) if elapsed > 0 else 0.0,
+                "batch_size": state.batch_size,
+                "pipeline_window": window,
+                "server": args.server,
+                "latency": latency_summary(latencies),
+                "queue_wait": latency_summary(queue_wait),
+                "execution": latency_summary(execution),
+                "failed_commands": failed,
+                "transfer": transfer,
+            }
+            stats_out_path.parent.mkdir(parents=True, exist_ok=True)
+            stats_out_path.write_text(json.dumps(stats, indent=2), encoding="utf-8")
+            print(f"Stats written: {stats_out_path}")
         print(json.dumps(captures, ensure_ascii=False, indent=2))
 
         if captures_out_path:
@@ -483,6 +2198,13 @@ def main() -> int:
             captures_out_path.write_text(json.dumps(captures, ensure_ascii=False, indent=2), encoding="utf-8")
             print(f"Capture map written: {captures_out_path}")
 
+        if isinstance(manifest_spec, dict):
+            try:
+                manifest_path = write_incremental_manifest(manifest_spec, captures, temp_root, file_key, file_name)
+                print(f"Incremental manifest written: {manifest_path}")
+            except RuntimeError as exc:
+                print(f"Incremental manifest not written ({exc}); next incremental run will fully refresh.")
+
         if not args.no_cleanup_task_files:
             removed = cleanup_task_temp_files(temp_root, project_slug, task_id)
             if removed:
@@ -494,8 +2216,183 @@ def main() -> int:
         return 0
 
     finally:
-        server.shutdown()
-        server.server_close()
+        if journal:
+            journal.close()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+def send_to_daemon(args: argparse.Namespace, stdin: TextIO) -> int:
+    # Paths are resolved here because the daemon runs with its own working directory.
+    options = vars(args).copy()
+    for key in ("plan", "captures_out", "stats_out", "temp_root"):
+        value = options.get(key)
+        if value and value != "-":
+            options[key] = str(Path(value).resolve())
+    request: dict[str, Any] = {"options": options}
+    if args.plan == "-":
+        request["stdin"] = stdin.read()
+    try:
+        conn = socket.create_connection((args.daemon_host, args.daemon_port), timeout=5)
+    except OSError as exc:
+        raise SystemExit(
+            f"Bridge daemon not reachable at {args.daemon_host}:{args.daemon_port} ({exc}).\n"
+            "Start it with scripts/figma_bridge_daemon.py"
+        )
+    with conn, conn.makefile("rwb") as stream:
+        # Tasks queue behind each other in the daemon, so only the connect is time-limited.
+        conn.settimeout(None)
+        stream.write(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+        stream.flush()
+        for line in stream:
+            message = json.loads(line)
+            if "out" in message:
+                sys.stdout.write(message["out"])
+                sys.stdout.flush()
+            elif "err" in message:
+                sys.stderr.write(message["err"])
+            elif "exit" in message:
+                return int(message["exit"])
+    raise SystemExit("Bridge daemon closed the connection before the task finished")
+
+
+class ThreadOutput(io.TextIOBase):
+    """sys.stdout stand-in that sends each thread's writes to the stream bound for that thread."""
+
+    def __init__(self, default: TextIO) -> None:
+        self.default = default
+        self.local = threading.local()
+
+    def bind(self, stream: TextIO | None) -> None:
+        self.local.stream = stream
+
+    def current(self) -> TextIO:
+        return getattr(self.local, "stream", None) or self.default
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        return self.current().write(text)
+
+    def flush(self) -> None:
+        self.current().flush()
+
+
+class PrefixedLines(io.TextIOBase):
+    def __init__(self, stream: TextIO, prefix: str, lock: threading.Lock) -> None:
+        self.stream = stream
+        self.prefix = prefix
+        self.lock = lock
+        self.buffer = ""
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        self.buffer += text
+        if "\n" in self.buffer:
+            head, _, self.buffer = self.buffer.rpartition("\n")
+            self.emit(head.split("\n"))
+        return len(text)
+
+    def flush(self) -> None:
+        if self.buffer:
+            text, self.buffer = self.buffer, ""
+            self.emit([text])
+
+    def emit(self, lines: list[str]) -> None:
+        # Whole lines under one lock, so concurrent routes never interleave mid-line.
+        with self.lock:
+            self.stream.write("".join(f"{self.prefix}{line}\n" for line in lines))
+            self.stream.flush()
+
+
+def parse_route(raw: str) -> tuple[str, str]:
+    plan, sep, file_key = raw.rpartition("=")
+    if not sep or not plan or not FILE_KEY_RE.fullmatch(file_key):
+        raise SystemExit(f"Invalid --route (expected PLAN=FILE_KEY): {raw}")
+    if plan == "-":
+        raise SystemExit("--route plans must be files")
+    return plan, file_key
+
+
+def run_routes(args: argparse.Namespace, stdin: TextIO) -> int:
+    routes = [parse_route(item) for item in args.route]
+    keys = [file_key for _, file_key in routes]
+    if len(set(keys)) != len(keys):
+        raise SystemExit("Each --route needs its own file key (one plan per open file)")
+    if args.plan or args.target_file_key or args.status_only or args.captures_out or args.stats_out:
+        raise SystemExit(
+            "--route cannot be combined with --plan, --target-file-key, --status-only, --captures-out or --stats-out"
+        )
+
+    via_daemon = args.daemon and not args.dry_run
+    state = None
+    server = None
+    if not via_daemon and not args.dry_run:
+        state = BridgeState(
+            batch_size=max(args.batch_size, 1),
+            long_poll_sec=max(args.long_poll_sec, 0.0),
+            websocket=args.websocket,
+            compress_min_bytes=max(args.compress_min_bytes, 0),
+        )
+        server = start_bridge_server(state, args.server, args.host, args.port)
+        print(f"Bridge server started at http://{args.host}:{args.port}")
+        print(f"Routing {len(routes)} plans: {', '.join(keys)}")
+
+    output = ThreadOutput(sys.stdout)
+    lock = threading.Lock()
+    results: dict[str, int] = {}
+
+    def run_route(plan: str, file_key: str) -> None:
+        route_args = argparse.Namespace(**vars(args))
+        route_args.plan = plan
+        route_args.route = []
+        route_args.target_file_key = file_key
+        route_args.task_suffix = file_key.lower()
+        output.bind(PrefixedLines(output.default, f"[{file_key}] ", lock))
+        try:
+            code = send_to_daemon(route_args, stdin) if via_daemon else run_apply(route_args, stdin, state)
+        except SystemExit as exc:
+            code = exc.code if isinstance(exc.code, int) else 1
+            if exc.code is not None and not isinstance(exc.code, int):
+                print(exc.code)
+        except Exception as exc:
+            print(f"{type(exc).__name__}: {exc}")
+            code = 1
+        finally:
+            sys.stdout.flush()
+        results[file_key] = code
+
+    sys.stdout = output
+    try:
+        threads = [threading.Thread(target=run_route, args=route, daemon=True) for route in routes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.stdout = output.default
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    print("\nRoutes:")
+    for file_key in keys:
+        code = results.get(file_key, 1)
+        print(f"- {file_key}: {'ok' if code == 0 else f'failed (exit {code})'}")
+    return 0 if all(results.get(file_key, 1) == 0 for file_key in keys) else 1
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    if args.route:
+        return run_routes(args, sys.stdin)
+    if args.daemon and not args.dry_run:
+        return send_to_daemon(args, sys.stdin)
+    return run_apply(args, sys.stdin)
 
 
 if __name__ == "__main__":
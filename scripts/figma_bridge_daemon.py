@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""Keep the bridge server and plugin connection up, and apply plans sent by thin clients."""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import socketserver
+import sys
+import threading
+import time
+from typing import Any
+
+from figma_bridge_apply_plan import (
+    COMPRESS_MIN_BYTES,
+    DAEMON_PORT,
+    BridgeState,
+    ThreadOutput,
+    build_parser,
+    run_apply,
+    start_bridge_server,
+)
+
+
+class ClientWriter(io.TextIOBase):
+    """Forward task output to the client line by line; a vanished client never aborts the task."""
+
+    def __init__(self, stream: Any, key: str, lock: threading.Lock) -> None:
+        self.stream = stream
+        self.key = key
+        self.buffer = ""
+        self.lock = lock
+        self.closed_by_peer = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        self.buffer += text
+        if "\n" in self.buffer:
+            head, _, self.buffer = self.buffer.rpartition("\n")
+            self.send({self.key: head + "\n"})
+        return len(text)
+
+    def flush(self) -> None:
+        if self.buffer:
+            text, self.buffer = self.buffer, ""
+            self.send({self.key: text})
+
+    def send(self, message: dict[str, Any]) -> None:
+        with self.lock:
+            if self.closed_by_peer:
+                return
+            try:
+                self.stream.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+                self.stream.flush()
+            except OSError:
+                self.closed_by_peer = True
+
+
+class Task:
+    def __init__(self, request: dict[str, Any], stream: Any) -> None:
+        self.request = request
+        options = request.get("options")
+        self.options: dict[str, Any] = options if isinstance(options, dict) else {}
+        self.target = str(self.options.get("target_file_key") or "").strip()
+        lock = threading.Lock()
+        self.out = ClientWriter(stream, "out", lock)
+        self.err = ClientWriter(stream, "err", lock)
+
+
+class TaskScheduler:
+    """Tasks for different target files run concurrently; tasks for one file, and untargeted
+    tasks (which any plugin may pick up), run alone. Waiting tasks keep arrival order.
+
+    Conflicts are keyed on the target fileKey, not the task_id: two tasks with different ids
+    still edit the same document, while the task_id already isolates each task's journal,
+    captures and temp files."""
+
+    def __init__(self) -> None:
+        self.condition = threading.Condition()
+        self.waiting: list[Task] = []
+        self.running: list[str] = []
+
+    @staticmethod
+    def conflicts(first: str, second: str) -> bool:
+        return first == second or not first or not second
+
+    def blockers(self, task: Task) -> int:
+        ahead = [other.target for other in self.waiting[: self.waiting.index(task)]]
+        return sum(1 for target in self.running + ahead if self.conflicts(task.target, target))
+
+    def acquire(self, task: Task) -> None:
+        with self.condition:
+            self.waiting.append(task)
+            ahead = self.blockers(task)
+            if ahead:
+                task.out.write(f"Queued behind {ahead} task(s)\n")
+            while self.blockers(task):
+                self.condition.wait()
+            self.waiting.remove(task)
+            self.running.append(task.target)
+
+    def release(self, task: Task) -> None:
+        with self.condition:
+            self.running.remove(task.target)
+            self.condition.notify_all()
+
+
+def log(message: str) -> None:
+    # Task output is redirected to its client, so daemon logs bypass sys.stdout.
+    print(f"[{time.strftime('%H:%M:%S')}] {message}", file=sys.__stdout__, flush=True)
+
+
+def task_args(options: dict[str, Any], daemon_args: argparse.Namespace) -> argparse.Namespace:
+    args = build_parser().parse_args([])
+    for key, value in options.items():
+        if hasattr(args, key):
+            setattr(args, key, value)
+    # The bridge belongs to the daemon; per-task transport flags would be misleading.
+    args.server = daemon_args.server
+    args.batch_size = daemon_args.batch_size
+    args.daemon = False
+    return args
+
+
+def run_task(task: Task, state: BridgeState, daemon_args: argparse.Namespace) -> int:
+    args = task_args(task.options, daemon_args)
+    stdin = io.StringIO(str(task.request.get("stdin", "")))
+    # Both streams are ThreadOutput routers installed by main(); this thread's prints go to its client.
+    sys.stdout.bind(task.out)
+    sys.stderr.bind(task.err)
+    try:
+        return run_apply(args, stdin, state)
+    except SystemExit as exc:
+        if isinstance(exc.code, int) or exc.code is None:
+            return exc.code or 0
+        print(exc.code, file=sys.stderr)
+        return 1
+    except Exception as exc:
+        print(f"{type(exc).__name__}: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        # A failed or timed-out task must not leave commands for the next task's plugin.
+        dropped = state.abandon(threading.get_ident())
+        if dropped:
+            print(f"Dropped {dropped} unfinished command(s)", file=sys.stderr)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        sys.stdout.bind(None)
+        sys.stderr.bind(None)
+
+
+def make_control_handler(scheduler: TaskScheduler, state: BridgeState, daemon_args: argparse.Namespace):
+    class ControlHandler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            line = self.rfile.readline()
+            try:
+                request = json.loads(line)
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                request = None
+            if not isinstance(request, dict) or not isinstance(request.get("options"), dict):
+                self.wfile.write(b'{"err":"Invalid daemon request\\n"}\n{"exit":2}\n')
+                return
+            task = Task(request, self.wfile)
+            scheduler.acquire(task)
+            started = time.perf_counter()
+            label = task.options.get("plan") or "status"
+            log(f"task started: {label}" + (f" -> {task.target}" if task.target else ""))
+            try:
+                code = run_task(task, state, daemon_args)
+            finally:
+                scheduler.release(task)
+            task.out.send({"exit": code})
+            log(f"task finished: {label} exit {code} in {time.perf_counter() - started:.3f}s")
+
+    return ControlHandler
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Long-lived Figma bridge shared by figma_bridge_apply_plan.py --daemon.")
+    parser.add_argument("--host", default="127.0.0.1", help="Bridge host")
+    parser.add_argument("--port", type=int, default=38450, help="Bridge port")
+    parser.add_argument("--server", default="threading", choices=["threading", "asyncio"], help="Bridge server")
+    parser.add_argument("--websocket", action="store_true", help="Accept plugin WebSocket connections on /ws")
+    parser.add_argument("--batch-size", type=int, default=1, help="Max commands delivered per plugin poll")
+    parser.add_argument("--long-poll-sec", type=float, default=15.0, help="Hold idle /next polls open")
+    parser.add_argument(
+        "--compress-min-bytes",
+        type=int,
+        default=COMPRESS_MIN_BYTES,
+        help="gzip/deflate payloads from this size (0 disables)",
+    )
+    parser.add_argument("--control-host", default="127.0.0.1", help="Control socket host (keep it local)")
+    parser.add_argument("--control-port", type=int, default=DAEMON_PORT, help="Control socket port")
+    args = parser.parse_args()
+    args.batch_size = max(args.batch_size, 1)
+
+    state = BridgeState(
+        batch_size=args.batch_size,
+        long_poll_sec=max(args.long_poll_sec, 0.0),
+        websocket=args.websocket,
+        compress_min_bytes=max(args.compress_min_bytes, 0),
+    )
+    server = start_bridge_server(state, args.server, args.host, args.port)
+    sys.stdout = ThreadOutput(sys.stdout)
+    sys.stderr = ThreadOutput(sys.stderr)
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    control = socketserver.ThreadingTCPServer(
+        (args.control_host, args.control_port),
+        make_control_handler(TaskScheduler(), state, args),
+    )
+    control.daemon_threads = True
+    log(f"Bridge server started at http://{args.host}:{args.port}")
+    log(f"Accepting tasks on {args.control_host}:{args.control_port} (figma_bridge_apply_plan.py --daemon)")
+    try:
+        control.serve_forever()
+    except KeyboardInterrupt:
+        log("Stopping bridge daemon")
+    finally:
+        control.server_close()
+        server.shutdown()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -4,19 +4,42 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
 import os
 import random
 import re
+import sys
 import tempfile
-from dataclasses import dataclass, field
+from collections import Counter
 from datetime import datetime
 from html.parser import HTMLParser
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator
+
+from plan_cache import (
+    CACHE_DIR_NAME,
+    cache_key,
+    format_cache_report,
+    load_cached_plan,
+    record_cache_stats,
+    render_plan_json,
+    store_cached_plan,
+)
+from plan_codec import encode_compact_plan, open_plan_output, write_plan_text
+from plan_ops import PLACEHOLDER_RE, make_operation, plan_fonts, write_jsonl_plan
 
 AUTO_TMP_DIR_NAME = "auto-figma"
 HEX_COLOR_RE = re.compile(r"^#(?:[0-9a-fA-F]{3}|[0-9a-fA-F]{6})$")
+SKIP_TAGS = {"script", "style", "meta", "link", "head"}
+KEPT_ATTRS = ("id", "class")
+EMPTY_MAP: dict[str, str] = {}
+MANIFEST_VERSION = 1
+# Components are laid out in a column this far right of the root frame.
+COMPONENT_GAP = 120
+# Frames nested deeper than this in one create-tree continue in a new create-tree under the last
+# frame that fits; a single spec as deep as the document would overflow json's recursion limit.
+TREE_MAX_DEPTH = 64
 
 
 def normalize_whitespace(value: str) -> str:
@@ -88,50 +111,147 @@ def pick_color(styles: dict[str, str], keys: Iterable[str]) -> str | None:
     return None
 
 
-@dataclass
 class Node:
-    tag: str
-    attrs: dict[str, str]
-    styles: dict[str, str]
-    children: list["Node"] = field(default_factory=list)
-    text_fragments: list[str] = field(default_factory=list)
+    # Most elements have no id/class/style and no text, so empty containers are shared
+    # and lists are only allocated on first append.
+    __slots__ = ("tag", "attrs", "styles", "children", "text_fragments", "pruned")
+
+    def __init__(
+        self,
+        tag: str,
+        attrs: dict[str, str] = EMPTY_MAP,
+        styles: dict[str, str] = EMPTY_MAP,
+        pruned: bool = False,
+    ) -> None:
+        self.tag = tag
+        self.attrs = attrs
+        self.styles = styles
+        self.children: list[Node] | tuple = ()
+        self.text_fragments: list[str] | tuple = ()
+        self.pruned = pruned
+
+    def add_child(self, node: "Node") -> None:
+        if self.children:
+            self.children.append(node)
+        else:
+            self.children = [node]
+
+    def add_text(self, text: str) -> None:
+        if self.text_fragments:
+            self.text_fragments.append(text)
+        else:
+            self.text_fragments = [text]
 
 
 class MiniHTMLTree(HTMLParser):
-    def __init__(self) -> None:
+    def __init__(self, prune: bool = False) -> None:
         super().__init__(convert_charrefs=True)
-        self.root = Node(tag="document", attrs={}, styles={})
+        self.root = Node("document")
         self.stack: list[Node] = [self.root]
+        # prune: drop skipped subtrees while parsing and join text once per element.
+        self.prune = prune
+        self.pending: list[str] = []
+
+    def flush_text(self) -> None:
+        # Chunked feeds can split one text run across handle_data calls; join them
+        # back so fragments match a whole-file parse.
+        if not self.pending:
+            return
+        data = "".join(self.pending)
+        self.pending = []
+        if self.stack[-1].pruned:
+            return
+        text = normalize_whitespace(data)
+        if text:
+            self.stack[-1].add_text(text)
 
     def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
-        attr_map = {k: (v or "") for k, v in attrs}
-        node = Node(tag=tag.lower(), attrs=attr_map, styles=parse_style(attr_map.get("style", "")))
-        self.stack[-1].children.append(node)
+        self.flush_text()
+        lower = tag.lower()
+        parent = self.stack[-1]
+        if self.prune and (parent.pruned or lower in SKIP_TAGS):
+            # body is kept even when an unclosed <meta>/<link> swallowed it, as first_tag would find it there.
+            if lower != "body":
+                self.stack.append(Node(lower, pruned=True))
+                return
+            parent = next(item for item in reversed(self.stack) if not item.pruned)
+        kept = EMPTY_MAP
+        styles = EMPTY_MAP
+        for key, value in attrs:
+            if key == "style":
+                styles = parse_style(value or "") or EMPTY_MAP
+            elif key in KEPT_ATTRS:
+                if kept is EMPTY_MAP:
+                    kept = {}
+                kept[key] = value or ""
+        node = Node(lower, kept, styles)
+        parent.add_child(node)
         self.stack.append(node)
 
     def handle_endtag(self, tag: str) -> None:
+        self.flush_text()
         lower = tag.lower()
         for i in range(len(self.stack) - 1, 0, -1):
             if self.stack[i].tag == lower:
-                self.stack = self.stack[:i]
+                if self.prune:
+                    for node in self.stack[i:]:
+                        if len(node.text_fragments) > 1:
+                            node.text_fragments = [" ".join(node.text_fragments)]
+                del self.stack[i:]
                 break
 
     def handle_data(self, data: str) -> None:
+        if self.prune:
+            self.pending.append(data)
+            return
         text = normalize_whitespace(data)
         if text:
-            self.stack[-1].text_fragments.append(text)
+            self.stack[-1].add_text(text)
+
+    def handle_comment(self, data: str) -> None:
+        self.flush_text()
+
+    def handle_decl(self, decl: str) -> None:
+        self.flush_text()
+
+    def handle_pi(self, data: str) -> None:
+        self.flush_text()
+
+    def unknown_decl(self, data: str) -> None:
+        self.flush_text()
+
+
+def parse_html(input_path: Path, stream: bool = False, chunk_size: int = 1 << 20) -> Node:
+    if not stream:
+        tree = MiniHTMLTree()
+        tree.feed(input_path.read_text(encoding="utf-8"))
+        return tree.root
+
+    tree = MiniHTMLTree(prune=True)
+    with input_path.open(encoding="utf-8") as handle:
+        while True:
+            chunk = handle.read(max(chunk_size, 1))
+            if not chunk:
+                break
+            tree.feed(chunk)
+    tree.flush_text()
+    return tree.root
 
 
 def first_tag(node: Node, tag: str) -> Node | None:
-    if node.tag == tag:
-        return node
-    for child in node.children:
-        found = first_tag(child, tag)
-        if found:
-            return found
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.tag == tag:
+            return current
+        stack.extend(reversed(current.children))
     return None
 
 
+# (index, parent index, path, node, frame args, text args) for each emitted element, in preorder.
+LayoutEntry = tuple[int, int, str, Node, dict, "dict | None"]
+
+
 def frame_name(node: Node, index: int) -> str:
     cls = normalize_whitespace(node.attrs.get("class", "")).replace(" ", "-")
     node_id = node.attrs.get("id", "").strip()
@@ -147,9 +267,8 @@ def text_name(node: Node, index: int) -> str:
     return f"T{index:03d}-{node.tag}"[:120]
 
 
-def build_plan(
+def plan_meta(
     source_html: Path,
-    html_root: Node,
     project_name: str,
     project_slug: str,
     task_id: str,
@@ -158,139 +277,547 @@ def build_plan(
     frame_height: int,
     x_gap: int,
     y_gap: int,
+    plan_version: int = 1,
 ) -> dict:
-    operations: list[dict] = [
-        {"name": "create-page", "run": ["create", "page", page_name, "--json"], "capture": "page_id"},
-        {"name": "set-page", "run": ["page", "set", page_name]},
-        {
-            "name": "create-root-frame",
-            "run": [
-                "create",
-                "frame",
-                "--name",
-                "HTML-ROOT",
-                "--x",
-                "0",
-                "--y",
-                "0",
-                "--width",
-                str(frame_width),
-                "--height",
-                str(frame_height),
-                "--fill",
-                "#FFFFFF",
-                "--json",
-            ],
-            "capture": "html_root",
-        },
-    ]
-
-    node_counter = 1
-    text_counter = 1
+    return {
+        "generator": "html_to_figma_plan.py",
+        "source_doc": str(source_html),
+        "project_name": project_name,
+        "project_slug": project_slug,
+        "task_id": task_id,
+        "mode": "full-refresh",
+        "source_type": "html",
+        "parity_target": "strict",
+        "page_name": page_name,
+        "frame_size": {"width": frame_width, "height": frame_height},
+        "gap": {"x": x_gap, "y": y_gap},
+        "plan_version": plan_version,
+    }
+
+
+def iter_layout(html_root: Node, y_gap: int, with_paths: bool = False) -> Iterator[LayoutEntry]:
+    body = first_tag(html_root, "body") or html_root
+    # Explicit stack of [children iterator, parent index, parent path, block cursor y, key counts]
+    # so deeply nested documents do not hit the recursion limit.
+    stack: list[list] = [[iter(body.children), -1, "", 0, {}]]
+    index = 0
+    while stack:
+        level = stack[-1]
+        child = next(level[0], None)
+        if child is None:
+            stack.pop()
+            continue
+        if child.tag in SKIP_TAGS:
+            continue
+
+        styles = child.styles
+        width = int(parse_size(styles.get("width", "")) or 320)
+        height = int(parse_size(styles.get("height", "")) or 44)
+        x = int(parse_size(styles.get("left", "")) or parse_size(styles.get("x", "")) or 0)
+        y = int(parse_size(styles.get("top", "")) or parse_size(styles.get("y", "")) or level[3])
+        frame = {
+            "x": x,
+            "y": y,
+            "width": max(width, 1),
+            "height": max(height, 1),
+            "fill": pick_color(styles, ["background", "background-color"]) or "#FFFFFF",
+        }
+        text = None
+        if child.text_fragments:
+            text = {
+                "text": normalize_whitespace(" ".join(child.text_fragments))[:5000],
+                "fontSize": max(int(parse_size(styles.get("font-size", "")) or 14), 1),
+                "fill": pick_color(styles, ["color"]) or "#111111",
+            }
+
+        # Paths identify a node across runs: tag#id when the element has an id, else tag:nth.
+        # They grow with depth, so they are only built when the incremental planner needs them.
+        path = ""
+        if with_paths:
+            node_id = child.attrs.get("id", "").strip()
+            base = f"{child.tag}#{node_id}" if node_id else child.tag
+            seen = level[4].get(base, 0)
+            level[4][base] = seen + 1
+            key = base if node_id and not seen else f"{base}:{seen}"
+            path = f"{level[2]}/{key}"
+
+        yield index, level[1], path, child, frame, text
+        level[3] = y + height + y_gap
+        if child.children:
+            stack.append([iter(child.children), index, path, 0, {}])
+        index += 1
+
 
-    def walk(node: Node, parent_capture: str, cursor_y: int = 0) -> int:
-        nonlocal node_counter, text_counter
-        block_cursor_y = cursor_y
-        for child in node.children:
-            if child.tag in {"script", "style", "meta", "link", "head"}:
-                continue
-
-            styles = child.styles
-            width = int(parse_size(styles.get("width", "")) or 320)
-            height = int(parse_size(styles.get("height", "")) or 44)
-            x = int(parse_size(styles.get("left", "")) or parse_size(styles.get("x", "")) or 0)
-            y = int(parse_size(styles.get("top", "")) or parse_size(styles.get("y", "")) or block_cursor_y)
-
-            color = pick_color(styles, ["background", "background-color"]) or "#FFFFFF"
-            capture = f"node_{node_counter:03d}"
-            operations.append(
+def frame_operation(plan_version: int, index: int, node: Node, frame: dict, parent_ref: str) -> dict:
+    return make_operation(
+        plan_version,
+        f"create-frame-{index + 1:03d}",
+        "create-frame",
+        {"name": frame_name(node, index + 1), **frame, "parentId": parent_ref},
+        f"node_{index + 1:03d}",
+    )
+
+
+def text_operation(plan_version: int, number: int, node: Node, text: dict, parent_ref: str) -> dict:
+    return make_operation(
+        plan_version,
+        f"create-text-{number:03d}",
+        "create-text",
+        {"name": text_name(node, number), "x": 0, "y": 0, **text, "parentId": parent_ref},
+        f"text_{number:03d}",
+    )
+
+
+def tree_operations(layout: Iterable[LayoutEntry], frame_width: int, frame_height: int) -> list[dict]:
+    # Same nodes and capture names as the per-node operations, nested so the plugin builds them in
+    # few calls. All children of a frame at TREE_MAX_DEPTH move to one create-tree under its capture,
+    # emitted after the tree holding that frame, so sibling order is kept.
+    root: dict = {
+        "command": "create-frame",
+        "args": {"name": "HTML-ROOT", "x": 0, "y": 0, "width": frame_width, "height": frame_height, "fill": "#FFFFFF"},
+        "capture": "html_root",
+    }
+    trees: list[tuple[str, list[dict]]] = [("", [root])]
+    continued: dict[int, list[dict]] = {}
+    specs: list[dict] = []
+    depths: list[int] = []
+    text_counter = 1
+    for index, parent, _, node, frame, text in layout:
+        spec = {
+            "command": "create-frame",
+            "args": {"name": frame_name(node, index + 1), **frame},
+            "capture": f"node_{index + 1:03d}",
+        }
+        depth = depths[parent] + 1 if parent >= 0 else 1
+        if depth > TREE_MAX_DEPTH:
+            if parent not in continued:
+                continued[parent] = []
+                trees.append((f"{{{{node_{parent + 1:03d}}}}}", continued[parent]))
+            continued[parent].append(spec)
+            depth = 1
+        else:
+            (specs[parent] if parent >= 0 else root).setdefault("children", []).append(spec)
+        specs.append(spec)
+        depths.append(depth)
+        if text:
+            spec["children"] = [
                 {
-                    "name": f"create-frame-{node_counter:03d}",
-                    "run": [
-                        "create",
-                        "frame",
-                        "--name",
-                        frame_name(child, node_counter),
-                        "--x",
-                        str(x),
-                        "--y",
-                        str(y),
-                        "--width",
-                        str(max(width, 1)),
-                        "--height",
-                        str(max(height, 1)),
-                        "--fill",
-                        color,
-                        "--parent",
-                        f"{{{{{parent_capture}}}}}",
-                        "--json",
-                    ],
-                    "capture": capture,
+                    "command": "create-text",
+                    "args": {"name": text_name(node, text_counter), "x": 0, "y": 0, **text},
+                    "capture": f"text_{text_counter:03d}",
                 }
+            ]
+            text_counter += 1
+    operations = [make_operation(2, "create-html-tree", "create-tree", {"nodes": trees[0][1]})]
+    for number, (parent_ref, nodes) in enumerate(trees[1:], start=2):
+        operations.append(
+            make_operation(2, f"create-html-tree-{number:03d}", "create-tree", {"parentId": parent_ref, "nodes": nodes})
+        )
+    return operations
+
+
+def subtree_shapes(layout: list[LayoutEntry]) -> tuple[list[int], list[int], list[int]]:
+    # Hash-consing: subtrees with the same frame sizes/fills, text styles and child offsets get
+    # the same shape id, whatever their text says or where they sit. Children follow their parent
+    # in preorder, so one reverse pass sees every child first. Also returns each subtree's node
+    # count (frames and texts) and its span of layout entries.
+    interned: dict[tuple, int] = {}
+    child_keys: list[list[tuple]] = [[] for _ in layout]
+    shapes = [0] * len(layout)
+    nodes = [0] * len(layout)
+    spans = [1] * len(layout)
+    for index, parent, _, _, frame, text in reversed(layout):
+        text_style = tuple(sorted((key, value) for key, value in text.items() if key != "text")) if text else None
+        key = (frame["width"], frame["height"], frame["fill"], text_style, tuple(reversed(child_keys[index])))
+        shapes[index] = interned.setdefault(key, len(interned))
+        nodes[index] += 2 if text else 1
+        if parent >= 0:
+            child_keys[parent].append((frame["x"], frame["y"], shapes[index]))
+            nodes[parent] += nodes[index]
+            spans[parent] += spans[index]
+    return shapes, nodes, spans
+
+
+def component_roots(layout: list[LayoutEntry], min_repeats: int) -> tuple[dict[int, int], list[int]]:
+    # Outermost repeated subtrees of more than one node become instances. A shape whose
+    # repeats mostly sit inside other instances is dropped and the walk redone. Subtrees deeper
+    # than TREE_MAX_DEPTH stay plain frames: their component spec would nest as deep.
+    shapes, nodes, spans = subtree_shapes(layout)
+    heights = [1] * len(layout)
+    for index, parent, *_ in reversed(layout):
+        if parent >= 0:
+            heights[parent] = max(heights[parent], heights[index] + 1)
+    candidates = {shape for shape, count in Counter(shapes).items() if count >= min_repeats}
+    while True:
+        roots: dict[int, int] = {}
+        index = 0
+        while index < len(layout):
+            if shapes[index] in candidates and nodes[index] > 1 and heights[index] <= TREE_MAX_DEPTH:
+                roots[index] = shapes[index]
+                index += spans[index]
+            else:
+                index += 1
+        rare = {shape for shape, count in Counter(roots.values()).items() if count < min_repeats}
+        if not rare:
+            return roots, spans
+        candidates -= rare
+
+
+def component_children(layout: list[LayoutEntry], root: int, span: int, text_numbers: list[int]) -> list[dict]:
+    # Tree node specs for everything below one subtree root, nested as in tree_operations.
+    top: list[dict] = []
+    specs: dict[int, dict] = {}
+    _, _, _, node, _, text = layout[root]
+    if text:
+        top.append({"command": "create-text", "args": {"name": text_name(node, text_numbers[root]), "x": 0, "y": 0, **text}})
+    for index, parent, _, node, frame, text in layout[root + 1 : root + span]:
+        spec: dict = {"command": "create-frame", "args": {"name": frame_name(node, index + 1), **frame}}
+        (specs[parent].setdefault("children", []) if parent != root else top).append(spec)
+        specs[index] = spec
+        if text:
+            spec["children"] = [
+                {"command": "create-text", "args": {"name": text_name(node, text_numbers[index]), "x": 0, "y": 0, **text}}
+            ]
+    return top
+
+
+def subtree_texts(layout: list[LayoutEntry], root: int, span: int) -> list[str]:
+    # Document order, which is also the order the plugin finds text nodes in an instance.
+    return [entry[5]["text"] for entry in layout[root : root + span] if entry[5]]
+
+
+def iter_component_operations(
+    layout: list[LayoutEntry],
+    page_name: str,
+    frame_width: int,
+    frame_height: int,
+    y_gap: int,
+    min_repeats: int,
+) -> Iterator[dict]:
+    roots, spans = component_roots(layout, min_repeats)
+    yield make_operation(2, "create-page", "create-page", {"name": page_name}, "page_id")
+    yield make_operation(2, "set-page", "set-current-page", {"idOrName": page_name})
+    yield make_operation(
+        2,
+        "create-root-frame",
+        "create-frame",
+        {"name": "HTML-ROOT", "x": 0, "y": 0, "width": frame_width, "height": frame_height, "fill": "#FFFFFF"},
+        "html_root",
+    )
+
+    # Text numbering matches the per-node plan, so names do not depend on which subtrees repeat.
+    text_numbers = [0] * len(layout)
+    text_counter = 1
+    for index, _, _, _, _, text in layout:
+        if text:
+            text_numbers[index] = text_counter
+            text_counter += 1
+
+    # The first occurrence of each shape is the master; later ones only override differing text.
+    components: dict[int, tuple[str, list[str]]] = {}
+    component_y = 0
+    for index, shape in roots.items():
+        if shape in components:
+            continue
+        number = len(components) + 1
+        _, _, _, node, frame, _ = layout[index]
+        capture = f"component_{number:03d}"
+        args = {
+            "name": f"C{number:03d}-{frame_name(node, index + 1)}"[:120],
+            **frame,
+            "x": frame_width + COMPONENT_GAP,
+            "y": component_y,
+            "children": component_children(layout, index, spans[index], text_numbers),
+        }
+        component_y += frame["height"] + y_gap
+        yield make_operation(2, f"create-component-{number:03d}", "create-component", args, capture)
+        components[shape] = (capture, subtree_texts(layout, index, spans[index]))
+
+    skip_until = 0
+    for index, parent, _, node, frame, text in layout:
+        if index < skip_until:
+            continue
+        parent_ref = f"{{{{node_{parent + 1:03d}}}}}" if parent >= 0 else "{{html_root}}"
+        if index in roots:
+            capture, master_texts = components[roots[index]]
+            args = {
+                "name": frame_name(node, index + 1),
+                "componentId": f"{{{{{capture}}}}}",
+                "x": frame["x"],
+                "y": frame["y"],
+                "parentId": parent_ref,
+            }
+            texts = [value if value != master else None for value, master in zip(subtree_texts(layout, index, spans[index]), master_texts)]
+            while texts and texts[-1] is None:
+                texts.pop()
+            if texts:
+                args["texts"] = texts
+            yield make_operation(2, f"create-instance-{index + 1:03d}", "create-instance", args, f"node_{index + 1:03d}")
+            skip_until = index + spans[index]
+            continue
+        yield frame_operation(2, index, node, frame, parent_ref)
+        if text:
+            yield text_operation(2, text_numbers[index], node, text, f"{{{{node_{index + 1:03d}}}}}")
+
+
+def iter_layout_operations(
+    layout: Iterable[LayoutEntry],
+    page_name: str,
+    frame_width: int,
+    frame_height: int,
+    plan_version: int = 1,
+    tree: bool = False,
+) -> Iterator[dict]:
+    if tree:
+        yield make_operation(plan_version, "create-page", "create-page", {"name": page_name}, "page_id")
+        yield make_operation(plan_version, "set-page", "set-current-page", {"idOrName": page_name})
+        yield from tree_operations(layout, frame_width, frame_height)
+        return
+    yield make_operation(plan_version, "create-page", "create-page", {"name": page_name}, "page_id")
+    yield make_operation(plan_version, "set-page", "set-current-page", {"idOrName": page_name})
+    yield make_operation(
+        plan_version,
+        "create-root-frame",
+        "create-frame",
+        {"name": "HTML-ROOT", "x": 0, "y": 0, "width": frame_width, "height": frame_height, "fill": "#FFFFFF"},
+        "html_root",
+    )
+
+    text_counter = 1
+    for index, parent, _, node, frame, text in layout:
+        parent_capture = f"node_{parent + 1:03d}" if parent >= 0 else "html_root"
+        yield frame_operation(plan_version, index, node, frame, f"{{{{{parent_capture}}}}}")
+        if text:
+            yield text_operation(plan_version, text_counter, node, text, f"{{{{node_{index + 1:03d}}}}}")
+            text_counter += 1
+
+
+def iter_operations(
+    html_root: Node,
+    page_name: str,
+    frame_width: int,
+    frame_height: int,
+    y_gap: int,
+    plan_version: int = 1,
+    tree: bool = False,
+    components: int = 0,
+) -> Iterator[dict]:
+    layout = iter_layout(html_root, y_gap)
+    if components:
+        # Shapes are only known once the whole document is laid out.
+        return iter_component_operations(list(layout), page_name, frame_width, frame_height, y_gap, components)
+    return iter_layout_operations(layout, page_name, frame_width, frame_height, plan_version, tree)
+
+
+def subtree_hashes(layout: list[LayoutEntry]) -> list[str]:
+    # Children always follow their parent in preorder, so one reverse pass sees every child first.
+    child_hashes: list[list[str]] = [[] for _ in layout]
+    hashes = [""] * len(layout)
+    for index, parent, path, _, frame, text in reversed(layout):
+        payload = [path.rsplit("/", 1)[1], frame, text, child_hashes[index][::-1]]
+        digest = hashlib.sha1(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+        hashes[index] = digest
+        if parent >= 0:
+            child_hashes[parent].append(digest)
+    return hashes
+
+
+def load_manifest(manifest_path: Path, page_name: str) -> tuple[dict | None, str]:
+    if not manifest_path.exists():
+        return None, "no manifest from a previous run"
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as exc:
+        return None, f"unreadable manifest ({exc})"
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return None, "manifest version mismatch"
+    if manifest.get("page_name") != page_name:
+        return None, f"manifest is for page '{manifest.get('page_name')}'"
+    if not isinstance(manifest.get("nodes"), dict) or not manifest.get("root_id"):
+        return None, "manifest has no node map"
+    return manifest, ""
+
+
+def build_incremental_operations(
+    layout: list[LayoutEntry],
+    hashes: list[str],
+    previous: dict | None,
+    page_name: str,
+    frame_width: int,
+    frame_height: int,
+    plan_version: int = 1,
+    tree: bool = False,
+) -> tuple[list[dict], dict]:
+    frame_size = {"width": frame_width, "height": frame_height}
+    nodes: dict[str, dict] = {}
+    if previous is None:
+        operations = list(iter_layout_operations(layout, page_name, frame_width, frame_height, plan_version, tree))
+        text_counter = 1
+        for (index, parent, path, _, frame, text), digest in zip(layout, hashes):
+            nodes[path] = {
+                "parent": layout[parent][2] if parent >= 0 else "",
+                "hash": digest,
+                "frame": frame,
+                "text": text,
+                "frame_id": f"{{{{node_{index + 1:03d}}}}}",
+                "text_id": f"{{{{text_{text_counter:03d}}}}}" if text else "",
+            }
+            text_counter += 1 if text else 0
+        return operations, {"page_id": "{{page_id}}", "root_id": "{{html_root}}", "frame_size": frame_size, "nodes": nodes}
+
+    old_nodes: dict[str, dict] = previous["nodes"]
+    root_id = previous["root_id"]
+    operations = [make_operation(plan_version, "set-page", "set-current-page", {"idOrName": previous["page_id"]})]
+    if previous.get("frame_size") != frame_size:
+        operations.append(
+            make_operation(
+                plan_version,
+                "resize-root-frame",
+                "set-geometry",
+                {"id": root_id, "x": 0, "y": 0, **frame_size},
             )
-            node_counter += 1
+        )
+
+    # Removing a frame removes its subtree, so only delete the topmost vanished nodes.
+    gone = set(old_nodes) - {entry[2] for entry in layout}
+    for number, path in enumerate(sorted(path for path in gone if old_nodes[path]["parent"] not in gone), start=1):
+        op = make_operation(plan_version, f"delete-node-{number:03d}", "delete-node", {"id": old_nodes[path]["frame_id"]})
+        # Already removed by hand in Figma is fine; the node is gone either way.
+        op["ignore_error"] = True
+        operations.append(op)
+
+    text_counter = 1
+    for (index, parent, path, node, frame, text), digest in zip(layout, hashes):
+        number = index + 1
+        text_number = text_counter
+        text_counter += 1 if text else 0
+        parent_path = layout[parent][2] if parent >= 0 else ""
+        parent_ref = nodes[parent_path]["frame_id"] if parent >= 0 else root_id
+        old = old_nodes.get(path)
+
+        if old is None:
+            operations.append(frame_operation(plan_version, index, node, frame, parent_ref))
+            frame_id = f"{{{{node_{number:03d}}}}}"
+            text_id = ""
+            if text:
+                operations.append(text_operation(plan_version, text_number, node, text, frame_id))
+                text_id = f"{{{{text_{text_number:03d}}}}}"
+            nodes[path] = {"parent": parent_path, "hash": digest, "frame": frame, "text": text, "frame_id": frame_id, "text_id": text_id}
+            continue
 
-            if child.text_fragments:
-                text = normalize_whitespace(" ".join(child.text_fragments))[:5000]
-                text_fill = pick_color(styles, ["color"]) or "#111111"
-                font_size = int(parse_size(styles.get("font-size", "")) or 14)
+        frame_id = old["frame_id"]
+        text_id = old.get("text_id", "")
+        if old["hash"] != digest:
+            old_frame = old.get("frame") or {}
+            geometry = {key: frame[key] for key in ("x", "y", "width", "height")}
+            if any(old_frame.get(key) != value for key, value in geometry.items()):
                 operations.append(
-                    {
-                        "name": f"create-text-{text_counter:03d}",
-                        "run": [
-                            "create",
-                            "text",
-                            "--name",
-                            text_name(child, text_counter),
-                            "--x",
-                            "0",
-                            "--y",
-                            "0",
-                            "--text",
-                            text,
-                            "--font-size",
-                            str(max(font_size, 1)),
-                            "--fill",
-                            text_fill,
-                            "--parent",
-                            f"{{{{{capture}}}}}",
-                            "--json",
-                        ],
-                        "capture": f"text_{text_counter:03d}",
-                    }
+                    make_operation(plan_version, f"update-geometry-{number:03d}", "set-geometry", {"id": frame_id, **geometry})
+                )
+            if old_frame.get("fill") != frame["fill"]:
+                operations.append(
+                    make_operation(plan_version, f"update-fill-{number:03d}", "set-fill", {"id": frame_id, "color": frame["fill"]})
                 )
-                text_counter += 1
 
-            walk(child, capture, 0)
-            block_cursor_y = y + height + y_gap
+            old_text = old.get("text")
+            if old_text and (not text or old_text.get("fontSize") != text["fontSize"]):
+                operations.append(make_operation(plan_version, f"delete-text-{number:03d}", "delete-node", {"id": text_id}))
+                old_text = None
+                text_id = ""
+            if text and not old_text:
+                operations.append(text_operation(plan_version, text_number, node, text, frame_id))
+                text_id = f"{{{{text_{text_number:03d}}}}}"
+            elif text and old_text:
+                if old_text.get("text") != text["text"]:
+                    operations.append(
+                        make_operation(plan_version, f"update-text-{text_number:03d}", "set-text", {"id": text_id, "text": text["text"]})
+                    )
+                if old_text.get("fill") != text["fill"]:
+                    operations.append(
+                        make_operation(
+                            plan_version,
+                            f"update-text-fill-{text_number:03d}",
+                            "set-fill",
+                            {"id": text_id, "color": text["fill"]},
+                        )
+                    )
+        nodes[path] = {"parent": parent_path, "hash": digest, "frame": frame, "text": text, "frame_id": frame_id, "text_id": text_id}
 
-        return block_cursor_y
+    return operations, {
+        "page_id": previous["page_id"],
+        "root_id": root_id,
+        "frame_size": frame_size,
+        "file_key": previous.get("file_key", ""),
+        "nodes": nodes,
+    }
 
-    body = first_tag(html_root, "body") or html_root
-    walk(body, "html_root", 0)
 
-    return {
-        "meta": {
-            "generator": "html_to_figma_plan.py",
-            "source_doc": str(source_html),
-            "project_name": project_name,
-            "project_slug": project_slug,
-            "task_id": task_id,
-            "mode": "full-refresh",
-            "source_type": "html",
-            "parity_target": "strict",
-            "page_name": page_name,
-            "frame_size": {"width": frame_width, "height": frame_height},
-            "gap": {"x": x_gap, "y": y_gap},
-        },
-        "operations": operations,
-    }
+def build_plan(
+    source_html: Path,
+    html_root: Node,
+    project_name: str,
+    project_slug: str,
+    task_id: str,
+    page_name: str,
+    frame_width: int,
+    frame_height: int,
+    x_gap: int,
+    y_gap: int,
+    plan_version: int = 1,
+) -> dict:
+    operations = list(iter_operations(html_root, page_name, frame_width, frame_height, y_gap, plan_version))
+    meta = plan_meta(
+        source_html,
+        project_name,
+        project_slug,
+        task_id,
+        page_name,
+        frame_width,
+        frame_height,
+        x_gap,
+        y_gap,
+        plan_version,
+    )
+    meta["fonts"] = plan_fonts(operations)
+    return {"meta": meta, "operations": operations}
+
+
+def write_plan_output(
+    output_path: Path | None,
+    plan_format: str,
+    meta: dict,
+    operations: Iterable[dict],
+    operations_json: str = "",
+    compress: bool = False,
+) -> int:
+    if plan_format == "jsonl":
+        if output_path is None:
+            return write_jsonl_plan(sys.stdout, meta, operations)
+        with open_plan_output(output_path, compress) as stream:
+            return write_jsonl_plan(stream, meta, operations)
+
+    plan = {"meta": meta, "operations": list(operations)}
+    if plan_format == "compact":
+        text = encode_compact_plan(meta, plan["operations"])
+    elif operations_json:
+        text = render_plan_json(meta, operations_json)
+    else:
+        text = json.dumps(plan, ensure_ascii=False, indent=2)
+    if output_path is None:
+        sys.stdout.write(text + "\n")
+    else:
+        write_plan_text(output_path, text, compress)
+    return len(plan["operations"])
 
 
 def main() -> int:
     parser = argparse.ArgumentParser(description="Generate bridge JSON plan from an HTML file.")
     parser.add_argument("--input", required=True, help="Path to HTML document")
-    parser.add_argument("--output", default="", help="Output JSON plan path (must be under temp root)")
+    parser.add_argument(
+        "--output",
+        default="",
+        help="Output plan path (must be under temp root), or - to write the plan to stdout",
+    )
     parser.add_argument("--project-name", default="", help="Project name used for temp file prefix")
     parser.add_argument("--task-id", default="", help="Task ID used to avoid same-project collisions")
     parser.add_argument("--temp-root", default="", help="Temp root directory. Defaults to system temp/auto-figma")
@@ -299,15 +826,73 @@ def main() -> int:
     parser.add_argument("--frame-height", type=int, default=1024, help="Root frame height")
     parser.add_argument("--x-gap", type=int, default=32, help="Horizontal gap fallback")
     parser.add_argument("--y-gap", type=int, default=16, help="Vertical gap fallback")
+    parser.add_argument(
+        "--plan-version",
+        type=int,
+        default=1,
+        choices=[1, 2],
+        help="1 emits run tokens; 2 emits typed {command, args, refs, capture} operations",
+    )
+    parser.add_argument(
+        "--tree",
+        action="store_true",
+        help="Emit the page as one create-tree operation (needs --plan-version 2; incremental diffs stay per node)",
+    )
+    parser.add_argument(
+        "--components",
+        action="store_true",
+        help="Emit repeated subtrees as one create-component plus a create-instance per repeat (needs --plan-version 2)",
+    )
+    parser.add_argument(
+        "--component-min-repeats",
+        type=int,
+        default=2,
+        help="Occurrences a subtree shape needs before --components turns it into a component",
+    )
+    parser.add_argument(
+        "--format",
+        default="json",
+        choices=["json", "jsonl", "compact"],
+        help="jsonl writes the meta line and then each operation as soon as it is generated; "
+        "compact writes unindented positional operations over a shared string table",
+    )
+    parser.add_argument("--gzip", action="store_true", help="gzip the plan file (the applier detects it from the content)")
+    parser.add_argument(
+        "--stream-parse",
+        action="store_true",
+        help="Read the HTML in chunks and drop script/style/head content while parsing",
+    )
+    parser.add_argument("--chunk-size", type=int, default=1 << 20, help="Characters per chunk with --stream-parse")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Diff against the manifest of the last applied run and only emit changed nodes",
+    )
+    parser.add_argument(
+        "--manifest",
+        default="",
+        help="Incremental manifest path (defaults to <temp-root>/manifests/<project>_html.json)",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse the plan from <temp-root>/plan_cache when the source and layout args are unchanged",
+    )
+    parser.add_argument("--cache-max-mb", type=int, default=256, help="Plan cache size bound; least recently used entries are evicted")
     args = parser.parse_args()
+    if args.tree and args.plan_version < 2:
+        raise SystemExit("--tree needs --plan-version 2")
+    if args.components and args.plan_version < 2:
+        raise SystemExit("--components needs --plan-version 2")
+    if args.components and (args.tree or args.incremental):
+        # Nodes inside an instance have no captures of their own to nest or diff against.
+        raise SystemExit("--components cannot be combined with --tree or --incremental")
+    components = max(args.component_min_repeats, 2) if args.components else 0
 
     input_path = Path(args.input).resolve()
     if not input_path.exists():
         raise SystemExit(f"Input not found: {input_path}")
 
-    parser_tree = MiniHTMLTree()
-    parser_tree.feed(input_path.read_text(encoding="utf-8"))
-
     project_name = args.project_name.strip() or input_path.parent.name or input_path.stem
     project_slug = slugify_project_name(project_name)
     task_id = normalize_task_id(args.task_id) or generate_task_id()
@@ -316,33 +901,145 @@ def main() -> int:
     temp_root = Path(args.temp_root).resolve() if args.temp_root else default_temp_root().resolve()
     temp_root.mkdir(parents=True, exist_ok=True)
 
-    if args.output:
+    to_stdout = args.output == "-"
+    if to_stdout and args.gzip:
+        raise SystemExit("--gzip needs a plan file; it cannot be combined with --output -")
+    suffix = ("jsonl" if args.format == "jsonl" else "json") + (".gz" if args.gzip else "")
+    if to_stdout:
+        output_path = None
+    elif args.output:
         output_path = Path(args.output).resolve()
     else:
-        output_path = temp_root / f"{project_slug}_{task_id}_plan.json"
+        output_path = temp_root / f"{project_slug}_{task_id}_plan.{suffix}"
 
-    if not is_within(output_path, temp_root):
+    if output_path and not is_within(output_path, temp_root):
         raise SystemExit(f"Output path must be under temp root: {temp_root}")
 
-    plan = build_plan(
-        source_html=input_path,
-        html_root=parser_tree.root,
-        project_name=project_name,
-        project_slug=project_slug,
-        task_id=task_id,
-        page_name=page_name,
-        frame_width=max(args.frame_width, 1),
-        frame_height=max(args.frame_height, 1),
-        x_gap=max(args.x_gap, 0),
-        y_gap=max(args.y_gap, 0),
-    )
+    frame_width = max(args.frame_width, 1)
+    frame_height = max(args.frame_height, 1)
+
+    cache_dir = temp_root / CACHE_DIR_NAME
+    key = ""
+    cached = None
+    cache_report = ""
+    if args.cache and args.incremental:
+        cache_report = "Plan cache: skipped (--incremental depends on the manifest, not only the source)"
+    elif args.cache:
+        key = cache_key(
+            Path(__file__).resolve(),
+            input_path,
+            {
+                "project_name": project_name,
+                "page_name": page_name,
+                "frame_width": frame_width,
+                "frame_height": frame_height,
+                "x_gap": max(args.x_gap, 0),
+                "y_gap": max(args.y_gap, 0),
+                "plan_version": args.plan_version,
+                "tree": args.tree,
+                "components": components,
+            },
+        )
+        cached = load_cached_plan(cache_dir, key)
+
+    operations: Iterable[dict]
+    operations_json = ""
+    incremental_note = ""
+    if cached:
+        meta = cached["meta"]
+        meta["task_id"] = task_id
+        meta["source_doc"] = str(input_path)
+        operations_json = cached["operations_json"]
+        operations = json.loads(operations_json)
+        stats = record_cache_stats(cache_dir, hit=True)
+        cache_report = format_cache_report(True, key, stats)
+    else:
+        html_root = parse_html(input_path, stream=args.stream_parse, chunk_size=args.chunk_size)
+        meta = plan_meta(
+            input_path,
+            project_name,
+            project_slug,
+            task_id,
+            page_name,
+            frame_width,
+            frame_height,
+            max(args.x_gap, 0),
+            max(args.y_gap, 0),
+            args.plan_version,
+        )
+        operations = iter_operations(
+            html_root,
+            page_name,
+            frame_width,
+            frame_height,
+            max(args.y_gap, 0),
+            args.plan_version,
+            args.tree,
+            components,
+        )
+
+        if args.incremental:
+            if args.manifest:
+                manifest_path = Path(args.manifest).resolve()
+            else:
+                manifest_path = temp_root / "manifests" / f"{project_slug}_html.json"
+            if not is_within(manifest_path, temp_root):
+                raise SystemExit(f"Manifest path must be under temp root: {temp_root}")
+            previous, reason = load_manifest(manifest_path, page_name)
+            layout = list(iter_layout(html_root, max(args.y_gap, 0), with_paths=True))
+            operations, manifest = build_incremental_operations(
+                layout,
+                subtree_hashes(layout),
+                previous,
+                page_name,
+                frame_width,
+                frame_height,
+                args.plan_version,
+                args.tree,
+            )
+            meta["mode"] = "incremental" if previous else "full-refresh"
+            # The applier resolves the {{capture}} IDs in this manifest and writes it after a successful apply.
+            meta["incremental_manifest"] = {
+                "path": str(manifest_path),
+                "data": {
+                    "version": MANIFEST_VERSION,
+                    "generator": "html_to_figma_plan.py",
+                    "source_doc": str(input_path),
+                    "page_name": page_name,
+                    **manifest,
+                },
+            }
+            if previous:
+                incremental_note = f"Incremental against: {manifest_path}"
+            else:
+                incremental_note = f"Incremental fallback to full refresh: {reason}"
+        if key or args.format != "jsonl" or isinstance(operations, list):
+            # Meta is written first, so only a streamed jsonl plan goes without its font set.
+            operations = list(operations)
+            meta["fonts"] = plan_fonts(operations)
+        if key:
+            operations_json = json.dumps(operations, ensure_ascii=False, indent=2)
+            evicted = store_cached_plan(
+                cache_dir,
+                key,
+                {"meta": meta, "operations_json": operations_json},
+                max(args.cache_max_mb, 1) * 1024 * 1024,
+            )
+            stats = record_cache_stats(cache_dir, hit=False, evicted=evicted)
+            cache_report = format_cache_report(False, key, stats, evicted)
+
+    count = write_plan_output(output_path, args.format, meta, operations, operations_json, args.gzip)
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text(json.dumps(plan, ensure_ascii=False, indent=2), encoding="utf-8")
-    print(f"Generated plan: {output_path}")
-    print(f"Project: {project_name} ({project_slug})")
-    print(f"Task ID: {task_id}")
-    print(f"Operations: {len(plan['operations'])}")
+    # Keep stdout clean for the plan itself when it is being piped.
+    report = sys.stderr if to_stdout else sys.stdout
+    print(f"Generated plan: {output_path or '<stdout>'}", file=report)
+    print(f"Project: {project_name} ({project_slug})", file=report)
+    print(f"Task ID: {task_id}", file=report)
+    print(f"Operations: {count}", file=report)
+    if incremental_note:
+        print(incremental_note, file=report)
+    if cache_report:
+        print(cache_report, file=report)
     return 0
 
 
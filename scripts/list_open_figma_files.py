@@ -19,6 +19,13 @@ def fetch_targets(endpoint: str) -> list[dict]:
     return [x for x in payload if isinstance(x, dict)]
 
 
+def fetch_bridge_clients(base: str) -> dict[str, dict]:
+    with urlopen(f"{base.rstrip('/')}/health", timeout=3) as resp:  # nosec B310
+        payload = json.loads(resp.read().decode("utf-8"))
+    clients = payload.get("clients") if isinstance(payload, dict) else None
+    return clients if isinstance(clients, dict) else {}
+
+
 def extract_file_key(url: str) -> str:
     if not url:
         return ""
@@ -38,6 +45,11 @@ def main() -> int:
         help="CDP endpoint URL",
     )
     parser.add_argument("--json", action="store_true", help="Output JSON only")
+    parser.add_argument(
+        "--bridge",
+        default="",
+        help="Bridge base URL (e.g. http://127.0.0.1:38450) to mark files whose plugin is registered for --route",
+    )
     args = parser.parse_args()
 
     try:
@@ -61,11 +73,23 @@ def main() -> int:
             }
         )
 
+    bridge_clients: dict[str, dict] | None = None
+    if args.bridge:
+        try:
+            bridge_clients = fetch_bridge_clients(args.bridge)
+        except Exception as exc:  # noqa: BLE001
+            raise SystemExit(f"Failed to query bridge {args.bridge}: {exc}")
+        for item in files:
+            client = bridge_clients.get(item["fileKey"]) if item["fileKey"] else None
+            item["bridgeConnected"] = bool(client and client.get("connected"))
+
     result = {
         "count": len(files),
         "current_candidate": files[0] if files else None,
         "files": files,
     }
+    if bridge_clients is not None:
+        result["bridge_clients"] = bridge_clients
 
     if args.json:
         print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -86,6 +110,8 @@ def main() -> int:
         print(f"{idx}. {item.get('title', '')}")
         print(f"   fileKey: {item.get('fileKey', '')}")
         print(f"   url: {item.get('url', '')}")
+        if "bridgeConnected" in item:
+            print(f"   bridge plugin: {'registered' if item['bridgeConnected'] else 'not running'}")
     return 0
 
 
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""Shrink a bridge plan before apply: collapse wrapper frames and merge set-* runs."""
+
+from __future__ import annotations
+
+import argparse
+import json
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any
+
+from figma_bridge_apply_plan import PLACEHOLDER_RE, convert_plan_to_v2, default_temp_root, is_tree, is_within
+from plan_codec import load_plan
+
+# A frame with any other argument set (stroke, radius, opacity, auto layout) draws something of its own.
+WRAPPER_KEYS = {"name", "x", "y", "width", "height", "fill", "parentId"}
+PARTIAL_SET_COMMANDS = {"set-geometry", "set-layout", "set-fill"}
+MERGE_COMMANDS = PARTIAL_SET_COMMANDS | {"set-text", "set-opacity"}
+MERGE_OP_KEYS = {"name", "command", "args", "refs", "ignore_error"}
+
+
+def number(command_args: dict[str, Any], key: str, default: float) -> float | None:
+    # Mirrors the plugin: missing or empty values fall back to its defaults.
+    value = command_args.get(key)
+    if value is None or value == "":
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def covers_wrapper(wrapper: dict[str, Any], child: dict[str, Any]) -> bool:
+    # The child sits at the wrapper's origin with the wrapper's size and is opaque (frames are
+    # created with a solid fill), so the wrapper neither shows nor clips anything.
+    extra = {key for key, value in wrapper.items() if key not in WRAPPER_KEYS and value not in (None, "", "NONE")}
+    if extra or child.get("layoutMode") not in (None, "", "NONE"):
+        return False
+    opacity = number(child, "opacity", 1)
+    if opacity is None or opacity < 1:
+        return False
+    if number(child, "x", 0) != 0 or number(child, "y", 0) != 0:
+        return False
+    return all(
+        number(child, key, 100) is not None and number(child, key, 100) == number(wrapper, key, 100)
+        for key in ("width", "height")
+    )
+
+
+def collapsed_child(wrapper: dict[str, Any], child: dict[str, Any]) -> dict[str, Any]:
+    merged = {key: value for key, value in child.items() if key != "parentId"}
+    merged["x"] = wrapper.get("x", 0)
+    merged["y"] = wrapper.get("y", 0)
+    if wrapper.get("parentId"):
+        merged["parentId"] = wrapper["parentId"]
+    return merged
+
+
+def ref_keys(command_args: dict[str, Any]) -> list[str]:
+    return [key for key, value in command_args.items() if isinstance(value, str) and PLACEHOLDER_RE.search(value)]
+
+
+def pinned_captures(meta: dict[str, Any]) -> set[str]:
+    # The incremental manifest maps source nodes to these captures; removing one would
+    # leave the manifest unresolvable, so such frames are never optimized away.
+    return set(PLACEHOLDER_RE.findall(json.dumps(meta.get("incremental_manifest") or {}, ensure_ascii=False)))
+
+
+def count_uses(operations: list[dict[str, Any]]) -> tuple[Counter, dict[str, list[int]]]:
+    uses: Counter = Counter()
+    children: dict[str, list[int]] = defaultdict(list)
+    for idx, op in enumerate(operations):
+        for key in op.get("refs", []):
+            uses.update(PLACEHOLDER_RE.findall(op["args"][key]))
+        parent = op["args"].get("parentId")
+        match = PLACEHOLDER_RE.fullmatch(parent) if isinstance(parent, str) else None
+        if match:
+            children[match.group(1)].append(idx)
+    return uses, children
+
+
+def collapse_wrappers(operations: list[dict[str, Any]], pinned: set[str], report: Counter) -> list[dict[str, Any]]:
+    uses, children = count_uses(operations)
+    removed: set[int] = set()
+    for idx, op in enumerate(operations):
+        capture = op.get("capture")
+        if op["command"] != "create-frame" or not capture or op.get("ignore_error") or uses[capture] != 1:
+            continue
+        # The sole child must come right after the wrapper, so it takes over its stacking slot.
+        # Parents precede their children, so the wrapper's parent is never revisited.
+        if children[capture] != [idx + 1]:
+            continue
+        child = operations[idx + 1]
+        if child["command"] != "create-frame" or not covers_wrapper(op["args"], child["args"]):
+            continue
+        if capture in pinned:
+            report["pinned"] += 1
+            continue
+        child["args"] = collapsed_child(op["args"], child["args"])
+        child["refs"] = ref_keys(child["args"])
+        if not child["refs"]:
+            child.pop("refs")
+        removed.add(idx)
+        report["wrappers"] += 1
+    return [op for idx, op in enumerate(operations) if idx not in removed]
+
+
+def merge_set_args(command: str, first: dict[str, Any], second: dict[str, Any]) -> dict[str, Any]:
+    if command not in PARTIAL_SET_COMMANDS:
+        return dict(second)
+    # The plugin leaves properties with missing or empty values untouched.
+    return {**first, **{key: value for key, value in second.items() if value is not None and value != ""}}
+
+
+def merge_sets(operations: list[dict[str, Any]], report: Counter) -> list[dict[str, Any]]:
+    # target -> (command, index) of the last set-* on it, while nothing else has touched it since.
+    open_sets: dict[str, tuple[str, int]] = {}
+    removed: set[int] = set()
+    for idx, op in enumerate(operations):
+        command = op["command"]
+        target = op["args"].get("id")
+        mergeable = command in MERGE_COMMANDS and isinstance(target, str) and not set(op) - MERGE_OP_KEYS
+        for value in op["args"].values():
+            if isinstance(value, str) and value in open_sets and not (mergeable and value == target):
+                del open_sets[value]
+        if not mergeable:
+            continue
+        last = open_sets.get(target)
+        if last and last[0] == command and bool(operations[last[1]].get("ignore_error")) == bool(op.get("ignore_error")):
+            op["args"] = merge_set_args(command, operations[last[1]]["args"], op["args"])
+            op["refs"] = ref_keys(op["args"])
+            removed.add(last[1])
+            report["sets"] += 1
+        open_sets[target] = (command, idx)
+    return [op for idx, op in enumerate(operations) if idx not in removed]
+
+
+def optimize_tree(op: dict[str, Any], uses: Counter, pinned: set[str], report: Counter) -> None:
+    nodes = op["args"]["nodes"]
+    # An op-level capture names the tree's first node, so that node keeps its identity.
+    keep_first = bool(op.get("capture"))
+    stack = [nodes]
+    while stack:
+        siblings = stack.pop()
+        for pos, spec in enumerate(siblings):
+            while not (keep_first and siblings is nodes and pos == 0):
+                kids = spec.get("children") or []
+                capture = spec.get("capture")
+                if (
+                    spec.get("command") != "create-frame"
+                    or len(kids) != 1
+                    or kids[0].get("command") != "create-frame"
+                    or set(spec) - {"command", "args", "capture", "children"}
+                    or (capture and uses[capture])
+                    or not covers_wrapper(spec.get("args") or {}, kids[0].get("args") or {})
+                ):
+                    break
+                if capture in pinned:
+                    report["pinned"] += 1
+                    break
+                spec = {**kids[0], "args": collapsed_child(spec.get("args") or {}, kids[0].get("args") or {})}
+                siblings[pos] = spec
+                report["wrappers"] += 1
+            if spec.get("children"):
+                stack.append(spec["children"])
+
+
+def tree_node_count(operations: list[dict[str, Any]]) -> int:
+    total = 0
+    for op in operations:
+        if is_tree(op):
+            stack = list(op["args"]["nodes"])
+            while stack:
+                spec = stack.pop()
+                total += 1
+                stack.extend(spec.get("children") or [])
+    return total
+
+
+def copy_operations(operations: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    # The passes rewrite operations in place. A JSON round trip copies flat operations far faster
+    # than deepcopy; tree specs nest as deep as their document, so they are copied with a stack.
+    flat = iter(json.loads(json.dumps([op for op in operations if not is_tree(op)], ensure_ascii=False)))
+    copied: list[dict[str, Any]] = []
+    for op in operations:
+        if not is_tree(op):
+            copied.append(next(flat))
+            continue
+        nodes: list[dict[str, Any]] = []
+        stack = [(op["args"]["nodes"], nodes)]
+        while stack:
+            source, target = stack.pop()
+            for spec in source:
+                item = {key: value for key, value in spec.items() if key != "children"}
+                item["args"] = dict(spec.get("args") or {})
+                target.append(item)
+                if spec.get("children"):
+                    item["children"] = []
+                    stack.append((spec["children"], item["children"]))
+        copied.append({**op, "args": {**op["args"], "nodes": nodes}})
+    return copied
+
+
+def optimize_plan(plan: dict[str, Any]) -> tuple[dict[str, Any], dict[str, int]]:
+    converted = convert_plan_to_v2(plan)
+    meta = converted["meta"]
+    operations = copy_operations(converted["operations"])
+    pinned = pinned_captures(meta)
+    report: Counter = Counter()
+    before = len(operations)
+    nodes_before = tree_node_count(operations)
+
+    operations = collapse_wrappers(operations, pinned, report)
+    uses, _ = count_uses(operations)
+    for op in operations:
+        if is_tree(op):
+            optimize_tree(op, uses, pinned, report)
+    operations = merge_sets(operations, report)
+
+    summary = {
+        "operations_before": before,
+        "operations_after": len(operations),
+        "wrappers_collapsed": report["wrappers"],
+        "sets_merged": report["sets"],
+        "tree_nodes_before": nodes_before,
+        "tree_nodes_after": tree_node_count(operations),
+        "kept_for_manifest": report["pinned"],
+    }
+    meta["optimizer"] = summary
+    return {"meta": meta, "operations": operations}, summary
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Remove redundant frames and operations from a bridge plan.")
+    parser.add_argument("--plan", required=True, help="Path to plan JSON (v1 or v2)")
+    parser.add_argument("--output", default="", help="Output path (defaults to <plan>_opt.json next to the input)")
+    parser.add_argument("--temp-root", default="", help="Temp root directory. Defaults to system temp/auto-figma")
+    args = parser.parse_args()
+
+    temp_root = Path(args.temp_root).resolve() if args.temp_root else default_temp_root().resolve()
+    plan_path = Path(args.plan).resolve()
+    if not plan_path.exists():
+        raise SystemExit(f"Plan not found: {plan_path}")
+    stem = Path(plan_path.name[:-3] if plan_path.name.endswith(".gz") else plan_path.name).stem
+    output_path = Path(args.output).resolve() if args.output else plan_path.with_name(f"{stem}_opt.json")
+    if not is_within(output_path, temp_root):
+        raise SystemExit(f"Output path must be under temp root: {temp_root}")
+
+    try:
+        plan = load_plan(plan_path)
+    except (OSError, ValueError) as exc:
+        raise SystemExit(f"Unreadable plan: {exc}")
+    if not isinstance(plan, dict) or not isinstance(plan.get("operations"), list):
+        raise SystemExit("Invalid plan: operations must be list")
+    if not all(isinstance(op, dict) and ("command" in op or isinstance(op.get("run"), list)) for op in plan["operations"]):
+        raise SystemExit("Invalid plan: every operation needs command or run")
+    try:
+        optimized, summary = optimize_plan(plan)
+    except RuntimeError as exc:
+        raise SystemExit(str(exc))
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(optimized, ensure_ascii=False, indent=2), encoding="utf-8")
+    removed = summary["operations_before"] - summary["operations_after"]
+    print(f"Optimized plan: {output_path}")
+    print(f"Operations: {summary['operations_before']} -> {summary['operations_after']} (-{removed})")
+    print(
+        f"Removed: {summary['wrappers_collapsed']} wrapper frames, {summary['sets_merged']} merged set-* operations"
+    )
+    if summary["tree_nodes_before"]:
+        print(f"Tree nodes: {summary['tree_nodes_before']} -> {summary['tree_nodes_after']}")
+    if summary["kept_for_manifest"]:
+        print(f"Kept {summary['kept_for_manifest']} frames referenced by the incremental manifest")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Content-addressed cache of generated plans under the temp root."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+CACHE_DIR_NAME = "plan_cache"
+ENTRY_SUFFIX = ".plan.json"
+STATS_NAME = "stats.json"
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(generator: Path, source: Path, params: dict[str, Any]) -> str:
+    # The generator's own source stands in for its version, so any code change invalidates old entries.
+    # The operation builders it imports are hashed too, since they shape every plan.
+    payload = {
+        "generator": generator.name,
+        "generator_sha256": file_digest(generator),
+        "plan_ops_sha256": file_digest(Path(__file__).with_name("plan_ops.py")),
+        "source_sha256": file_digest(source),
+        "params": params,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def render_plan_json(meta: dict[str, Any], operations_json: str) -> str:
+    # Same bytes as json.dumps({"meta": ..., "operations": ...}, indent=2), but the operations
+    # array is spliced in from text rendered once, since the indenting encoder is pure Python.
+    head = json.dumps({"meta": meta}, ensure_ascii=False, indent=2)
+    return head[:-2] + ',\n  "operations": ' + operations_json.replace("\n", "\n  ") + "\n}"
+
+
+def load_cached_plan(cache_dir: Path, key: str) -> dict[str, Any] | None:
+    path = cache_dir / f"{key}{ENTRY_SUFFIX}"
+    try:
+        entry = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+    if not isinstance(entry, dict) or not isinstance(entry.get("meta"), dict):
+        return None
+    if not isinstance(entry.get("operations_json"), str):
+        return None
+    try:
+        # mtime is the LRU clock.
+        os.utime(path)
+    except OSError:
+        pass
+    return entry
+
+
+def store_cached_plan(cache_dir: Path, key: str, entry: dict[str, Any], max_bytes: int) -> int:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / f"{key}{ENTRY_SUFFIX}"
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(entry, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp_path, path)
+    return evict_entries(cache_dir, max_bytes, keep=path)
+
+
+def evict_entries(cache_dir: Path, max_bytes: int, keep: Path | None = None) -> int:
+    entries = []
+    for path in cache_dir.glob(f"*{ENTRY_SUFFIX}"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for _, size, path in sorted(entries, key=lambda item: item[0]):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        path.unlink(missing_ok=True)
+        total -= size
+        evicted += 1
+    return evicted
+
+
+def record_cache_stats(cache_dir: Path, hit: bool, evicted: int = 0) -> dict[str, int]:
+    path = cache_dir / STATS_NAME
+    try:
+        stats = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        stats = {}
+    stats = {name: int(stats.get(name, 0)) for name in ("hits", "misses", "evicted")}
+    stats["hits" if hit else "misses"] += 1
+    stats["evicted"] += evicted
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(stats), encoding="utf-8")
+    return stats
+
+
+def format_cache_report(hit: bool, key: str, stats: dict[str, int], evicted: int = 0) -> str:
+    line = (
+        f"Plan cache: {'hit' if hit else 'miss'} {key[:12]} "
+        f"(hits {stats['hits']}, misses {stats['misses']}, evicted {stats['evicted']})"
+    )
+    if evicted:
+        line += f"; evicted {evicted} entries this run"
+    return line
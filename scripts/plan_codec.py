@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""Compact plan encoding (shared string table, positional operations) and gzip plan files."""
+
+from __future__ import annotations
+
+import gzip
+import json
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, TextIO
+
+COMPACT_FORMAT = "figma-plan-compact"
+COMPACT_VERSION = 1
+GZIP_MAGIC = b"\x1f\x8b"
+GZIP_LEVEL = 6
+
+# Value kinds in a shape: string, number, list of strings, list of nested encoded objects
+# (tree nodes, component children), anything else verbatim. A string that occurs more than
+# once is stored as its index in the string table; unique ones (captures, names) stay inline,
+# which is smaller and compresses better than an index per string.
+KIND_STRING = "s"
+KIND_NUMBER = "n"
+KIND_STRINGS = "S"
+KIND_OBJECTS = "O"
+KIND_RAW = "j"
+
+
+class CompactEncoder:
+    """Operations become [shape, value, ...]: a shape lists the (key, kind) fields of every
+    operation with the same layout once, and `args` fields are flattened into it."""
+
+    def __init__(self, repeated: set[str]) -> None:
+        self.repeated = repeated
+        self.strings: dict[str, int] = {}
+        self.shapes: dict[tuple, int] = {}
+        # Nested objects (tree nodes nest as deep as their document) are encoded from this stack
+        # by encode_all rather than by recursion: (source objects, encoded list to fill).
+        self.pending: list[tuple[list[dict[str, Any]], list[Any]]] = []
+
+    def intern(self, value: str) -> int | str:
+        if value not in self.repeated:
+            return value
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.strings)
+        return index
+
+    def encode_value(self, value: Any) -> tuple[str, Any]:
+        if isinstance(value, str):
+            return KIND_STRING, self.intern(value)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return KIND_NUMBER, value
+        if isinstance(value, list) and value:
+            if all(isinstance(item, str) for item in value):
+                return KIND_STRINGS, [self.intern(item) for item in value]
+            if all(isinstance(item, dict) for item in value):
+                encoded: list[Any] = []
+                self.pending.append((value, encoded))
+                return KIND_OBJECTS, encoded
+        return KIND_RAW, value
+
+    def encode_object(self, obj: dict[str, Any]) -> list[Any]:
+        fields: list[tuple[str, ...]] = []
+        values: list[Any] = [0]
+        for key, value in obj.items():
+            if key == "args" and isinstance(value, dict) and value:
+                for arg, arg_value in value.items():
+                    kind, encoded = self.encode_value(arg_value)
+                    fields.append((key, arg, kind))
+                    values.append(encoded)
+                continue
+            kind, encoded = self.encode_value(value)
+            fields.append((key, kind))
+            values.append(encoded)
+        shape = tuple(fields)
+        index = self.shapes.get(shape)
+        if index is None:
+            index = self.shapes[shape] = len(self.shapes)
+        values[0] = index
+        return values
+
+    def encode_all(self, objects: list[dict[str, Any]]) -> list[list[Any]]:
+        encoded: list[list[Any]] = []
+        self.pending.append((objects, encoded))
+        while self.pending:
+            source, target = self.pending.pop()
+            target.extend(self.encode_object(item) for item in source)
+        return encoded
+
+
+def repeated_strings(operations: list[dict[str, Any]]) -> set[str]:
+    counts: Counter = Counter()
+    # Explicit stack: tree operations nest as deep as the source document.
+    stack: list[Any] = [operations]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            counts[value] += 1
+        elif isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+    return {value for value, count in counts.items() if count > 1}
+
+
+def encode_compact_plan(meta: dict[str, Any], operations: list[dict[str, Any]]) -> str:
+    encoder = CompactEncoder(repeated_strings(operations))
+    encoded = encoder.encode_all(operations)
+    payload = {
+        "format": COMPACT_FORMAT,
+        "version": COMPACT_VERSION,
+        "meta": meta,
+        "strings": list(encoder.strings),
+        "shapes": [list(shape) for shape in encoder.shapes],
+        "operations": encoded,
+    }
+    # One operation per line keeps the file diffable without paying for indentation.
+    head = json.dumps({key: value for key, value in payload.items() if key != "operations"}, ensure_ascii=False, separators=(",", ":"))
+    lines = ",\n".join(json.dumps(item, ensure_ascii=False, separators=(",", ":")) for item in encoded)
+    return head[:-1] + ',"operations":[\n' + lines + "\n]}"
+
+
+def is_compact_plan(plan: Any) -> bool:
+    return isinstance(plan, dict) and plan.get("format") == COMPACT_FORMAT
+
+
+def shape_decoder(shape: Any) -> Callable[[list[Any], list[str], list], dict[str, Any]]:
+    # Positions are resolved once per shape: each operation then only swaps table indexes for
+    # strings and zips the flattened `args` back into a dict. Nested objects are queued on
+    # `pending` instead of decoded recursively.
+    if not isinstance(shape, list):
+        raise ValueError(f"Invalid compact plan shape: {shape!r}")
+    positions: dict[str, list[int]] = {KIND_STRING: [], KIND_STRINGS: [], KIND_OBJECTS: []}
+    # (key, arg names or None for a plain field, first position, end position)
+    segments: list[tuple[str, tuple[str, ...] | None, int, int]] = []
+    for position, entry in enumerate(shape, start=1):
+        if not isinstance(entry, list) or len(entry) not in (2, 3) or not all(isinstance(item, str) for item in entry):
+            raise ValueError(f"Invalid compact plan shape entry: {entry!r}")
+        positions.get(entry[-1], []).append(position)
+        if len(entry) == 2:
+            segments.append((entry[0], None, position, position + 1))
+        elif segments and segments[-1][1] is not None and segments[-1][0] == entry[0]:
+            key, names, first, _ = segments[-1]
+            segments[-1] = (key, (*names, entry[1]), first, position + 1)
+        else:
+            segments.append((entry[0], (entry[1],), position, position + 1))
+    string_positions = tuple(positions[KIND_STRING])
+    list_positions = tuple(positions[KIND_STRINGS])
+    object_positions = tuple(positions[KIND_OBJECTS])
+
+    def decode(values: list[Any], strings: list[str], pending: list) -> dict[str, Any]:
+        values = list(values)
+        for position in string_positions:
+            if values[position].__class__ is not str:
+                values[position] = strings[values[position]]
+        for position in list_positions:
+            values[position] = [item if item.__class__ is str else strings[item] for item in values[position]]
+        for position in object_positions:
+            children: list[dict[str, Any]] = []
+            pending.append((values[position], children))
+            values[position] = children
+        obj: dict[str, Any] = {}
+        for key, names, first, end in segments:
+            obj[key] = values[first] if names is None else dict(zip(names, values[first:end]))
+        return obj
+
+    return decode
+
+
+def decode_compact_plan(plan: dict[str, Any]) -> dict[str, Any]:
+    if plan.get("version") != COMPACT_VERSION:
+        raise ValueError(f"Unsupported compact plan version: {plan.get('version')}")
+    strings = plan.get("strings")
+    shapes = plan.get("shapes")
+    if not isinstance(strings, list) or not isinstance(shapes, list) or not isinstance(plan.get("operations"), list):
+        raise ValueError("Compact plan needs strings, shapes and operations lists")
+    decoders = [shape_decoder(shape) for shape in shapes]
+    operations: list[dict[str, Any]] = []
+    pending: list[tuple[list[Any], list[dict[str, Any]]]] = [(plan["operations"], operations)]
+    try:
+        while pending:
+            encoded, target = pending.pop()
+            target.extend(decoders[item[0]](item, strings, pending) for item in encoded)
+    except (IndexError, KeyError, TypeError) as exc:
+        raise ValueError(f"Malformed compact plan ({type(exc).__name__}: {exc})") from None
+    return {"meta": plan.get("meta", {}), "operations": operations}
+
+
+def read_plan_text(path: Path) -> str:
+    data = path.read_bytes()
+    if data[:2] == GZIP_MAGIC:
+        data = gzip.decompress(data)
+    return data.decode("utf-8")
+
+
+def load_plan(path: Path) -> Any:
+    """Read a JSON or compact plan, gzipped or not; compact plans come back decoded."""
+    plan = json.loads(read_plan_text(path))
+    return decode_compact_plan(plan) if is_compact_plan(plan) else plan
+
+
+def open_plan_text(path: Path) -> TextIO:
+    # For streamed (JSONL) plans: gzip is recognised by its magic bytes, not the file name.
+    with path.open("rb") as handle:
+        magic = handle.read(2)
+    if magic == GZIP_MAGIC:
+        return gzip.open(path, "rt", encoding="utf-8")
+    return path.open(encoding="utf-8")
+
+
+def open_plan_output(path: Path, compress: bool) -> TextIO:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if compress:
+        return gzip.open(path, "wt", encoding="utf-8", compresslevel=GZIP_LEVEL)
+    return path.open("w", encoding="utf-8")
+
+
+def write_plan_text(path: Path, text: str, compress: bool) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if compress:
+        # mtime=0 keeps the bytes reproducible, so resume journals see the same digest.
+        path.write_bytes(gzip.compress(text.encode("utf-8"), compresslevel=GZIP_LEVEL, mtime=0))
+    else:
+        path.write_text(text, encoding="utf-8")
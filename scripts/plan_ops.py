@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Plan operation builders and font scanning shared by the generators and the applier."""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Iterable, TextIO
+
+PLACEHOLDER_RE = re.compile(r"\{\{([a-zA-Z0-9_.-]+)\}\}")
+RUN_FLAGS = {
+    "name": "--name",
+    "x": "--x",
+    "y": "--y",
+    "width": "--width",
+    "height": "--height",
+    "text": "--text",
+    "fontSize": "--font-size",
+    "fill": "--fill",
+    "layoutMode": "--layout",
+    "itemSpacing": "--gap",
+    "padding": "--padding",
+    "parentId": "--parent",
+}
+RUN_HEADS = {"create-frame": ["create", "frame"], "create-text": ["create", "text"]}
+DEFAULT_FONT = ("Inter", "Regular")
+
+
+def render_run(command: str, args: dict) -> list[str]:
+    if command == "create-page":
+        return ["create", "page", args["name"], "--json"]
+    if command == "set-current-page":
+        return ["page", "set", args["idOrName"]]
+    if command == "set-text":
+        return ["set", "text", args["id"], args["text"]]
+    if command == "set-fill":
+        return ["set", "fill", args["id"], args["color"]]
+    if command == "set-geometry":
+        return ["set", "geometry", args["id"]] + [
+            token for key in ("x", "y", "width", "height") for token in (RUN_FLAGS[key], str(args[key]))
+        ]
+    if command == "delete-node":
+        return ["delete", "node", args["id"]]
+    tokens = list(RUN_HEADS[command])
+    for key, value in args.items():
+        tokens += [RUN_FLAGS[key], str(value)]
+    return tokens + ["--json"]
+
+
+def make_operation(plan_version: int, name: str, command: str, args: dict, capture: str = "") -> dict:
+    if plan_version >= 2:
+        op: dict = {"name": name, "command": command, "args": args}
+        refs = [key for key, value in args.items() if isinstance(value, str) and PLACEHOLDER_RE.search(value)]
+        if refs:
+            op["refs"] = refs
+    else:
+        op = {"name": name, "run": render_run(command, args)}
+    if capture:
+        op["capture"] = capture
+    return op
+
+
+def plan_fonts(operations: Iterable[dict[str, Any]]) -> list[dict[str, str]]:
+    # Text created without a font gets the plugin default, and set-text keeps the node's font.
+    # A v1 op is read from its run head only, so a caller holding font flags maps it to v2 first.
+    fonts: set[tuple[str, str]] = set()
+    pending = list(operations)
+    while pending:
+        op = pending.pop()
+        command = op.get("command") or "-".join(op["run"][:2])
+        args = op.get("args") or {}
+        if command == "create-tree":
+            pending.extend(args["nodes"])
+        elif command == "create-component":
+            pending.extend(args.get("children") or [])
+        pending.extend(op.get("children") or [])
+        if command == "create-text":
+            fonts.add((args.get("fontFamily") or DEFAULT_FONT[0], args.get("fontStyle") or DEFAULT_FONT[1]))
+        elif command == "set-text":
+            fonts.add(DEFAULT_FONT)
+    return [{"family": family, "style": style} for family, style in sorted(fonts)]
+
+
+def write_jsonl_plan(stream: TextIO, meta: dict, operations: Iterable[dict]) -> int:
+    # Meta goes first so a consumer can start applying before the last operation is generated.
+    stream.write(json.dumps({"meta": meta}, ensure_ascii=False) + "\n")
+    count = 0
+    for op in operations:
+        stream.write(json.dumps(op, ensure_ascii=False) + "\n")
+        count += 1
+        if count == 1 or count % 64 == 0:
+            stream.flush()
+    stream.flush()
+    return count
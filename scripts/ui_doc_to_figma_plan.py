@@ -4,15 +4,29 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
 import os
 import random
 import re
+import sys
 import tempfile
 from datetime import datetime
 from pathlib import Path
 from typing import Iterable
 
+from plan_cache import (
+    CACHE_DIR_NAME,
+    cache_key,
+    format_cache_report,
+    load_cached_plan,
+    record_cache_stats,
+    render_plan_json,
+    store_cached_plan,
+)
+from plan_codec import encode_compact_plan, open_plan_output, write_plan_text
+from plan_ops import make_operation, plan_fonts, write_jsonl_plan
+
 DEVICE_PRESETS = {
     "ios": (390, 844),
     "android": (412, 915),
@@ -56,53 +70,181 @@ SCREEN_HINTS = {
 }
 
 AUTO_TMP_DIR_NAME = "auto-figma"
+MANIFEST_VERSION = 1
+# Any heading level closes the sections at or below it; only levels 2-4 become screens.
+SECTION_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+)$")
+BACKTICKS_RE = re.compile(r"`+")
+LINK_RE = re.compile(r"\[(.*?)\]\(.*?\)")
+MARKUP_RE = re.compile(r"[*_>#]+")
+WHITESPACE_RE = re.compile(r"\s+")
 
 
 def clean_heading(text: str) -> str:
-    text = re.sub(r"`+", "", text)
-    text = re.sub(r"\[(.*?)\]\(.*?\)", r"\1", text)
-    text = re.sub(r"[*_>#]+", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
+    text = BACKTICKS_RE.sub("", text)
+    text = LINK_RE.sub(r"\1", text)
+    text = MARKUP_RE.sub(" ", text)
+    text = WHITESPACE_RE.sub(" ", text).strip()
     return text
 
 
-def should_exclude(title: str) -> bool:
-    lower = title.lower()
-    return any(hint in lower for hint in EXCLUDE_HINTS)
-
-
-def has_screen_signal(title: str) -> bool:
-    lower = title.lower()
-    return any(hint in lower for hint in SCREEN_HINTS)
-
-
-def extract_headings(markdown: str) -> list[str]:
+class HintMatcher:
+    """Aho-Corasick automaton over lowercased hints: one pass over a text reports which hint
+    groups occur in it, however many hints there are. Works per code point, so CJK hints match
+    inside unsegmented text."""
+
+    def __init__(self, groups: Iterable[Iterable[str]]) -> None:
+        self.goto: list[dict[str, int]] = [{}]
+        self.output = [0]
+        self.alphabet: set[str] = set()
+        self.all_groups = 0
+        for bit, hints in enumerate(groups):
+            self.all_groups |= 1 << bit
+            for hint in hints:
+                state = 0
+                for char in hint.lower():
+                    self.alphabet.add(char)
+                    following = self.goto[state].get(char)
+                    if following is None:
+                        following = self.goto[state][char] = len(self.goto)
+                        self.goto.append({})
+                        self.output.append(0)
+                    state = following
+                if state:
+                    self.output[state] |= 1 << bit
+        # Breadth-first, so a state's failure link is final before its children need it.
+        self.fail = [0] * len(self.goto)
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, following in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[following] = self.goto[fallback].get(char, 0)
+                self.output[following] |= self.output[self.fail[following]]
+                queue.append(following)
+
+    def classify(self, lower: str) -> int:
+        """Bitmask of the groups with a hint in `lower` (already lowercased)."""
+        goto, fail, output, done, alphabet = self.goto, self.fail, self.output, self.all_groups, self.alphabet
+        state = 0
+        found = 0
+        for char in lower:
+            if char not in alphabet:
+                # No hint continues through this character: back to the root without walking failure links.
+                state = 0
+                continue
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+                if found == done:
+                    break
+        return found
+
+
+EXCLUDE_GROUP = 1
+SCREEN_GROUP = 2
+DEFAULT_HINT_MATCHER = HintMatcher([EXCLUDE_HINTS, SCREEN_HINTS])
+
+
+def load_hint_matcher(path: Path) -> tuple[HintMatcher, dict[str, list[str]]]:
+    """Hint lists from a JSON file ({"exclude": [...], "screen": [...]}); a missing key keeps the built-in list."""
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as exc:
+        raise SystemExit(f"Unreadable hints file {path}: {exc}")
+    if not isinstance(data, dict):
+        raise SystemExit(f"Hints file must hold a JSON object: {path}")
+    hints = {"exclude": sorted(EXCLUDE_HINTS), "screen": sorted(SCREEN_HINTS)}
+    for key in hints:
+        if key not in data:
+            continue
+        values = data[key]
+        if not isinstance(values, list) or not all(isinstance(item, str) for item in values):
+            raise SystemExit(f"Hints file '{key}' must be a list of strings: {path}")
+        hints[key] = sorted({item.strip().lower() for item in values if item.strip()})
+    return HintMatcher([hints["exclude"], hints["screen"]]), hints
+
+
+class SectionHash:
+    """Running hash of a heading's section; blank lines at either end are left out."""
+
+    __slots__ = ("level", "key", "digest", "started", "blank_lines")
+
+    def __init__(self, level: int, key: str) -> None:
+        self.level = level
+        self.key = key
+        self.digest = hashlib.sha1()
+        self.started = False
+        self.blank_lines = 0
+
+    def add(self, line: str) -> None:
+        if not line:
+            self.blank_lines += self.started
+            return
+        if self.started:
+            line = "\n" * (self.blank_lines + 1) + line
+        self.digest.update(line.encode("utf-8"))
+        self.started = True
+        self.blank_lines = 0
+
+
+def scan_document(
+    lines: Iterable[str],
+    matcher: HintMatcher | None = None,
+    with_sections: bool = False,
+) -> tuple[list[str], dict[str, str]]:
+    """One pass over the markdown lines: screen heading candidates, and with `with_sections` the
+    hash of each heading's section (its body and nested subsections) keyed by lowercased title."""
+    matcher = matcher or DEFAULT_HINT_MATCHER
     collected: list[str] = []
     fallback: list[str] = []
-
-    for line in markdown.splitlines():
-        match = re.match(r"^(#{2,4})\s+(.+)$", line)
-        if not match:
+    seen_collected: set[str] = set()
+    seen_fallback: set[str] = set()
+    hashes: dict[str, str] = {}
+    open_sections: list[SectionHash] = []
+
+    for line in lines:
+        line = line.rstrip()
+        # Most lines are body text; skip the regex unless the line can be a heading.
+        match = SECTION_HEADING_RE.match(line) if line[:1] == "#" else None
+        if match is None:
+            for section in open_sections:
+                section.add(line)
+            continue
+        level = len(match.group(1))
+        while open_sections and open_sections[-1].level >= level:
+            closed = open_sections.pop()
+            hashes.setdefault(closed.key, closed.digest.hexdigest())
+        for section in open_sections:
+            section.add(line)
+        if not 2 <= level <= 4:
             continue
         title = clean_heading(match.group(2))
-        if not title or should_exclude(title):
+        if not title:
             continue
-        fallback.append(title)
-        if has_screen_signal(title):
+        key = title.lower()
+        if with_sections:
+            open_sections.append(SectionHash(level, key))
+        groups = matcher.classify(key)
+        if groups & EXCLUDE_GROUP:
+            continue
+        if key not in seen_fallback:
+            seen_fallback.add(key)
+            fallback.append(title)
+        if groups & SCREEN_GROUP and key not in seen_collected:
+            seen_collected.add(key)
             collected.append(title)
 
-    if not collected:
-        collected = fallback
+    while open_sections:
+        closed = open_sections.pop()
+        hashes.setdefault(closed.key, closed.digest.hexdigest())
+    return collected or fallback, hashes
 
-    unique: list[str] = []
-    seen = set()
-    for title in collected:
-        key = title.lower()
-        if key in seen:
-            continue
-        seen.add(key)
-        unique.append(title)
-    return unique
+
+def extract_headings(markdown: str, matcher: HintMatcher | None = None) -> list[str]:
+    return scan_document(markdown.splitlines(), matcher)[0]
 
 
 def trim_screens(screens: Iterable[str], max_screens: int) -> list[str]:
@@ -123,10 +265,14 @@ def filter_incremental_screens(screen_names: list[str], changed: list[str]) -> l
     if not changed:
         return screen_names
     changed_lower = [item.lower() for item in changed]
+    # A screen matches when a changed heading occurs in it (automaton) or it occurs in a changed
+    # heading (one substring search over the joined headings; cleaned headings hold no newline).
+    contained = HintMatcher([changed_lower])
+    joined = "\n".join(changed_lower)
     result: list[str] = []
     for screen in screen_names:
         lower = screen.lower()
-        if any(token in lower or lower in token for token in changed_lower):
+        if contained.classify(lower) or lower in joined:
             result.append(screen)
     return result
 
@@ -167,85 +313,160 @@ def frame_alias(index: int) -> str:
     return f"screen_{index:02d}"
 
 
+def screen_operations(plan_version: int, idx: int, screen_name: str, x: int, frame_width: int, frame_height: int) -> list[dict]:
+    alias = frame_alias(idx)
+    frame_name = f"S{idx:02d}-{screen_name}"
+    return [
+        make_operation(
+            plan_version,
+            f"create-frame-{idx:02d}",
+            "create-frame",
+            {
+                "name": frame_name,
+                "x": x,
+                "y": 0,
+                "width": frame_width,
+                "height": frame_height,
+                "fill": "#FFFFFF",
+                "layoutMode": "VERTICAL",
+                "itemSpacing": 16,
+                "padding": 24,
+            },
+            alias,
+        ),
+        make_operation(
+            plan_version,
+            f"create-title-{idx:02d}",
+            "create-text",
+            {
+                "name": "ScreenTitle",
+                "x": 24,
+                "y": 24,
+                "text": frame_name,
+                "fontSize": 24,
+                "fill": "#111111",
+                "parentId": f"{{{{{alias}}}}}",
+            },
+            f"{alias}_title",
+        ),
+    ]
+
+
 def build_operations(
     screen_names: list[str],
     page_name: str,
     frame_width: int,
     frame_height: int,
     x_gap: int,
+    plan_version: int = 1,
+    tree: bool = False,
 ) -> list[dict]:
     ops: list[dict] = []
-    ops.append(
-        {
-            "name": "create-page",
-            "run": ["create", "page", page_name, "--json"],
-            "capture": "page_id",
-        }
-    )
-    ops.append({"name": "set-page", "run": ["page", "set", page_name]})
+    ops.append(make_operation(plan_version, "create-page", "create-page", {"name": page_name}, "page_id"))
+    ops.append(make_operation(plan_version, "set-page", "set-current-page", {"idOrName": page_name}))
 
     cursor_x = 0
     for idx, screen_name in enumerate(screen_names, start=1):
-        alias = frame_alias(idx)
-        frame_name = f"S{idx:02d}-{screen_name}"
-        ops.append(
-            {
-                "name": f"create-frame-{idx:02d}",
-                "run": [
-                    "create",
-                    "frame",
-                    "--name",
-                    frame_name,
-                    "--x",
-                    str(cursor_x),
-                    "--y",
-                    "0",
-                    "--width",
-                    str(frame_width),
-                    "--height",
-                    str(frame_height),
-                    "--fill",
-                    "#FFFFFF",
-                    "--layout",
-                    "VERTICAL",
-                    "--gap",
-                    "16",
-                    "--padding",
-                    "24",
-                    "--json",
-                ],
-                "capture": alias,
-            }
-        )
-        ops.append(
-            {
-                "name": f"create-title-{idx:02d}",
-                "run": [
-                    "create",
-                    "text",
-                    "--name",
-                    "ScreenTitle",
-                    "--x",
-                    "24",
-                    "--y",
-                    "24",
-                    "--text",
-                    frame_name,
-                    "--font-size",
-                    "24",
-                    "--fill",
-                    "#111111",
-                    "--parent",
-                    f"{{{{{alias}}}}}",
-                    "--json",
-                ],
-                "capture": f"{alias}_title",
-            }
-        )
+        ops.extend(screen_operations(plan_version, idx, screen_name, cursor_x, frame_width, frame_height))
         cursor_x += frame_width + x_gap
+    if tree:
+        # Each screen frame nests its title, and all screens go to the plugin as one create-tree.
+        screens = []
+        for frame_op, title_op in zip(ops[2::2], ops[3::2]):
+            title = {
+                "command": "create-text",
+                "args": {key: value for key, value in title_op["args"].items() if key != "parentId"},
+                "capture": title_op["capture"],
+            }
+            screens.append(
+                {"command": "create-frame", "args": frame_op["args"], "capture": frame_op["capture"], "children": [title]}
+            )
+        return ops[:2] + [make_operation(2, "create-screens", "create-tree", {"nodes": screens})]
     return ops
 
 
+def load_manifest(manifest_path: Path, page_name: str) -> tuple[dict | None, str]:
+    if not manifest_path.exists():
+        return None, "no section manifest from a previous run"
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as exc:
+        return None, f"unreadable section manifest ({exc})"
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return None, "section manifest version mismatch"
+    if manifest.get("page_name") != page_name:
+        return None, f"section manifest is for page '{manifest.get('page_name')}'"
+    if not isinstance(manifest.get("screens"), dict) or not manifest.get("page_id"):
+        return None, "section manifest has no screen map"
+    return manifest, ""
+
+
+def build_section_operations(
+    screen_titles: list[str],
+    hashes: dict[str, str],
+    previous: dict | None,
+    page_name: str,
+    frame_width: int,
+    frame_height: int,
+    x_gap: int,
+    plan_version: int = 1,
+    tree: bool = False,
+) -> tuple[list[dict], dict, dict[str, list[str]]]:
+    # Screens are keyed by the full heading, as the section hashes are; frames show the trimmed name.
+    frame_size = {"width": frame_width, "height": frame_height}
+    screen_names = trim_screens(screen_titles, len(screen_titles))
+    screens: dict[str, dict] = {}
+    for idx, (title, screen_name) in enumerate(zip(screen_titles, screen_names), start=1):
+        screens[title.lower()] = {
+            "title": screen_name,
+            "index": idx,
+            "hash": hashes.get(title.lower(), ""),
+            "frame_id": f"{{{{{frame_alias(idx)}}}}}",
+        }
+    if previous is None:
+        operations = build_operations(screen_names, page_name, frame_width, frame_height, x_gap, plan_version, tree)
+        changes = {"added": list(screen_names), "removed": [], "modified": []}
+        return operations, {"page_id": "{{page_id}}", "frame_size": frame_size, "screens": screens}, changes
+
+    old_screens: dict[str, dict] = previous["screens"]
+    resized = previous.get("frame_size") != frame_size
+    changes = {
+        "added": [screen["title"] for key, screen in screens.items() if key not in old_screens],
+        "removed": [screen.get("title", key) for key, screen in old_screens.items() if key not in screens],
+        "modified": [],
+    }
+    operations = [make_operation(plan_version, "set-page", "set-current-page", {"idOrName": previous["page_id"]})]
+    # A screen that moved (sections added or removed before it) is renamed and repositioned, so it is rebuilt too.
+    stale = [key for key in old_screens if key not in screens]
+    for key, screen in screens.items():
+        old = old_screens.get(key)
+        if old is None:
+            continue
+        if resized or old.get("hash") != screen["hash"] or old.get("index") != screen["index"]:
+            changes["modified"].append(screen["title"])
+            stale.append(key)
+        else:
+            screen["frame_id"] = old["frame_id"]
+    for number, key in enumerate(stale, start=1):
+        op = make_operation(plan_version, f"delete-screen-{number:02d}", "delete-node", {"id": old_screens[key]["frame_id"]})
+        # Already removed by hand in Figma is fine; the frame is gone either way.
+        op["ignore_error"] = True
+        operations.append(op)
+    for key, screen in screens.items():
+        if screen["frame_id"].startswith("{{"):
+            x = (screen["index"] - 1) * (frame_width + x_gap)
+            operations.extend(
+                screen_operations(plan_version, screen["index"], screen["title"], x, frame_width, frame_height)
+            )
+    manifest = {
+        "page_id": previous["page_id"],
+        "frame_size": frame_size,
+        "file_key": previous.get("file_key", ""),
+        "screens": screens,
+    }
+    return operations, manifest, changes
+
+
 def build_plan(
     source_doc: Path,
     project_name: str,
@@ -258,8 +479,12 @@ def build_plan(
     frame_width: int,
     frame_height: int,
     x_gap: int,
+    plan_version: int = 1,
+    tree: bool = False,
+    operations: list[dict] | None = None,
 ) -> dict:
-    operations = build_operations(screen_names, page_name, frame_width, frame_height, x_gap)
+    if operations is None:
+        operations = build_operations(screen_names, page_name, frame_width, frame_height, x_gap, plan_version, tree)
     return {
         "meta": {
             "generator": "ui_doc_to_figma_plan.py",
@@ -272,6 +497,8 @@ def build_plan(
             "page_name": page_name,
             "screen_count": len(screen_names),
             "frame_size": {"width": frame_width, "height": frame_height},
+            "plan_version": plan_version,
+            "fonts": plan_fonts(operations),
         },
         "operations": operations,
     }
@@ -280,7 +507,11 @@ def build_plan(
 def main() -> int:
     parser = argparse.ArgumentParser(description="Generate bridge JSON plan from a UI markdown doc.")
     parser.add_argument("--input", required=True, help="Path to UI markdown document")
-    parser.add_argument("--output", default="", help="Output JSON plan path (must be under temp root)")
+    parser.add_argument(
+        "--output",
+        default="",
+        help="Output plan path (must be under temp root), or - to write the plan to stdout",
+    )
     parser.add_argument(
         "--device",
         default="ios",
@@ -296,6 +527,11 @@ def main() -> int:
     )
     parser.add_argument("--page-name", default="", help="Target Figma page name")
     parser.add_argument("--max-screens", type=int, default=12, help="Max number of screens to generate")
+    parser.add_argument(
+        "--hints-file",
+        default="",
+        help='JSON {"exclude": [...], "screen": [...]} replacing the built-in heading hint lists',
+    )
     parser.add_argument("--x-gap", type=int, default=120, help="Horizontal gap between generated frames")
     parser.add_argument(
         "--changed-headings",
@@ -307,28 +543,64 @@ def main() -> int:
         action="store_true",
         help="Allow full-screen regeneration (initial build or global refactor)",
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Detect changed screens by diffing section hashes against the last applied section manifest",
+    )
+    parser.add_argument(
+        "--manifest",
+        default="",
+        help="Section manifest path (defaults to <temp-root>/manifests/<project>_ui_doc.json)",
+    )
+    parser.add_argument(
+        "--plan-version",
+        type=int,
+        default=1,
+        choices=[1, 2],
+        help="1 emits run tokens; 2 emits typed {command, args, refs, capture} operations",
+    )
+    parser.add_argument(
+        "--tree",
+        action="store_true",
+        help="Emit all screens as one create-tree operation (needs --plan-version 2)",
+    )
+    parser.add_argument(
+        "--format",
+        default="json",
+        choices=["json", "jsonl", "compact"],
+        help="jsonl writes the meta line followed by one operation per line; "
+        "compact writes unindented positional operations over a shared string table",
+    )
+    parser.add_argument("--gzip", action="store_true", help="gzip the plan file (the applier detects it from the content)")
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse the plan from <temp-root>/plan_cache when the doc and layout args are unchanged",
+    )
+    parser.add_argument("--cache-max-mb", type=int, default=256, help="Plan cache size bound; least recently used entries are evicted")
     args = parser.parse_args()
+    if args.tree and args.plan_version < 2:
+        raise SystemExit("--tree needs --plan-version 2")
 
     input_path = Path(args.input).resolve()
     if not input_path.exists():
         raise SystemExit(f"Input not found: {input_path}")
 
-    markdown = input_path.read_text(encoding="utf-8")
-    heading_candidates = extract_headings(markdown)
     changed = parse_changed_headings(args.changed_headings)
+    matcher, hints = DEFAULT_HINT_MATCHER, None
+    if args.hints_file:
+        matcher, hints = load_hint_matcher(Path(args.hints_file).resolve())
     mode = "full-refresh" if args.full_refresh else "incremental"
 
-    if not args.full_refresh and not changed:
+    if args.incremental and (args.full_refresh or changed):
+        raise SystemExit("--incremental detects changed headings itself; drop --changed-headings/--full-refresh")
+    if not args.full_refresh and not changed and not args.incremental:
         raise SystemExit(
-            "Incremental mode requires --changed-headings. "
+            "Incremental mode requires --changed-headings or --incremental. "
             "Use --full-refresh only for initial build or global refactor."
         )
 
-    screen_pool = heading_candidates if args.full_refresh else filter_incremental_screens(heading_candidates, changed)
-    if not screen_pool:
-        raise SystemExit("No matching screens found for incremental update. Check --changed-headings.")
-    screen_names = trim_screens(screen_pool, args.max_screens)
-
     frame_width, frame_height = DEVICE_PRESETS[args.device]
     project_name = args.project_name.strip() or input_path.parent.name or input_path.stem
     project_slug = slugify_project_name(project_name)
@@ -338,40 +610,173 @@ def main() -> int:
     temp_root = Path(args.temp_root).resolve() if args.temp_root else default_temp_root().resolve()
     temp_root.mkdir(parents=True, exist_ok=True)
 
-    if args.output:
+    to_stdout = args.output == "-"
+    if to_stdout and args.gzip:
+        raise SystemExit("--gzip needs a plan file; it cannot be combined with --output -")
+    suffix = ("jsonl" if args.format == "jsonl" else "json") + (".gz" if args.gzip else "")
+    if to_stdout:
+        output_path = None
+    elif args.output:
         output_path = Path(args.output).resolve()
     else:
-        output_path = temp_root / f"{project_slug}_{task_id}_plan.json"
+        output_path = temp_root / f"{project_slug}_{task_id}_plan.{suffix}"
 
-    if not is_within(output_path, temp_root):
+    if output_path and not is_within(output_path, temp_root):
         raise SystemExit(f"Output path must be under temp root: {temp_root}")
 
-    plan = build_plan(
-        input_path,
-        project_name,
-        project_slug,
-        task_id,
-        mode,
-        changed,
-        page_name,
-        screen_names,
-        frame_width,
-        frame_height,
-        args.x_gap,
-    )
-
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text(json.dumps(plan, ensure_ascii=False, indent=2), encoding="utf-8")
-
-    print(f"Generated plan: {output_path}")
-    print(f"Temp root: {temp_root}")
-    print(f"Project: {project_name} ({project_slug})")
-    print(f"Task ID: {task_id}")
-    print(f"Mode: {mode}")
-    print(f"Page name: {page_name}")
-    print(f"Screens: {len(screen_names)}")
+    cache_dir = temp_root / CACHE_DIR_NAME
+    key = ""
+    cached = None
+    cache_report = ""
+    incremental_note = ""
+    section_changes: dict[str, list[str]] = {}
+    if args.cache and args.incremental:
+        cache_report = "Plan cache: skipped (--incremental depends on the manifest, not only the doc)"
+    elif args.cache:
+        key = cache_key(
+            Path(__file__).resolve(),
+            input_path,
+            {
+                "project_name": project_name,
+                "page_name": page_name,
+                "device": args.device,
+                "max_screens": args.max_screens,
+                "x_gap": args.x_gap,
+                "changed_headings": changed,
+                "full_refresh": args.full_refresh,
+                "plan_version": args.plan_version,
+                "tree": args.tree,
+                "hints": hints,
+            },
+        )
+        cached = load_cached_plan(cache_dir, key)
+
+    operations_json = ""
+    if cached:
+        plan = {"meta": cached["meta"], "operations": json.loads(cached["operations_json"])}
+        plan["meta"]["task_id"] = task_id
+        plan["meta"]["source_doc"] = str(input_path)
+        operations_json = cached["operations_json"]
+        screen_names = list(cached.get("screens", []))
+        stats = record_cache_stats(cache_dir, hit=True)
+        cache_report = format_cache_report(True, key, stats)
+    else:
+        # Streamed: large specs are scanned line by line, and section hashes come from the same pass.
+        with input_path.open(encoding="utf-8") as stream:
+            heading_candidates, hashes = scan_document(stream, matcher, args.incremental)
+        if args.incremental:
+            screen_pool = heading_candidates
+        else:
+            screen_pool = heading_candidates if args.full_refresh else filter_incremental_screens(heading_candidates, changed)
+        if not screen_pool:
+            raise SystemExit("No matching screens found for incremental update. Check --changed-headings.")
+        screen_names = trim_screens(screen_pool, args.max_screens)
+
+        operations = None
+        if args.incremental:
+            if args.manifest:
+                manifest_path = Path(args.manifest).resolve()
+            else:
+                manifest_path = temp_root / "manifests" / f"{project_slug}_ui_doc.json"
+            if not is_within(manifest_path, temp_root):
+                raise SystemExit(f"Manifest path must be under temp root: {temp_root}")
+            previous, reason = load_manifest(manifest_path, page_name)
+            operations, manifest, section_changes = build_section_operations(
+                screen_pool[: len(screen_names)],
+                hashes,
+                previous,
+                page_name,
+                frame_width,
+                frame_height,
+                args.x_gap,
+                args.plan_version,
+                args.tree,
+            )
+            mode = "incremental" if previous else "full-refresh"
+            changed = section_changes["added"] + section_changes["modified"] if previous else []
+            if previous:
+                incremental_note = f"Incremental against: {manifest_path}"
+            else:
+                incremental_note = f"Incremental fallback to full refresh: {reason}"
+
+        plan = build_plan(
+            input_path,
+            project_name,
+            project_slug,
+            task_id,
+            mode,
+            changed,
+            page_name,
+            screen_names,
+            frame_width,
+            frame_height,
+            args.x_gap,
+            args.plan_version,
+            args.tree,
+            operations,
+        )
+        if args.incremental:
+            # The applier resolves the {{capture}} IDs in this manifest and writes it after a successful apply.
+            plan["meta"]["incremental_manifest"] = {
+                "path": str(manifest_path),
+                "data": {
+                    "version": MANIFEST_VERSION,
+                    "generator": "ui_doc_to_figma_plan.py",
+                    "source_doc": str(input_path),
+                    "page_name": page_name,
+                    **manifest,
+                },
+            }
+        if key:
+            operations_json = json.dumps(plan["operations"], ensure_ascii=False, indent=2)
+            evicted = store_cached_plan(
+                cache_dir,
+                key,
+                {"meta": plan["meta"], "operations_json": operations_json, "screens": screen_names},
+                max(args.cache_max_mb, 1) * 1024 * 1024,
+            )
+            stats = record_cache_stats(cache_dir, hit=False, evicted=evicted)
+            cache_report = format_cache_report(False, key, stats, evicted)
+
+    if args.format == "jsonl":
+        if output_path is None:
+            write_jsonl_plan(sys.stdout, plan["meta"], plan["operations"])
+        else:
+            with open_plan_output(output_path, args.gzip) as stream:
+                write_jsonl_plan(stream, plan["meta"], plan["operations"])
+    else:
+        if args.format == "compact":
+            text = encode_compact_plan(plan["meta"], plan["operations"])
+        elif operations_json:
+            text = render_plan_json(plan["meta"], operations_json)
+        else:
+            text = json.dumps(plan, ensure_ascii=False, indent=2)
+        if output_path is None:
+            sys.stdout.write(text + "\n")
+        else:
+            write_plan_text(output_path, text, args.gzip)
+
+    # Keep stdout clean for the plan itself when it is being piped.
+    report = sys.stderr if to_stdout else sys.stdout
+    print(f"Generated plan: {output_path or '<stdout>'}", file=report)
+    print(f"Temp root: {temp_root}", file=report)
+    print(f"Project: {project_name} ({project_slug})", file=report)
+    print(f"Task ID: {task_id}", file=report)
+    print(f"Mode: {mode}", file=report)
+    print(f"Page name: {page_name}", file=report)
+    print(f"Screens: {len(screen_names)}", file=report)
     for idx, screen in enumerate(screen_names, start=1):
-        print(f"  {idx:02d}. {screen}")
+        print(f"  {idx:02d}. {screen}", file=report)
+    if incremental_note:
+        print(incremental_note, file=report)
+    if section_changes and mode == "incremental":
+        counts = ", ".join(f"{len(titles)} {label}" for label, titles in section_changes.items())
+        print(f"Sections: {counts}, {len(screen_names) - len(changed)} unchanged", file=report)
+        for label, titles in section_changes.items():
+            for title in titles:
+                print(f"  {label}: {title}", file=report)
+    if cache_report:
+        print(cache_report, file=report)
     return 0
 
 
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The scripts are standalone files, not a package; import them the way they import each other.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
@@ -0,0 +1,94 @@
+import json
+import sys
+
+import pytest
+
+import convert_plan_v1_to_v2
+from figma_bridge_apply_plan import convert_plan_to_v2
+
+PLAN = {
+    "meta": {"plan_version": 1, "task_id": "t1"},
+    "operations": [
+        {"name": "page", "run": ["create", "page", "Home"], "capture": "page_id"},
+        {"name": "set-page", "run": ["page", "set", "Home"]},
+        {
+            "name": "root",
+            "run": ["create", "frame", "--name", "Root", "--width", "390", "--parent", "{{page_id}}", "--padding", "8,16"],
+            "capture": "root",
+        },
+        {
+            "name": "title",
+            "run": ["create", "text", "--text", "Hi {{root}}", "--font-size", "18", "--parent", "{{root}}"],
+            "ignore_error": True,
+        },
+        {"run": ["set", "opacity", "{{root}}", "0.5"]},
+        {"run": ["set", "text", "{{title}}", "Bye"]},
+        {"run": ["set", "fill", "1:5", "#FF0000"]},
+        {"run": ["set", "geometry", "{{root}}", "--x", "10", "--height", "40"]},
+        {"run": ["set", "layout", "{{root}}", "--mode", "vertical", "--gap", "12"]},
+        {"run": ["delete", "node", "{{title}}"]},
+        {"name": "typed", "command": "delete-node", "args": {"id": "1:2"}},
+    ],
+}
+
+
+def test_converts_run_tokens_to_typed_operations():
+    assert convert_plan_to_v2(PLAN) == {
+        "meta": {"plan_version": 2, "task_id": "t1"},
+        "operations": [
+            {"name": "page", "command": "create-page", "args": {"name": "Home"}, "capture": "page_id"},
+            {"name": "set-page", "command": "set-current-page", "args": {"idOrName": "Home"}},
+            {
+                "name": "root",
+                "command": "create-frame",
+                "args": {
+                    "name": "Root",
+                    "x": 0,
+                    "y": 0,
+                    "width": 390,
+                    "height": 100,
+                    "layoutMode": "NONE",
+                    "padding": "8,16",
+                    "parentId": "{{page_id}}",
+                },
+                "refs": ["parentId"],
+                "capture": "root",
+            },
+            {
+                "name": "title",
+                "command": "create-text",
+                "args": {"name": "Text", "x": 0, "y": 0, "text": "Hi {{root}}", "fontSize": 18.0, "parentId": "{{root}}"},
+                "refs": ["text", "parentId"],
+                "ignore_error": True,
+            },
+            {"command": "set-opacity", "args": {"id": "{{root}}", "value": 0.5}, "refs": ["id"]},
+            {"command": "set-text", "args": {"id": "{{title}}", "text": "Bye"}, "refs": ["id"]},
+            {"command": "set-fill", "args": {"id": "1:5", "color": "#FF0000"}},
+            {"command": "set-geometry", "args": {"id": "{{root}}", "x": 10, "height": 40}, "refs": ["id"]},
+            {"command": "set-layout", "args": {"id": "{{root}}", "mode": "VERTICAL", "gap": 12}, "refs": ["id"]},
+            {"command": "delete-node", "args": {"id": "{{title}}"}, "refs": ["id"]},
+            {"name": "typed", "command": "delete-node", "args": {"id": "1:2"}},
+        ],
+    }
+    assert PLAN["meta"]["plan_version"] == 1
+
+
+def test_unknown_run_tokens_are_rejected():
+    with pytest.raises(RuntimeError, match="Unsupported operation"):
+        convert_plan_to_v2({"operations": [{"run": ["rotate", "node", "1:2"]}]})
+
+
+def test_placeholder_in_numeric_field_is_rejected():
+    plan = {"operations": [{"run": ["create", "frame", "--width", "{{w}}"]}]}
+    with pytest.raises(RuntimeError, match="cannot be converted"):
+        convert_plan_to_v2(plan)
+
+
+def test_cli_writes_v2_plan_next_to_input(tmp_path, monkeypatch, capsys):
+    plan_path = tmp_path / "plan.json"
+    plan_path.write_text(json.dumps(PLAN), encoding="utf-8")
+    monkeypatch.setattr(sys, "argv", ["convert", "--plan", str(plan_path), "--temp-root", str(tmp_path)])
+    assert convert_plan_v1_to_v2.main() == 0
+    written = json.loads((tmp_path / "plan_v2.json").read_text(encoding="utf-8"))
+    assert written == convert_plan_to_v2(PLAN)
+    assert "Operations: 11" in capsys.readouterr().out
@@ -0,0 +1,341 @@
+import gzip
+import http.client
+import io
+import json
+import socket
+import threading
+import time
+import urllib.request
+import zlib
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+import html_to_figma_plan as html_gen
+from bridge_standin_client import StandinPlugin, run_polling
+from figma_bridge_apply_plan import (
+    BridgeState,
+    PlanJournal,
+    build_parser,
+    execute_plan,
+    normalize_operation,
+    plan_fonts,
+    read_journal,
+    run_apply,
+    start_bridge_server,
+)
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def enqueue_from_thread(state, commands, target=""):
+    futures = []
+    thread = threading.Thread(target=lambda: futures.extend(state.enqueue(commands, target)))
+    thread.start()
+    thread.join()
+    return futures, thread.ident
+
+
+def test_abandon_purges_only_the_finished_tasks_commands():
+    state = BridgeState(batch_size=2)
+    stale, owner = enqueue_from_thread(state, [("create-frame", {}), ("create-text", {}), ("set-fill", {})])
+    routed, _ = enqueue_from_thread(state, [("create-frame", {})], target="K")
+    delivered = state.take_commands()
+    assert [item["command"] for item in delivered["batch"]] == ["create-frame", "create-text"]
+
+    assert state.abandon(owner) == 3
+    assert all(future.cancelled() for future in stale)
+    assert list(state.queue) == []
+    assert list(state.pending.values()) == routed
+    assert set(state.owners) == set(state.pending) == set(state.routes)
+
+    # A transport that dies after delivery must not bring the abandoned commands back.
+    state.requeue(delivered)
+    assert list(state.queue) == []
+    state.resolve([{"id": item["id"], "ok": True} for item in delivered["batch"]])
+    assert [item["command"] for item in state.take_commands("K")["batch"]] == ["create-frame"]
+
+
+@pytest.mark.parametrize("kind", ["threading", "asyncio"])
+def test_parked_long_poll_counts_once(kind):
+    port = free_port()
+    state = BridgeState(long_poll_sec=2.2)
+    server = start_bridge_server(state, kind, "127.0.0.1", port)
+    try:
+        # The poll sits through two heartbeat wakeups before timing out with no command.
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/next", timeout=10) as response:
+            assert response.status == 204
+        assert state.metrics.polls == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_plan_fonts_scans_v2_plans_with_refs_and_no_meta_fonts():
+    tree = html_gen.MiniHTMLTree()
+    tree.feed('<section><div><p>Card</p></div><div><p>Card</p></div><p style="font-size:20px">a</p></section>')
+    plan = html_gen.build_plan(Path("fonts.html"), tree.root, "fonts", "fonts", "t1", "HTML-fonts", 1440, 1024, 32, 16, 2)
+    generated = plan["meta"].pop("fonts")
+    operations = plan["operations"]
+    operations += html_gen.iter_operations(tree.root, "HTML-tree", 1440, 1024, 16, 2, tree=True)
+    operations += html_gen.iter_operations(tree.root, "HTML-cards", 1440, 1024, 16, 2, components=2)
+    operations += html_gen.iter_operations(tree.root, "HTML-v1", 1440, 1024, 16, 1)
+    assert {op["command"] for op in operations if "command" in op} >= {"create-text", "create-tree", "create-component"}
+    assert any(op.get("refs") for op in operations)
+    title = {"parentId": "{{node_001}}", "text": "a", "fontFamily": "Roboto", "fontStyle": "Bold"}
+    operations.append(html_gen.make_operation(2, "title", "create-text", title))
+    # Font flags only exist in hand-written v1 runs.
+    run = ["create", "text", "--parent", "{{node_001}}", "--text", "b", "--font-family", "Roboto", "--font-style", "Medium"]
+    operations.append({"name": "caption", "run": run + ["--json"]})
+
+    mapped = [normalize_operation(idx, op) for idx, op in enumerate(operations, start=1)]
+    assert generated == [{"family": "Inter", "style": "Regular"}]
+    assert plan_fonts(plan["meta"], mapped) == [
+        {"family": "Inter", "style": "Regular"},
+        {"family": "Roboto", "style": "Bold"},
+        {"family": "Roboto", "style": "Medium"},
+    ]
+    set_text = html_gen.make_operation(2, "update-text-001", "set-text", {"id": "{{text_001}}", "text": "b"})
+    assert plan_fonts({}, [normalize_operation(1, set_text)]) == [{"family": "Inter", "style": "Regular"}]
+    assert plan_fonts({"fonts": [{"family": "Inter", "style": "Medium"}, {"family": ""}]}, mapped) == [
+        {"family": "Inter", "style": "Medium"}
+    ]
+
+
+def journal_lines(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()[1:] if line.strip()]
+
+
+def test_read_journal_skips_withdrawn_and_torn_records(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = PlanJournal(path, "sha")
+    journal.record(1, "page_id", "0:2")
+    journal.record(2, part=0, tree={"node_001": "1:3", "node_002": "1:4"})
+    journal.record(3, unknown=True)
+    journal.record(4, withdrawn=True)
+    journal.record(5, unknown=True)
+    journal.record(5, "node_005", "1:9")
+    journal.close()
+    with path.open("a", encoding="utf-8") as handle:
+        handle.write('{"idx": 6, "capture": "node_0')
+
+    done, captures, unknown = read_journal(path, "sha")
+    assert done == {1, (2, 0), 5}
+    assert unknown == {3}
+    assert captures == {"page_id": "0:2", "node_001": "1:3", "node_002": "1:4", "node_005": "1:9"}
+
+    # Resuming appends after the torn tail instead of gluing onto it.
+    journal = PlanJournal(path, "sha", append=True)
+    journal.record(6, "node_006", "1:10")
+    journal.close()
+    assert read_journal(path, "sha")[0] == {1, (2, 0), 5, 6}
+    with pytest.raises(SystemExit, match="different plan"):
+        read_journal(path, "other")
+
+
+def serve_plugin(state, plugin, stop, delay=0.02):
+    # The plugin side of BridgeState without HTTP: one command at a time, like the real plugin.
+    while not stop.is_set():
+        payload = state.wait_commands(0.05)
+        if payload is None:
+            continue
+        time.sleep(delay)
+        reply = plugin.handle(payload)
+        state.resolve(reply["batch"] if "batch" in reply else [reply])
+
+
+def test_unresolvable_placeholder_settles_the_dispatched_window(tmp_path):
+    operations = [
+        {"command": "create-frame", "args": {"name": f"Card {idx}"}, "capture": f"card_{idx}"} for idx in range(1, 9)
+    ]
+    operations.append(
+        {"command": "create-frame", "args": {"name": "Orphan", "parentId": "{{missing}}"}, "refs": ["parentId"]}
+    )
+    mapped = [normalize_operation(idx, op) for idx, op in enumerate(operations, start=1)]
+    state = BridgeState()
+    plugin = StandinPlugin("F", "K")
+    stop = threading.Event()
+    threading.Thread(target=serve_plugin, args=(state, plugin, stop), daemon=True).start()
+    path = tmp_path / "journal.jsonl"
+    journal = PlanJournal(path, "sha")
+    try:
+        with pytest.raises(RuntimeError, match="Missing capture for placeholder: missing"):
+            execute_plan(state, iter(mapped), {}, window=8, timeout_sec=5, journal=journal)
+    finally:
+        stop.set()
+        journal.close()
+
+    records = journal_lines(path)
+    assert sorted(record["idx"] for record in records) == list(range(1, 9))
+    created = sorted(node["name"] for node in plugin.nodes.values() if node["type"] == "FRAME")
+    assert sorted(f"Card {record['idx']}" for record in records if "id" in record) == created
+    assert any(record.get("withdrawn") for record in records)
+    assert not state.pending and not state.queue
+
+
+class FailOnce(StandinPlugin):
+    """Fails the nth create command once, like a plugin error mid-apply."""
+
+    def __init__(self, fail_at: int) -> None:
+        super().__init__("Stand-in File", "K")
+        self.fail_at = fail_at
+        self.creates = 0
+
+    def inject(self, command: str) -> None:
+        if command.startswith("create"):
+            self.creates += 1
+            if self.creates == self.fail_at:
+                raise RuntimeError("Injected failure")
+        time.sleep(0.001)
+
+
+def test_resume_after_a_failed_apply_creates_every_node_once(tmp_path):
+    html = "<div>" + "".join(f"<div><p>row {idx}</p></div>" for idx in range(60)) + "</div>"
+    tree = html_gen.MiniHTMLTree()
+    tree.feed(html)
+    plan = html_gen.build_plan(Path("rows.html"), tree.root, "rows", "rows", "t1", "HTML-rows", 1440, 1024, 32, 16, 2)
+    plan_path = tmp_path / "rows_plan.json"
+    plan_path.write_text(json.dumps(plan), encoding="utf-8")
+    creates = sum(1 for op in plan["operations"] if op["command"].startswith("create-") and op["command"] != "create-page")
+
+    port = free_port()
+    state = BridgeState(batch_size=8, long_poll_sec=1.0)
+    server = start_bridge_server(state, "threading", "127.0.0.1", port)
+    plugin = FailOnce(fail_at=70)
+    threading.Thread(
+        target=run_polling, args=(plugin, f"http://127.0.0.1:{port}", time.time() + 60), daemon=True
+    ).start()
+    base = f"--plan {plan_path} --project-name rows --task-id t1 --temp-root {tmp_path}".split()
+    base += ["--batch-size", "8", "--pipeline-window", "32", "--no-cleanup-task-files"]
+    try:
+        with pytest.raises(RuntimeError, match="Injected failure"):
+            run_apply(build_parser().parse_args(base), io.StringIO(), state)
+        journal_path = tmp_path / "rows_t1_journal.jsonl"
+        assert journal_path.exists()
+        assert run_apply(build_parser().parse_args(base + ["--resume"]), io.StringIO(), state) == 0
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    names = Counter(node["name"] for node in plugin.nodes.values() if node["type"] != "PAGE")
+    assert sum(names.values()) == creates
+    assert max(names.values()) == 1
+    assert not journal_path.exists()
+
+
+@pytest.mark.parametrize("kind", ["threading", "asyncio"])
+def test_targeted_command_only_reaches_its_file(kind):
+    port = free_port()
+    state = BridgeState()
+    server = start_bridge_server(state, kind, "127.0.0.1", port)
+
+    def poll(client):
+        query = f"?client={client}&name=File" if client else ""
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/next{query}", timeout=5) as response:
+            return response.status, response.read()
+
+    try:
+        (future,) = state.enqueue([("create-frame", {"name": "Only A"})], target="A")
+        assert poll("B")[0] == 204
+        assert poll("")[0] == 204
+        status, body = poll("A")
+        assert status == 200
+        assert json.loads(body)["args"] == {"name": "Only A"}
+        assert not future.done()
+        # An unrouted command goes to whichever plugin polls first, registered or not.
+        state.enqueue([("create-frame", {"name": "Anyone"})])
+        assert json.loads(poll("B")[1])["args"] == {"name": "Anyone"}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def request(port, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize("kind", ["threading", "asyncio"])
+@pytest.mark.parametrize(
+    "accept, expected",
+    [("gzip, deflate", "gzip"), ("deflate", "deflate"), ("gzip;q=0, deflate", "deflate"), ("br", None), ("", None)],
+)
+def test_next_negotiates_compression(kind, accept, expected):
+    port = free_port()
+    state = BridgeState(compress_min_bytes=1024)
+    server = start_bridge_server(state, kind, "127.0.0.1", port)
+    try:
+        state.enqueue([("create-text", {"text": "lorem ipsum " * 400})])
+        status, headers, body = request(port, "GET", "/next", headers={"Accept-Encoding": accept} if accept else {})
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert status == 200
+    assert headers.get("Content-Encoding") == expected
+    assert (headers["X-Bridge-Accept-Encoding"], headers["X-Bridge-Compress-Min"]) == ("gzip, deflate", "1024")
+    raw = {"gzip": gzip.decompress, "deflate": zlib.decompress}.get(expected, bytes)(body)
+    assert json.loads(raw)["args"]["text"] == "lorem ipsum " * 400
+    transfer = state.metrics.transfer["next"]
+    assert transfer[0] == len(raw) and transfer[1] == len(body)
+    assert (transfer[1] < transfer[0]) is (expected is not None)
+
+
+@pytest.mark.parametrize("kind", ["threading", "asyncio"])
+@pytest.mark.parametrize("minimum, text", [(1024, "short"), (0, "lorem ipsum " * 400)])
+def test_next_stays_plain_below_the_threshold_or_when_disabled(kind, minimum, text):
+    port = free_port()
+    state = BridgeState(compress_min_bytes=minimum)
+    server = start_bridge_server(state, kind, "127.0.0.1", port)
+    try:
+        state.enqueue([("create-text", {"text": text})])
+        status, headers, body = request(port, "GET", "/next", headers={"Accept-Encoding": "gzip"})
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert status == 200
+    assert "Content-Encoding" not in headers
+    assert json.loads(body)["args"]["text"] == text
+    assert ("X-Bridge-Compress-Min" in headers) is (minimum > 0)
+
+
+@pytest.mark.parametrize("kind", ["threading", "asyncio"])
+def test_compressed_results_are_decoded(kind):
+    port = free_port()
+    state = BridgeState(batch_size=4)
+    server = start_bridge_server(state, kind, "127.0.0.1", port)
+    try:
+        futures = state.enqueue([("create-frame", {}), ("create-frame", {}), ("create-frame", {})])
+        batch = json.loads(request(port, "GET", "/next")[2])["batch"]
+        results = [
+            {"id": item["id"], "ok": True, "result": {"id": f"1:{number}", "pad": "x" * 2000}}
+            for number, item in enumerate(batch)
+        ]
+        encoded = [
+            (gzip.compress(json.dumps(results[0]).encode()), "gzip"),
+            (zlib.compress(json.dumps(results[1]).encode()), "deflate"),
+            (json.dumps({"batch": [results[2]]}).encode(), "identity"),
+        ]
+        for body, encoding in encoded:
+            status, _, _ = request(port, "POST", "/result", body, {"Content-Encoding": encoding})
+            assert status == 200
+        assert [future.result(timeout=1)["result"]["id"] for future in futures] == ["1:0", "1:1", "1:2"]
+
+        assert request(port, "POST", "/result", b"{}", {"Content-Encoding": "br"})[0] == 415
+        assert request(port, "POST", "/result", b"not gzip", {"Content-Encoding": "gzip"})[0] == 415
+    finally:
+        server.shutdown()
+        server.server_close()
+    raw, wire = state.metrics.transfer["result"]
+    assert raw > wire
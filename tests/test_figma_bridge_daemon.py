@@ -0,0 +1,56 @@
+import io
+import threading
+
+import pytest
+
+from figma_bridge_daemon import Task, TaskScheduler
+
+
+def task(target=""):
+    return Task({"options": {"target_file_key": target} if target else {}}, io.BytesIO())
+
+
+@pytest.mark.parametrize(
+    "first, second, expected",
+    [("A", "A", True), ("A", "B", False), ("", "B", True), ("A", "", True), ("", "", True)],
+)
+def test_conflicts(first, second, expected):
+    assert TaskScheduler.conflicts(first, second) is expected
+
+
+def test_blockers_count_running_and_earlier_waiting_tasks():
+    scheduler = TaskScheduler()
+    first, second, third, untargeted = task("A"), task("B"), task("A"), task()
+    scheduler.running = ["B"]
+    scheduler.waiting = [first, second, third, untargeted]
+
+    assert scheduler.blockers(first) == 0
+    assert scheduler.blockers(second) == 1
+    assert scheduler.blockers(third) == 1
+    # An untargeted task may be picked up by any plugin, so everything ahead blocks it.
+    assert scheduler.blockers(untargeted) == 4
+
+
+def test_same_file_waits_while_other_files_run():
+    scheduler = TaskScheduler()
+    running_a, waiting_a, other = task("A"), task("A"), task("B")
+    scheduler.acquire(running_a)
+    order: list[str] = []
+
+    def run(item, label):
+        scheduler.acquire(item)
+        order.append(label)
+
+    blocked = threading.Thread(target=run, args=(waiting_a, "A2"))
+    blocked.start()
+    free = threading.Thread(target=run, args=(other, "B"))
+    free.start()
+    free.join(timeout=2)
+    assert order == ["B"]
+    assert blocked.is_alive()
+    assert waiting_a.out.stream.getvalue() == b'{"out": "Queued behind 1 task(s)\\n"}\n'
+
+    scheduler.release(running_a)
+    blocked.join(timeout=2)
+    assert order == ["B", "A2"]
+    assert sorted(scheduler.running) == ["A", "B"]
@@ -0,0 +1,223 @@
+import json
+from pathlib import Path
+
+import html_to_figma_plan as html_gen
+from figma_bridge_apply_plan import write_incremental_manifest
+
+DEPTH = 10_000
+
+
+def build(html: str, plan_version: int = 2) -> dict:
+    tree = html_gen.MiniHTMLTree()
+    tree.feed(html)
+    return html_gen.build_plan(Path("deep.html"), tree.root, "deep", "deep", "t1", "HTML-deep", 1440, 1024, 32, 16, plan_version)
+
+
+def test_deeply_nested_document_builds_flat_plan():
+    plan = build("<div>" * DEPTH + "deep" + "</div>" * DEPTH)
+    operations = plan["operations"]
+
+    # create-page, set-page, root frame, one frame per div, and the innermost text.
+    assert len(operations) == DEPTH + 4
+    assert operations[3]["args"]["parentId"] == "{{html_root}}"
+    assert operations[-2]["args"]["parentId"] == f"{{{{node_{DEPTH - 1:03d}}}}}"
+    assert operations[-1]["command"] == "create-text"
+    assert operations[-1]["args"]["text"] == "deep"
+    assert operations[-1]["args"]["parentId"] == f"{{{{node_{DEPTH:03d}}}}}"
+    json.dumps(plan)
+
+
+def test_deeply_nested_document_v1_run_tokens():
+    plan = build("<section>" * DEPTH + "</section>" * DEPTH, plan_version=1)
+
+    assert len(plan["operations"]) == DEPTH + 3
+    assert plan["operations"][-1]["run"][:2] == ["create", "frame"]
+
+
+def tree_depth(nodes: list[dict]) -> int:
+    deepest = 0
+    stack = [(spec, 1) for spec in nodes]
+    while stack:
+        spec, depth = stack.pop()
+        deepest = max(deepest, depth)
+        stack.extend((child, depth + 1) for child in spec.get("children") or [])
+    return deepest
+
+
+def tree_captures(nodes: list[dict]) -> list[str]:
+    # Preorder, the order the per-node plan creates them in.
+    captures: list[str] = []
+    stack = list(reversed(nodes))
+    while stack:
+        spec = stack.pop()
+        captures.append(spec["capture"])
+        stack.extend(reversed(spec.get("children") or []))
+    return captures
+
+
+def test_deep_tree_is_split_into_depth_bounded_chunks():
+    html = "<div>" * DEPTH + "deep" + "</div>" * DEPTH
+    tree = html_gen.MiniHTMLTree()
+    tree.feed(html)
+    operations = list(html_gen.iter_operations(tree.root, "HTML-deep", 1440, 1024, 16, 2, True))
+    flat = build(html)["operations"]
+
+    trees = [op for op in operations if op["command"] == "create-tree"]
+    assert len(trees) > 1
+    created: list[str] = []
+    for op in trees:
+        assert tree_depth(op["args"]["nodes"]) <= html_gen.TREE_MAX_DEPTH + 1
+        parent = op["args"].get("parentId")
+        if parent:
+            assert op["refs"] == ["parentId"]
+            assert parent.strip("{}") in created
+        created.extend(tree_captures(op["args"]["nodes"]))
+    assert created == [op["capture"] for op in flat[2:]]
+    json.dumps(operations)
+
+
+PAGE = """<div id="list">
+  <div class="row"><p>Alpha</p></div>
+  <div class="row"><p style="color:#333333">Beta</p><span>tag</span></div>
+  <div class="row" style="background:#EEEEEE"><p>Gamma</p></div>
+</div>"""
+
+
+def layout_of(html: str) -> list:
+    tree = html_gen.MiniHTMLTree()
+    tree.feed(html)
+    return list(html_gen.iter_layout(tree.root, 16, with_paths=True))
+
+
+def incremental(html: str, previous: dict | None) -> tuple[list[dict], dict]:
+    layout = layout_of(html)
+    return html_gen.build_incremental_operations(
+        layout, html_gen.subtree_hashes(layout), previous, "HTML-page", 1440, 1024, 2
+    )
+
+
+def applied(manifest: dict, tmp_path: Path) -> dict:
+    # Resolve and write the manifest the way the applier does after a successful apply, then reload it.
+    names = set(html_gen.PLACEHOLDER_RE.findall(json.dumps(manifest)))
+    captures = {name: f"1:{number}" for number, name in enumerate(sorted(names), start=2)}
+    data = {"version": html_gen.MANIFEST_VERSION, "page_name": "HTML-page", **manifest}
+    spec = {"path": str(tmp_path / "manifests" / "page.json"), "data": data}
+    path = write_incremental_manifest(spec, captures, tmp_path, "KEY", "File")
+    loaded, reason = html_gen.load_manifest(path, "HTML-page")
+    assert reason == ""
+    return loaded
+
+
+def test_incremental_manifest_round_trips(tmp_path):
+    operations, manifest = incremental(PAGE, None)
+    previous = applied(manifest, tmp_path)
+
+    assert operations[0]["command"] == "create-page"
+    assert html_gen.PLACEHOLDER_RE.search(json.dumps(previous)) is None
+    assert previous["file_key"] == "KEY"
+    assert set(previous["nodes"]) == set(manifest["nodes"])
+    for path, node in manifest["nodes"].items():
+        assert {key: previous["nodes"][path][key] for key in ("parent", "hash", "frame", "text")} == {
+            key: node[key] for key in ("parent", "hash", "frame", "text")
+        }
+    assert html_gen.load_manifest(tmp_path / "manifests" / "page.json", "Other page")[0] is None
+
+
+def test_unchanged_document_emits_no_node_operations(tmp_path):
+    previous = applied(incremental(PAGE, None)[1], tmp_path)
+    operations, manifest = incremental(PAGE, previous)
+
+    assert [op["command"] for op in operations] == ["set-current-page"]
+    assert operations[0]["args"] == {"idOrName": previous["page_id"]}
+    assert manifest["nodes"] == previous["nodes"]
+
+
+def test_edited_subtree_is_the_only_one_re_emitted(tmp_path):
+    previous = applied(incremental(PAGE, None)[1], tmp_path)
+    edited = PAGE.replace("Beta", "Beta two").replace("#EEEEEE", "#DDDDDD")
+    operations, manifest = incremental(edited, previous)
+
+    beta = previous["nodes"]["/div#list/div:1/p:0"]
+    gamma = previous["nodes"]["/div#list/div:2"]
+    assert [(op["command"], op["args"]) for op in operations[1:]] == [
+        ("set-text", {"id": beta["text_id"], "text": "Beta two"}),
+        ("set-fill", {"id": gamma["frame_id"], "color": "#DDDDDD"}),
+    ]
+    # Ancestors get new hashes but keep their nodes; untouched siblings keep everything.
+    assert manifest["nodes"]["/div#list"]["frame_id"] == previous["nodes"]["/div#list"]["frame_id"]
+    assert manifest["nodes"]["/div#list"]["hash"] != previous["nodes"]["/div#list"]["hash"]
+    assert manifest["nodes"]["/div#list/div:0"] == previous["nodes"]["/div#list/div:0"]
+
+
+def test_added_and_removed_subtrees(tmp_path):
+    previous = applied(incremental(PAGE, None)[1], tmp_path)
+    edited = PAGE.replace('<div class="row" style="background:#EEEEEE"><p>Gamma</p></div>', "<section><p>Delta</p></section>")
+    operations, manifest = incremental(edited, previous)
+
+    # Only the topmost vanished node is deleted (its text goes with it); the new subtree is created
+    # under its existing parent, and the untouched rows emit nothing.
+    assert [(op["command"], op["args"].get("id") or op["args"].get("parentId")) for op in operations[1:]] == [
+        ("delete-node", previous["nodes"]["/div#list/div:2"]["frame_id"]),
+        ("create-frame", previous["nodes"]["/div#list"]["frame_id"]),
+        ("create-frame", "{{node_007}}"),
+        ("create-text", "{{node_008}}"),
+    ]
+    assert operations[1]["ignore_error"] is True
+    assert "/div#list/div:2" not in manifest["nodes"]
+    assert manifest["nodes"]["/div#list/section:0"]["frame_id"] == "{{node_007}}"
+
+
+CARD = '<div style="width:300px;height:80px;background:#F5F5F5"><p style="font-size:16px">{title}</p><span>{tag}</span></div>'
+
+
+def component_plan(cards: list[str], min_repeats: int = 2) -> list[dict]:
+    tree = html_gen.MiniHTMLTree()
+    tree.feed("<section>" + "".join(cards) + "</section>")
+    return list(html_gen.iter_operations(tree.root, "HTML-cards", 1440, 1024, 16, 2, components=min_repeats))
+
+
+def commands(operations: list[dict]) -> list[str]:
+    return [op["command"] for op in operations]
+
+
+def test_identical_subtrees_become_one_component_and_instances():
+    operations = component_plan([CARD.format(title="Card", tag="new")] * 5)
+
+    # Components are built first, off to the right of the root frame.
+    assert commands(operations) == ["create-page", "set-current-page", "create-frame", "create-component", "create-frame"] + [
+        "create-instance"
+    ] * 5
+    component = operations[3]
+    assert component["capture"] == "component_001"
+    assert component["args"]["x"] == 1440 + html_gen.COMPONENT_GAP
+    assert [child["command"] for child in component["args"]["children"]] == ["create-frame", "create-frame"]
+    for op in operations[5:]:
+        assert op["args"]["componentId"] == "{{component_001}}"
+        assert op["args"]["parentId"] == "{{node_001}}"
+        assert "texts" not in op["args"]
+    assert len({op["args"]["y"] for op in operations[5:]}) == 5
+
+
+def test_text_is_an_instance_parameter_not_part_of_the_shape():
+    operations = component_plan([CARD.format(title=f"Card {n}", tag="new") for n in range(3)])
+
+    assert commands(operations).count("create-component") == 1
+    instances = [op["args"] for op in operations if op["command"] == "create-instance"]
+    # The first card is the master; later ones override only the texts that differ.
+    assert [args.get("texts") for args in instances] == [None, ["Card 1"], ["Card 2"]]
+
+
+def test_subtrees_differing_in_style_are_not_merged():
+    cards = [CARD.format(title="Card", tag="new")] * 2
+    cards += [CARD.replace("#F5F5F5", "#000000").format(title="Card", tag="new")] * 2
+    cards += [CARD.replace("16px", "20px").format(title="Card", tag="new")] * 2
+    cards += [CARD.replace("height:80px", "height:90px").format(title="Card", tag="new")]
+    operations = component_plan(cards)
+
+    components = [op for op in operations if op["command"] == "create-component"]
+    assert [op["args"]["fill"] for op in components] == ["#F5F5F5", "#000000", "#F5F5F5"]
+    assert components[2]["args"]["children"][0]["children"][0]["args"]["fontSize"] == 20
+    instances = [op["args"]["componentId"] for op in operations if op["command"] == "create-instance"]
+    assert instances == ["{{component_001}}"] * 2 + ["{{component_002}}"] * 2 + ["{{component_003}}"] * 2
+    # The one-off card stays plain frames and text.
+    assert commands(operations)[-5:] == ["create-frame", "create-frame", "create-text", "create-frame", "create-text"]
@@ -0,0 +1,41 @@
+from optimize_plan import optimize_plan
+
+
+def frame(capture, parent, **args):
+    base = {"name": capture, "x": 0, "y": 0, "width": 100, "height": 40, "fill": "#FFFFFF"}
+    op = {"command": "create-frame", "args": {**base, **args}, "capture": capture}
+    if parent:
+        op["args"]["parentId"] = f"{{{{{parent}}}}}"
+        op["refs"] = ["parentId"]
+    return op
+
+
+def test_collapses_covered_wrappers_and_merges_set_runs():
+    plan = {
+        "meta": {"plan_version": 2},
+        "operations": [
+            frame("root", "", width=400, height=300),
+            frame("wrap", "root", x=20, y=30),
+            frame("card", "wrap", fill="#EEEEEE"),
+            frame("badge", "root", opacity=0),
+            {"command": "set-geometry", "args": {"id": "1:2", "x": 5, "width": 50}},
+            {"command": "set-geometry", "args": {"id": "1:2", "x": 8, "height": ""}},
+        ],
+    }
+    optimized, summary = optimize_plan(plan)
+    operations = optimized["operations"]
+
+    assert [op.get("capture") for op in operations] == ["root", "card", "badge", None]
+    card = operations[1]["args"]
+    assert (card["x"], card["y"], card["fill"], card["parentId"]) == (20, 30, "#EEEEEE", "{{root}}")
+    assert operations[3]["args"] == {"id": "1:2", "x": 8, "width": 50}
+    assert summary == {
+        "operations_before": 6,
+        "operations_after": 4,
+        "wrappers_collapsed": 1,
+        "sets_merged": 1,
+        "tree_nodes_before": 0,
+        "tree_nodes_after": 0,
+        "kept_for_manifest": 0,
+    }
+    assert optimized["meta"]["optimizer"] == summary
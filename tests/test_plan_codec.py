@@ -0,0 +1,155 @@
+import gzip
+import json
+
+import pytest
+
+import plan_codec
+
+PLAN = {
+    "meta": {"generator": "test", "plan_version": 2, "fonts": [{"family": "Inter", "style": "Regular"}]},
+    "operations": [
+        {"name": "create-page", "command": "create-page", "args": {"name": "P"}, "capture": "page_id"},
+        {"name": "set-page", "command": "set-current-page", "args": {"idOrName": "P"}},
+        {
+            "name": "frame-1",
+            "command": "create-frame",
+            "args": {"name": "N001", "x": 0, "y": 12.5, "width": 320, "fill": "#FFFFFF", "parentId": "{{page_id}}"},
+            "refs": ["parentId"],
+            "capture": "node_001",
+        },
+        {
+            "name": "frame-2",
+            "command": "create-frame",
+            "args": {"name": "N002", "x": 0, "y": 60, "width": 320, "fill": "#FFFFFF", "parentId": "{{node_001}}"},
+            "refs": ["parentId"],
+            "capture": "node_002",
+            "ignore_error": True,
+        },
+        {
+            "name": "tree",
+            "command": "create-tree",
+            "args": {
+                "parentId": "{{node_001}}",
+                "nodes": [
+                    {
+                        "command": "create-frame",
+                        "args": {"name": "Card", "x": 0, "y": 0, "fill": "#FFFFFF"},
+                        "capture": "card",
+                        "children": [{"command": "create-text", "args": {"text": "Hello 世界", "fontSize": 14}}],
+                    },
+                    {"command": "create-text", "args": {"text": "Hello 世界", "padding": [1, 2], "layoutMode": None}},
+                ],
+            },
+            "refs": ["parentId"],
+        },
+        {"name": "set-geometry", "command": "set-geometry", "args": {}},
+        {"name": "legacy", "run": ["set", "fill", "{{node_002}}", "#FFFFFF"]},
+    ],
+}
+
+
+def round_trip(plan: dict) -> dict:
+    text = plan_codec.encode_compact_plan(plan["meta"], plan["operations"])
+    decoded = json.loads(text)
+    assert plan_codec.is_compact_plan(decoded)
+    return plan_codec.decode_compact_plan(decoded)
+
+
+def test_round_trip_preserves_plan_and_key_order():
+    decoded = round_trip(PLAN)
+
+    assert decoded == PLAN
+    assert json.dumps(decoded) == json.dumps(PLAN)
+
+
+def test_only_repeated_strings_are_interned():
+    payload = json.loads(plan_codec.encode_compact_plan(PLAN["meta"], PLAN["operations"]))
+
+    assert "#FFFFFF" in payload["strings"]
+    assert "create-frame" in payload["strings"]
+    assert "N001" not in payload["strings"]
+    assert "N001" in json.dumps(payload["operations"])
+
+
+def test_shape_strings_are_data_not_code():
+    plan = {
+        "format": plan_codec.COMPACT_FORMAT,
+        "version": plan_codec.COMPACT_VERSION,
+        "strings": [],
+        "shapes": [[["__import__('os').getcwd()", "s"], ["args", "x) or (1", "n"]]],
+        "operations": [[0, "v", 1]],
+    }
+
+    decoded = plan_codec.decode_compact_plan(plan)
+
+    assert decoded["operations"] == [{"__import__('os').getcwd()": "v", "args": {"x) or (1": 1}}]
+
+
+@pytest.mark.parametrize(
+    "plan",
+    [
+        {"version": 1, "strings": [], "shapes": [[["name"]]], "operations": []},
+        {"version": 1, "strings": [], "shapes": [[["name", "s"]]], "operations": [[0, 3]]},
+        {"version": 1, "strings": [], "shapes": [], "operations": [[0]]},
+        {"version": 2, "strings": [], "shapes": [], "operations": []},
+    ],
+)
+def test_malformed_compact_plans_raise_value_error(plan):
+    with pytest.raises(ValueError):
+        plan_codec.decode_compact_plan(plan)
+
+
+def test_deep_tree_round_trip_without_recursion():
+    depth = 5000
+    root = {"command": "create-frame", "args": {"name": "d0"}}
+    spec = root
+    for level in range(1, depth):
+        child = {"command": "create-frame", "args": {"name": f"d{level}"}}
+        spec["children"] = [child]
+        spec = child
+    operations = [{"name": "tree", "command": "create-tree", "args": {"nodes": [root]}}]
+
+    encoder = plan_codec.CompactEncoder(plan_codec.repeated_strings(operations))
+    encoded = encoder.encode_all(operations)
+    decoded = plan_codec.decode_compact_plan(
+        {
+            "version": plan_codec.COMPACT_VERSION,
+            "strings": list(encoder.strings),
+            "shapes": [[list(entry) for entry in shape] for shape in encoder.shapes],
+            "operations": encoded,
+        }
+    )
+
+    names = []
+    nodes = decoded["operations"][0]["args"]["nodes"]
+    while nodes:
+        names.append(nodes[0]["args"]["name"])
+        nodes = nodes[0].get("children")
+    assert names == [f"d{level}" for level in range(depth)]
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_gzip_is_detected_by_content(tmp_path, compact):
+    # No .gz suffix: readers go by the magic bytes.
+    path = tmp_path / "plan.json"
+    text = plan_codec.encode_compact_plan(PLAN["meta"], PLAN["operations"]) if compact else json.dumps(PLAN)
+
+    plan_codec.write_plan_text(path, text, compress=True)
+    first = path.read_bytes()
+    plan_codec.write_plan_text(path, text, compress=True)
+
+    assert first[:2] == plan_codec.GZIP_MAGIC
+    assert path.read_bytes() == first
+    assert plan_codec.load_plan(path) == PLAN
+
+
+def test_open_plan_text_streams_plain_and_gzipped_jsonl(tmp_path):
+    lines = [json.dumps({"meta": PLAN["meta"]})] + [json.dumps(op) for op in PLAN["operations"]]
+    plain = tmp_path / "plan.jsonl"
+    packed = tmp_path / "plan.jsonl.gz"
+    plain.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    packed.write_bytes(gzip.compress(plain.read_bytes()))
+
+    for path in (plain, packed):
+        with plan_codec.open_plan_text(path) as stream:
+            assert [line.rstrip("\n") for line in stream] == lines
@@ -0,0 +1,132 @@
+import json
+import random
+
+import pytest
+
+import ui_doc_to_figma_plan as doc_gen
+
+LONG_TITLE = "Checkout page for returning customers with saved cards, gift vouchers and split payments"
+
+
+def sections(markdown: str) -> tuple[list[str], dict[str, str]]:
+    return doc_gen.scan_document(markdown.splitlines(), with_sections=True)
+
+
+def applied(manifest: dict) -> dict:
+    # What the applier writes back: placeholders resolved to node IDs.
+    screens = {
+        key: {**screen, "frame_id": f"1:{screen['index']}"} for key, screen in manifest["screens"].items()
+    }
+    return {**manifest, "page_id": "0:9", "screens": screens}
+
+
+def diff(before: str, after: str) -> tuple[list[dict], dict[str, list[str]]]:
+    titles, hashes = sections(before)
+    _, manifest, _ = doc_gen.build_section_operations(titles, hashes, None, "AUTO", 390, 844, 120, 2)
+    titles, hashes = sections(after)
+    operations, _, changes = doc_gen.build_section_operations(titles, hashes, applied(manifest), "AUTO", 390, 844, 120, 2)
+    return operations, changes
+
+
+def test_section_changes_are_detected():
+    before = "## Login page\nEmail\n### Fields\n- email\n\n## Home page\nFeed\n\n## Settings page\nToggles\n"
+    after = "## Login page\nEmail\n### Fields\n- email\n- password\n\n## Home page\nFeed\n\n## Profile page\nAvatar\n"
+
+    operations, changes = diff(before, after)
+
+    assert changes == {"added": ["Profile page"], "removed": ["Settings page"], "modified": ["Login page"]}
+    assert [op["command"] for op in operations] == [
+        "set-current-page",
+        "delete-node",
+        "delete-node",
+        "create-frame",
+        "create-text",
+        "create-frame",
+        "create-text",
+    ]
+    assert {op["args"]["id"] for op in operations if op["command"] == "delete-node"} == {"1:1", "1:3"}
+
+
+def test_unchanged_document_emits_no_screens():
+    doc = "## Login page\nEmail\n\n## Home page\nFeed\n"
+
+    operations, changes = diff(doc, doc + "\n\n")
+
+    assert changes == {"added": [], "removed": [], "modified": []}
+    assert [op["command"] for op in operations] == ["set-current-page"]
+
+
+def test_long_heading_body_edit_is_detected():
+    assert len(LONG_TITLE) > 80
+    before = f"## {LONG_TITLE}\nCard list\n\n## Home page\nFeed\n"
+    after = f"## {LONG_TITLE}\nCard list with defaults\n\n## Home page\nFeed\n"
+
+    operations, changes = diff(before, after)
+
+    assert changes["modified"] == [LONG_TITLE[:80]]
+    frames = [op for op in operations if op["command"] == "create-frame"]
+    assert [op["args"]["name"] for op in frames] == [f"S01-{LONG_TITLE[:80]}"]
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("ushers", 0b111),  # she, he and hers overlap and end inside one another
+        ("this", 0b100),
+        ("sh", 0),
+        ("h-e", 0),  # a character outside every hint resets the automaton
+        ("she", 0b011),
+    ],
+)
+def test_hint_matcher_reports_overlapping_hints(text, expected):
+    matcher = doc_gen.HintMatcher([["he"], ["she"], ["his", "hers"]])
+    assert matcher.classify(text) == expected
+
+
+def test_hint_matcher_follows_failure_links_into_shorter_hints():
+    # "bc" is only reachable through the failure link of the "abc" state of "abcd".
+    matcher = doc_gen.HintMatcher([["abcd"], ["bc"]])
+    assert matcher.classify("abce") == 0b10
+    assert matcher.classify("xabcd") == 0b11
+    assert matcher.classify("abd") == 0
+
+
+def test_hint_matcher_matches_cjk_inside_unsegmented_text():
+    matcher = doc_gen.HintMatcher([["附录"], ["登录", "页面"]])
+    assert matcher.classify("用户登录页面设计") == 0b10
+    assert matcher.classify("附录：登录流程") == 0b11
+    assert matcher.classify("登 录") == 0
+
+
+def test_hint_matcher_agrees_with_substring_search():
+    groups = [["ab", "bab"], ["aab", "b"], ["abba"], [""]]
+    matcher = doc_gen.HintMatcher(groups)
+    rng = random.Random(3)
+    for _ in range(500):
+        text = "".join(rng.choice("abc") for _ in range(rng.randint(0, 12)))
+        expected = sum(1 << bit for bit, hints in enumerate(groups) if any(hint and hint in text for hint in hints))
+        assert matcher.classify(text) == expected, text
+
+
+def test_default_hints_pick_screens_and_skip_excluded_headings():
+    markdown = "## Login page\n## Changelog page\n## 首页\n## 附录\n## Pricing\n"
+    assert doc_gen.extract_headings(markdown) == ["Login page", "首页"]
+    assert doc_gen.extract_headings("## Pricing\n## Changelog\n## FAQ\n") == ["Pricing", "FAQ"]
+
+
+def test_hints_file_replaces_only_the_given_lists(tmp_path):
+    path = tmp_path / "hints.json"
+    path.write_text(json.dumps({"screen": [" Pricing ", "FAQ", ""]}), encoding="utf-8")
+    matcher, hints = doc_gen.load_hint_matcher(path)
+    assert hints["screen"] == ["faq", "pricing"]
+    assert hints["exclude"] == sorted(doc_gen.EXCLUDE_HINTS)
+    markdown = "## Login page\n## Pricing\n## FAQ changelog\n## FAQ\n"
+    assert doc_gen.extract_headings(markdown, matcher) == ["Pricing", "FAQ"]
+
+
+@pytest.mark.parametrize("content", ['{"screen": "faq"}', '["faq"]', "{"])
+def test_invalid_hints_file_is_rejected(tmp_path, content):
+    path = tmp_path / "hints.json"
+    path.write_text(content, encoding="utf-8")
+    with pytest.raises(SystemExit):
+        doc_gen.load_hint_matcher(path)